@@ -0,0 +1,97 @@
+import hashlib
+
+from disk_lru_store import DiskLRUStore
+
+# Upper bound on what a single read_artifact call returns, so fetching an artifact can't blow the context either.
+MAX_ARTIFACT_READ_CHARACTERS = 20_000
+
+
+class ArtifactStore:
+    """
+    Local store for tool outputs that are too large to send to the model in full. The model gets a head/tail
+    preview and an artifact id instead, and can fetch line or byte ranges of the artifact with read_artifact.
+    """
+
+    def __init__(
+        self,
+        directory: str = "./.eda_cache/artifacts",
+        max_bytes: int = 200 * 1024 * 1024,
+        max_inline_characters: int = 8_000,
+        preview_characters: int = 2_000,
+    ):
+        """
+        Args:
+            directory (str): Where artifacts are stored.
+            max_bytes (int): Total size of the store, least recently used artifacts are evicted beyond it.
+            max_inline_characters (int): Outputs longer than this are stored as artifacts.
+            preview_characters (int): Characters of a stored output's head and tail (each) sent to the model.
+        """
+
+        self.store = DiskLRUStore(directory, max_bytes)
+        self.max_inline_characters = max_inline_characters
+        self.preview_characters = preview_characters
+
+    def spill_if_large(self, text: str, source: str) -> str:
+        """
+        Returns text as is if it is small enough, otherwise stores it and returns a preview referencing it.
+
+        Args:
+            text (str): The tool output.
+            source (str): The tool that produced it, used as the artifact id's prefix (e.g. "run_python_code").
+        """
+
+        if len(text) <= self.max_inline_characters:
+            return text
+
+        data = text.encode()
+        artifact_id = f"{source}-{hashlib.sha256(data).hexdigest()[:12]}"
+        self.store.put(artifact_id, data)
+
+        return (
+            f"{text[:self.preview_characters]}\n"
+            f"[... output truncated: {len(text)} characters ({text.count(chr(10)) + 1} lines, {len(data)} bytes) in total, "
+            f"stored as artifact '{artifact_id}'. Use read_artifact to fetch line or byte ranges of it ...]\n"
+            f"{text[-self.preview_characters:]}"
+        )
+
+    def read(
+        self,
+        artifact_id: str,
+        start_line: int | None = None,
+        end_line: int | None = None,
+        start_byte: int | None = None,
+        end_byte: int | None = None,
+    ) -> str:
+        """
+        Reads a range of an artifact, lines are 1-based and inclusive, bytes are 0-based and end exclusive.
+        Without a range the start of the artifact is returned.
+
+        Returns:
+            str: The requested range (capped at MAX_ARTIFACT_READ_CHARACTERS), or an error message.
+        """
+
+        try:
+            data = self.store.get(artifact_id)
+        except ValueError:
+            data = None
+
+        if data is None:
+            return f"Artifact '{artifact_id}' does not exist (it may have been evicted, re-run the call that produced it)."
+
+        if start_byte is not None or end_byte is not None:
+            text = data[start_byte:end_byte].decode(errors="replace")
+
+        elif start_line is not None or end_line is not None:
+            lines = data.decode(errors="replace").splitlines(keepends=True)
+            text = "".join(lines[max((start_line or 1) - 1, 0) : end_line])
+
+        else:
+            text = data.decode(errors="replace")
+
+        if len(text) > MAX_ARTIFACT_READ_CHARACTERS:
+            return (
+                text[:MAX_ARTIFACT_READ_CHARACTERS]
+                + f"\n[... {len(text) - MAX_ARTIFACT_READ_CHARACTERS} more characters in this range, request a smaller one ...]"
+            )
+
+        return text
@@ -0,0 +1,477 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from dotenv import load_dotenv
+from e2b_code_interpreter import Sandbox
+from openai import AsyncOpenAI
+from rich.console import Console
+from rich.table import Table
+
+from response_cache import RESPONSE_CACHE_MODES, ResponseCache
+from sandbox_eda import SandboxEDA
+from sandbox_sql import prewarm_duckdb
+from tracing import Tracer
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Progress goes to stderr, the sessions' own output is written to the batch log instead of the terminal.
+console = Console(stderr=True)
+
+# Job states, a job ends in one of these.
+JOB_SUCCEEDED = "succeeded"
+JOB_PARTIAL = "partial"  # Some questions failed.
+JOB_FAILED = "failed"
+JOB_TIMED_OUT = "timed_out"
+JOB_INVALID = "invalid"  # Malformed line or missing datasets, never run.
+
+
+def read_jobs(jobs_file: str) -> list[dict]:
+    """
+    Reads a JSONL jobs file, one job per line: {"id": str (optional), "datasets": [paths], "questions": [str]}.
+    Relative dataset paths are relative to the jobs file. A line that isn't a valid job is returned with an
+    "error" rather than stopping the whole batch.
+
+    Returns:
+        list[dict]: {"job_id": str, "dataset_paths": list[str], "questions": list[str], "error": str | None}
+    """
+
+    jobs_dir = Path(jobs_file).parent
+    jobs, job_ids = [], set()
+
+    with open(jobs_file) as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+
+            job = {
+                "job_id": f"job-{line_number:04d}",
+                "dataset_paths": [],
+                "questions": [],
+                "error": None,
+            }
+            jobs.append(job)
+
+            try:
+                spec = json.loads(line)
+                job["job_id"] = str(spec.get("id") or job["job_id"])
+                job["dataset_paths"] = [
+                    str(jobs_dir / path) for path in spec.get("datasets", [])
+                ]
+                job["questions"] = list(spec.get("questions", []))
+
+                # The id names the job's output directory.
+                if Path(job["job_id"]).name != job["job_id"] or job["job_id"] in (
+                    ".",
+                    "..",
+                ):
+                    raise ValueError(f"Invalid job id '{job['job_id']}'")
+                if job["job_id"] in job_ids:
+                    raise ValueError(f"Duplicate job id '{job['job_id']}'")
+                if not job["dataset_paths"] or not job["questions"]:
+                    raise ValueError("A job needs at least one dataset and question")
+
+                file_names = set()
+                for path in job["dataset_paths"]:
+                    if not os.path.isfile(path):
+                        raise FileNotFoundError(
+                            f"Invalid path: file not found at '{path}'"
+                        )
+                    if os.path.basename(path) in file_names:
+                        raise ValueError(
+                            f"Duplicate filename '{os.path.basename(path)}' - files must have unique names"
+                        )
+                    file_names.add(os.path.basename(path))
+
+            except Exception as e:
+                job["error"] = f"Line {line_number}: {e}"
+
+            job_ids.add(job["job_id"])
+
+    return jobs
+
+
+async def ask_questions(
+    sandbox_eda: SandboxEDA,
+    client: AsyncOpenAI,
+    messages: list,
+    questions: list[str],
+    report: dict,
+    model_for_eda: str,
+):
+    """
+    Asks the questions in turn, in the same conversation, appending each answer (or error) to report["answers"].
+    """
+
+    for question in questions:
+        started_at = time.perf_counter()
+        messages.append({"role": "user", "content": question})
+
+        try:
+            answer = await sandbox_eda.run_agent_turn(client, messages, model_for_eda)
+            report["answers"].append({"question": question, "answer": answer})
+        except Exception as e:
+            # e.g. too many consecutive tool calls, the conversation stays valid so move on to the next question.
+            report["answers"].append(
+                {"question": question, "error": f"{type(e).__name__}: {e}"}
+            )
+
+        report["answers"][-1]["seconds"] = round(time.perf_counter() - started_at, 2)
+
+
+async def run_job_session(
+    job: dict,
+    job_dir: Path,
+    report: dict,
+    model_for_eda: str,
+    api_key_for_sandbox_and_model: str,
+    model_api_base_url: str,
+    sandbox_domain: str,
+    sandbox_template: str,
+    sandbox_timeout: int,
+    upload_compression: str | None,
+    cache_dir: Path,
+    response_cache: ResponseCache | None = None,
+):
+    """
+    Runs one job's EDA session: uploads its datasets to a new sandbox and asks its questions in turn, in the same
+    conversation. Answers are recorded in report as they come, so a job that times out keeps the ones it got.
+    """
+
+    tracer = Tracer(trace_directory=str(job_dir))
+
+    with tracer.span("sandbox_creation", pooled=False):
+        sandbox = await asyncio.to_thread(
+            Sandbox,
+            template=sandbox_template,
+            api_key=api_key_for_sandbox_and_model,
+            domain=sandbox_domain,
+            timeout=sandbox_timeout,
+        )
+    report["sandbox_id"] = sandbox.sandbox_id
+    prewarm_duckdb(sandbox)
+
+    try:
+        sandbox_eda = SandboxEDA(
+            sandbox,
+            model_api_base_url,
+            api_key_for_sandbox_and_model,
+            upload_compression=upload_compression,
+            # Per job, so concurrent sessions never write the same index file. Reruns of a job reuse it.
+            fingerprint_index_path=str(
+                cache_dir / "fingerprints" / f"{job['job_id']}.json"
+            ),
+            sync_folder=str(job_dir / "sync_folder"),
+            artifact_store_path=str(job_dir / "artifacts"),
+            image_output_path=str(job_dir / "images"),
+            stream_responses=False,
+            stream_execution_output=False,
+            display_images=False,  # Headless, the images are saved to the job's directory.
+            tracer=tracer,
+            response_cache=response_cache,
+        )
+
+        try:
+            file_names = [os.path.basename(path) for path in job["dataset_paths"]]
+            await asyncio.to_thread(
+                sandbox_eda.upload_files_to_sandbox, job["dataset_paths"], file_names
+            )
+
+            messages = sandbox_eda.initial_messages(file_names)
+
+            async with AsyncOpenAI(
+                base_url=model_api_base_url, api_key=api_key_for_sandbox_and_model
+            ) as client:
+                await ask_questions(
+                    sandbox_eda,
+                    client,
+                    messages,
+                    job["questions"],
+                    report,
+                    model_for_eda,
+                )
+
+        finally:
+            sandbox_eda.job_manager.shutdown()
+            await asyncio.to_thread(sandbox_eda.image_pipeline.shutdown)
+            report["usage"] = sandbox_eda.history_manager.usage_summary()
+
+    finally:
+        await asyncio.to_thread(sandbox.kill)
+
+
+async def run_batch_job(
+    job: dict,
+    output_dir: Path,
+    sandbox_slots: asyncio.Semaphore,
+    job_timeout: float,
+    **session_kwargs,
+) -> dict:
+    """
+    Runs a job once a sandbox slot is free and writes its report (answers.json) to its output directory.
+
+    Returns:
+        dict: The job's report {"job_id", "datasets", "status", "answers", "seconds", "error", ...}
+    """
+
+    job_dir = output_dir / job["job_id"]
+    job_dir.mkdir(parents=True, exist_ok=True)
+
+    report = {
+        "job_id": job["job_id"],
+        "datasets": job["dataset_paths"],
+        "status": JOB_INVALID,
+        "answers": [],
+        "seconds": 0.0,
+        "error": job["error"],
+    }
+
+    if job["error"] is None:
+        async with sandbox_slots:
+            started_at = time.perf_counter()
+
+            try:
+                # The timeout only starts once the job has a sandbox slot.
+                await asyncio.wait_for(
+                    run_job_session(job, job_dir, report, **session_kwargs),
+                    timeout=job_timeout,
+                )
+                failed_questions = sum(
+                    "error" in answer for answer in report["answers"]
+                )
+                report["status"] = JOB_PARTIAL if failed_questions else JOB_SUCCEEDED
+
+            except asyncio.TimeoutError:
+                report["status"] = JOB_TIMED_OUT
+                report["error"] = f"Timed out after {job_timeout}s"
+
+            except Exception as e:
+                report["status"] = JOB_FAILED
+                report["error"] = f"{type(e).__name__}: {e}"
+
+            report["seconds"] = round(time.perf_counter() - started_at, 2)
+
+    with open(job_dir / "answers.json", "w") as f:
+        json.dump(report, f, indent=2)
+
+    status_style = "green" if report["status"] == JOB_SUCCEEDED else "red"
+    console.print(
+        f"[{status_style}]{report['job_id']}: {report['status']}[/{status_style}] "
+        f"({len(report['answers'])}/{len(job['questions'])} questions, {report['seconds']:.1f}s)"
+        + (f" {report['error']}" if report["error"] else "")
+    )
+
+    return report
+
+
+async def run_batch(
+    jobs: list[dict],
+    output_dir: Path,
+    max_concurrent_sandboxes: int = 4,
+    job_timeout: float = 1800,
+    **session_kwargs,
+) -> list[dict]:
+    """
+    Runs every job, at most max_concurrent_sandboxes at a time (each job has its own sandbox).
+
+    Returns:
+        list[dict]: The jobs' reports, in the order of the jobs.
+    """
+
+    # Tool calls, uploads and sandbox calls of every running session go through the default executor, size it so
+    # concurrent sessions don't queue behind each other's threads.
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=max_concurrent_sandboxes * 8)
+    )
+
+    sandbox_slots = asyncio.Semaphore(max_concurrent_sandboxes)
+
+    return await asyncio.gather(
+        *(
+            run_batch_job(job, output_dir, sandbox_slots, job_timeout, **session_kwargs)
+            for job in jobs
+        )
+    )
+
+
+def batch_summary(reports: list[dict], seconds: float) -> dict:
+    """
+    Totals of a batch run: jobs per status, questions answered, throughput and token usage.
+    """
+
+    questions_answered = sum(
+        "error" not in answer for report in reports for answer in report["answers"]
+    )
+
+    return {
+        "jobs": len(reports),
+        **{
+            status: sum(report["status"] == status for report in reports)
+            for status in (
+                JOB_SUCCEEDED,
+                JOB_PARTIAL,
+                JOB_FAILED,
+                JOB_TIMED_OUT,
+                JOB_INVALID,
+            )
+        },
+        "questions_answered": questions_answered,
+        "seconds": round(seconds, 2),
+        "jobs_per_hour": round(len(reports) / seconds * 3600, 1) if seconds else 0.0,
+        "questions_per_minute": (
+            round(questions_answered / seconds * 60, 2) if seconds else 0.0
+        ),
+        "prompt_tokens": sum(
+            report.get("usage", {}).get("prompt_tokens", 0) for report in reports
+        ),
+        "completion_tokens": sum(
+            report.get("usage", {}).get("completion_tokens", 0) for report in reports
+        ),
+    }
+
+
+def display_batch_summary(summary: dict, reports: list[dict]):
+    failures_table = Table(
+        show_header=True, header_style="bold magenta", title="Jobs not succeeded"
+    )
+    failures_table.add_column("Job")
+    failures_table.add_column("Status")
+    failures_table.add_column("Error")
+
+    for report in reports:
+        if report["status"] != JOB_SUCCEEDED:
+            error = report["error"] or "; ".join(
+                answer["error"] for answer in report["answers"] if "error" in answer
+            )
+            failures_table.add_row(report["job_id"], report["status"], error)
+
+    if failures_table.rows:
+        console.print(failures_table)
+
+    summary_table = Table(show_header=False, title="Batch summary")
+    for key, value in summary.items():
+        summary_table.add_row(key.replace("_", " ").capitalize(), str(value))
+    console.print(summary_table)
+
+
+async def main(
+    jobs_file: str,
+    output_dir: str,
+    api_key_for_sandbox_and_model: str,
+    model_api_base_url: str,
+    model_for_eda: str,
+    sandbox_domain: str,
+    sandbox_template: str,
+    sandbox_timeout_seconds: int,
+    max_concurrent_sandboxes: int = 4,
+    job_timeout_seconds: float = 1800,
+    upload_compression: str | None = None,
+    cache_dir: str = "./.eda_cache/batch",
+    response_cache: ResponseCache | None = None,
+) -> int:
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    jobs = read_jobs(jobs_file)
+    console.print(
+        f"[bold cyan]Running {len(jobs)} job(s), {max_concurrent_sandboxes} at a time[/bold cyan] "
+        f"(session output in {output_dir / 'batch.log'})"
+    )
+
+    started_at = time.perf_counter()
+    with open(output_dir / "batch.log", "w") as log, contextlib.redirect_stdout(log):
+        reports = await run_batch(
+            jobs,
+            output_dir,
+            max_concurrent_sandboxes,
+            job_timeout_seconds,
+            model_for_eda=model_for_eda,
+            api_key_for_sandbox_and_model=api_key_for_sandbox_and_model,
+            model_api_base_url=model_api_base_url,
+            sandbox_domain=sandbox_domain,
+            sandbox_template=sandbox_template,
+            sandbox_timeout=sandbox_timeout_seconds,
+            upload_compression=upload_compression,
+            cache_dir=Path(cache_dir),
+            response_cache=response_cache,
+        )
+
+    summary = batch_summary(reports, time.perf_counter() - started_at)
+    if response_cache:
+        summary["response_cache"] = response_cache.summary()
+    with open(output_dir / "batch_report.json", "w") as f:
+        json.dump({"summary": summary, "jobs": reports}, f, indent=2)
+
+    display_batch_summary(summary, reports)
+    console.print(f"[dim]Report written to {output_dir / 'batch_report.json'}[/dim]")
+
+    return 0 if summary["jobs"] == summary[JOB_SUCCEEDED] else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Runs the same EDA questions over many datasets without the interactive menu."
+    )
+    parser.add_argument(
+        "jobs_file",
+        help='JSONL, one job per line: {"id": "...", "datasets": ["data.csv"], "questions": ["..."]}',
+    )
+    parser.add_argument("--output-dir", default="./batch_output")
+    parser.add_argument(
+        "--max-concurrent-sandboxes",
+        type=int,
+        default=4,
+        help="Jobs running at the same time, each in its own sandbox.",
+    )
+    parser.add_argument(
+        "--job-timeout",
+        type=float,
+        default=1800,
+        help="Seconds a job may run for once it has a sandbox.",
+    )
+    parser.add_argument(
+        "--response-cache",
+        choices=RESPONSE_CACHE_MODES,
+        default="passthrough",
+        help="record: reuse recorded model responses and record new ones, replay: only reuse recorded ones "
+        "(fails on a new request, costs nothing), passthrough: always call the model.",
+    )
+    parser.add_argument("--response-cache-dir", default="./.eda_cache/responses")
+    args = parser.parse_args()
+
+    NOVITA_API_KEY = os.getenv("NOVITA_API_KEY")
+    NOVITA_BASE_URL = os.getenv("NOVITA_BASE_URL")
+    NOVITA_E2B_DOMAIN = os.getenv("NOVITA_E2B_DOMAIN")
+    NOVITA_E2B_TEMPLATE = os.getenv("NOVITA_E2B_TEMPLATE")
+    NOVITA_MODEL_FOR_EDA = "qwen/qwen3-coder-480b-a35b-instruct"
+    UPLOAD_COMPRESSION = "gzip"  # Compress datasets on the wire; options [None, 'gzip', 'zstd' (needs the zstandard package)].
+
+    sys.exit(
+        asyncio.run(
+            main(
+                args.jobs_file,
+                args.output_dir,
+                NOVITA_API_KEY,
+                NOVITA_BASE_URL,
+                NOVITA_MODEL_FOR_EDA,
+                NOVITA_E2B_DOMAIN,
+                NOVITA_E2B_TEMPLATE,
+                # The sandbox outlives the job's timeout, so a timed out job is stopped by us, not the sandbox.
+                int(args.job_timeout) + 300,
+                args.max_concurrent_sandboxes,
+                args.job_timeout,
+                UPLOAD_COMPRESSION,
+                response_cache=ResponseCache(
+                    args.response_cache_dir, mode=args.response_cache
+                ),
+            )
+        )
+    )
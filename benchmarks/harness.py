@@ -0,0 +1,137 @@
+import contextlib
+import gc
+import os
+import statistics
+import time
+from typing import Awaitable, Callable
+
+
+def summarize(name: str, samples: list[float], bytes_per_round: int = 0) -> dict:
+    """
+    Statistics of a benchmark's timed rounds (in seconds), with throughput when each round moves bytes_per_round.
+    """
+
+    median = statistics.median(samples)
+    result = {
+        "name": name,
+        "rounds": len(samples),
+        "min_seconds": min(samples),
+        "max_seconds": max(samples),
+        "mean_seconds": statistics.fmean(samples),
+        "median_seconds": median,
+        "stddev_seconds": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "ops_per_second": 1 / median if median else 0.0,
+    }
+
+    if bytes_per_round:
+        result["mb_per_second"] = (
+            bytes_per_round / median / 1_000_000 if median else 0.0
+        )
+
+    return result
+
+
+def time_rounds(
+    run: Callable[[object], object],
+    rounds: int,
+    warmup: int = 1,
+    setup: Callable[[], object] | None = None,
+    teardown: Callable[[object], object] | None = None,
+) -> list[float]:
+    """
+    Times run(state) rounds times after warmup untimed rounds, state coming from setup() (untimed) before every
+    round and teardown(state) (untimed) after it. Garbage is collected before each round so it isn't charged to
+    whichever round happens to trigger a collection.
+
+    Returns:
+        list[float]: Seconds taken by each timed round.
+    """
+
+    samples = []
+    for round_number in range(warmup + rounds):
+        state = setup() if setup else None
+        gc.collect()
+
+        started_at = time.perf_counter()
+        run(state)
+        seconds = time.perf_counter() - started_at
+
+        if teardown:
+            teardown(state)
+        if round_number >= warmup:
+            samples.append(seconds)
+
+    return samples
+
+
+async def time_rounds_async(
+    run: Callable[[object], Awaitable],
+    rounds: int,
+    warmup: int = 1,
+    setup: Callable[[], object] | None = None,
+) -> list[float]:
+    """
+    time_rounds for coroutines, every round runs in the same event loop.
+    """
+
+    samples = []
+    for round_number in range(warmup + rounds):
+        state = setup() if setup else None
+        gc.collect()
+
+        started_at = time.perf_counter()
+        await run(state)
+        seconds = time.perf_counter() - started_at
+
+        if round_number >= warmup:
+            samples.append(seconds)
+
+    return samples
+
+
+@contextlib.contextmanager
+def quiet():
+    """
+    Discards what the code under benchmark prints (rich consoles write to whatever sys.stdout is at the time),
+    so terminal rendering speed doesn't leak into the timings.
+    """
+
+    with open(os.devnull, "w") as devnull:
+        with contextlib.redirect_stdout(devnull):
+            yield
+
+
+def find_regressions(
+    results: list[dict],
+    baseline: list[dict],
+    threshold: float = 0.25,
+    min_seconds_delta: float = 0.002,
+) -> list[dict]:
+    """
+    Benchmarks whose median got slower than the baseline's by more than threshold (relative) and
+    min_seconds_delta (absolute, so sub-millisecond jitter on fast benchmarks isn't reported).
+
+    Returns:
+        list[dict]: {"name": str, "baseline_median_seconds": float, "median_seconds": float, "change": float}
+    """
+
+    baseline_medians = {entry["name"]: entry["median_seconds"] for entry in baseline}
+
+    regressions = []
+    for result in results:
+        baseline_median = baseline_medians.get(result["name"])
+        if baseline_median is None:
+            continue
+
+        delta = result["median_seconds"] - baseline_median
+        if delta > min_seconds_delta and delta > baseline_median * threshold:
+            regressions.append(
+                {
+                    "name": result["name"],
+                    "baseline_median_seconds": baseline_median,
+                    "median_seconds": result["median_seconds"],
+                    "change": delta / baseline_median,
+                }
+            )
+
+    return regressions
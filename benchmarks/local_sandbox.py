@@ -0,0 +1,272 @@
+import datetime
+import os
+import posixpath
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable
+
+from e2b import CommandExitException
+from e2b_code_interpreter import CommandResult, EntryInfo, Execution, FileType
+from e2b_code_interpreter.models import OutputMessage
+
+from fake_sandbox import FakeSandbox
+from sandbox_upload import SANDBOX_HOME_DIR
+
+# Sandbox paths that commands may use, mapped under the local root.
+_SANDBOX_PATH_PATTERN = re.compile(r"/home/user|/tmp/")
+
+
+class SimulatedLink:
+    """
+    The network between the client and a sandbox: every request waits latency_seconds, and transfers share a
+    pipe of bandwidth_bytes_per_second (so parallel transfers split it, as they would in reality).
+
+    Delays are computed, not measured, so a benchmark over the link gives the same timings run after run.
+    """
+
+    def __init__(
+        self,
+        latency_seconds: float = 0.0,
+        bandwidth_bytes_per_second: float | None = None,
+    ):
+        """
+        Args:
+            latency_seconds (float): Round trip time of every request.
+            bandwidth_bytes_per_second (float | None): Throughput of the pipe, None for unlimited.
+        """
+
+        self.latency_seconds = latency_seconds
+        self.bandwidth_bytes_per_second = bandwidth_bytes_per_second
+        self.bytes_transferred = 0
+
+        self._pipe_free_at = 0.0
+        self._lock = threading.Lock()
+
+    def request(self):
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+
+    def transfer(self, size: int):
+        """
+        Waits until size bytes have gone through the pipe, after the transfers already queued on it.
+        """
+
+        with self._lock:
+            self.bytes_transferred += size
+            if not self.bandwidth_bytes_per_second:
+                return
+
+            self._pipe_free_at = (
+                max(time.perf_counter(), self._pipe_free_at)
+                + size / self.bandwidth_bytes_per_second
+            )
+            done_at = self._pipe_free_at
+
+        # Sleeps shorter than a millisecond overshoot, small transfers leave their time to be waited for by the
+        # next transfer instead (the pipe stays busy until _pipe_free_at either way).
+        if done_at - time.perf_counter() > 0.001:
+            time.sleep(done_at - time.perf_counter())
+
+
+class _LocalFilesystem:
+    """
+    Sandbox.files backed by a local directory, with the sandbox's / mapped to root.
+    """
+
+    def __init__(self, root: Path, link: SimulatedLink):
+        self.root = root
+        self.link = link
+
+    def local_path(self, path) -> Path:
+        absolute = posixpath.normpath(posixpath.join(SANDBOX_HOME_DIR, str(path)))
+        return self.root / absolute.lstrip("/")
+
+    def sandbox_path(self, local_path: Path) -> str:
+        return "/" + local_path.relative_to(self.root).as_posix()
+
+    def write(self, path, data, **kwargs):
+        if hasattr(data, "read"):
+            data = data.read()
+        if isinstance(data, str):
+            data = data.encode()
+
+        self.link.request()
+        self.link.transfer(len(data))
+
+        local_path = self.local_path(path)
+        local_path.parent.mkdir(parents=True, exist_ok=True)
+        local_path.write_bytes(data)
+
+    def read(self, path, format="text", **kwargs):
+        self.link.request()
+
+        local_path = self.local_path(path)
+        if not local_path.is_file():
+            raise FileNotFoundError(f"No such file: {path}")
+
+        if format == "stream":
+            return self._stream(local_path)
+
+        content = local_path.read_bytes()
+        self.link.transfer(len(content))
+
+        if format == "bytes":
+            return bytearray(content)
+        return content.decode()
+
+    def _stream(self, local_path: Path, chunk_size: int = 64 * 1024):
+        with open(local_path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                self.link.transfer(len(chunk))
+                yield chunk
+
+    def exists(self, path, **kwargs) -> bool:
+        self.link.request()
+        return self.local_path(path).exists()
+
+    def get_info(self, path, **kwargs) -> EntryInfo:
+        self.link.request()
+        return self._info(self.local_path(path))
+
+    def _info(self, local_path: Path) -> EntryInfo:
+        if not local_path.exists():
+            raise FileNotFoundError(
+                f"No such file or directory: {self.sandbox_path(local_path)}"
+            )
+
+        stat = local_path.stat()
+        return EntryInfo(
+            name=local_path.name,
+            type=FileType.DIR if local_path.is_dir() else FileType.FILE,
+            path=self.sandbox_path(local_path),
+            size=0 if local_path.is_dir() else stat.st_size,
+            mode=0o644,
+            permissions="-rw-r--r--",
+            owner="user",
+            group="user",
+            modified_time=datetime.datetime.fromtimestamp(stat.st_mtime),
+        )
+
+    def list(self, path, **kwargs) -> list[EntryInfo]:
+        self.link.request()
+        return [self._info(child) for child in sorted(self.local_path(path).iterdir())]
+
+    def make_dir(self, path, **kwargs) -> bool:
+        self.link.request()
+        local_path = self.local_path(path)
+        created = not local_path.exists()
+        local_path.mkdir(parents=True, exist_ok=True)
+        return created
+
+    def remove(self, path, **kwargs):
+        self.link.request()
+        local_path = self.local_path(path)
+        if local_path.is_dir():
+            shutil.rmtree(local_path)
+        elif local_path.exists():
+            local_path.unlink()
+
+
+class LocalSandbox(FakeSandbox):
+    """
+    A FakeSandbox whose files live in a local directory and whose commands really run (locally, with the
+    sandbox's /home/user and /tmp mapped into that directory), over a SimulatedLink. So uploads, syncs and
+    everything else done with commands behave as they do in a real sandbox, at a chosen latency and bandwidth.
+
+    Code cells are not run, code_handler scripts their results (empty by default). Their stdout and stderr are
+    streamed to the on_stdout / on_stderr callbacks line by line.
+
+    Commands need what a sandbox provides (sh, tar, python3, ...) to be installed locally.
+    """
+
+    def __init__(
+        self,
+        latency_seconds: float = 0.0,
+        bandwidth_bytes_per_second: float | None = None,
+        code_handler: Callable[[str], Execution] | None = None,
+        root: str | None = None,
+        **kwargs,
+    ):
+        """
+        Args:
+            latency_seconds (float): Round trip time of every sandbox call.
+            bandwidth_bytes_per_second (float | None): Throughput of file transfers, None for unlimited.
+            code_handler (Callable[[str], Execution] | None): Returns the result of a code cell.
+            root (str | None): The local directory standing in for the sandbox's /, a temporary one by default
+                (deleted when the sandbox is killed).
+        """
+
+        super().__init__(
+            command_handler=self._run_command, code_handler=code_handler, **kwargs
+        )
+
+        self.link = SimulatedLink(latency_seconds, bandwidth_bytes_per_second)
+        self._owns_root = root is None
+        self.root = Path(root or tempfile.mkdtemp(prefix="eda-bench-sandbox-"))
+        for directory in (SANDBOX_HOME_DIR, "/tmp"):
+            (self.root / directory.lstrip("/")).mkdir(parents=True, exist_ok=True)
+
+        self.files = _LocalFilesystem(self.root, self.link)
+
+    def _run_command(self, cmd: str) -> CommandResult:
+        self.link.request()
+
+        process = subprocess.run(
+            _SANDBOX_PATH_PATTERN.sub(
+                lambda match: f"{self.root}{match.group(0)}", cmd
+            ),
+            shell=True,
+            capture_output=True,
+            text=True,
+            cwd=self.root / SANDBOX_HOME_DIR.lstrip("/"),
+            env={**os.environ, "HOME": str(self.root / SANDBOX_HOME_DIR.lstrip("/"))},
+        )
+
+        # Command output comes back over the link too (e.g. a manifest of every file).
+        self.link.transfer(len(process.stdout) + len(process.stderr))
+
+        if process.returncode != 0:
+            raise CommandExitException(
+                stderr=process.stderr,
+                stdout=process.stdout,
+                exit_code=process.returncode,
+                error=process.stderr,
+            )
+
+        return CommandResult(
+            stdout=process.stdout, stderr=process.stderr, exit_code=0, error=None
+        )
+
+    def run_code(
+        self, code: str, on_stdout=None, on_stderr=None, **kwargs
+    ) -> Execution:
+        self.link.request()
+        execution = super().run_code(code, **kwargs)
+
+        for callback, lines, error in (
+            (on_stdout, execution.logs.stdout, False),
+            (on_stderr, execution.logs.stderr, True),
+        ):
+            for line in lines:
+                self.link.transfer(len(line))
+                if callback:
+                    callback(OutputMessage(line, time.time_ns(), error))
+
+        for result in execution.results:
+            self.link.transfer(
+                sum(
+                    len(str(getattr(result, format, ""))) for format in result.formats()
+                )
+            )
+
+        return execution
+
+    def kill(self, **kwargs) -> bool:
+        if self._owns_root:
+            shutil.rmtree(self.root, ignore_errors=True)
+        return super().kill(**kwargs)
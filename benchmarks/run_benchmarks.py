@@ -0,0 +1,178 @@
+"""
+Offline benchmarks of the EDA agent's own overhead: the chat loop per turn, dataset uploads, directory syncs and
+large code outputs. The model is a local stub server replaying scripted responses and the sandbox a local
+directory behind a simulated link, so nothing is paid for and runs are repeatable.
+
+Run from the repository root:
+
+    python -m benchmarks.run_benchmarks --save baseline.json
+    python -m benchmarks.run_benchmarks --compare baseline.json  # exits with 1 on a regression
+"""
+
+import matplotlib
+
+matplotlib.use("Agg")  # Charts of the benchmarked code are rendered off screen.
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+from dataclasses import asdict
+
+from rich.console import Console
+from rich.markup import escape
+from rich.table import Table
+
+from benchmarks.harness import find_regressions
+from benchmarks.scenarios import SCENARIOS, BenchmarkOptions
+
+console = Console()
+
+
+def display_results(results: list[dict]):
+    results_table = Table(show_header=True, header_style="bold magenta")
+    results_table.add_column("Benchmark", overflow="fold")
+    results_table.add_column("Rounds", justify="right")
+    results_table.add_column("Min (ms)", justify="right")
+    results_table.add_column("Median (ms)", justify="right")
+    results_table.add_column("Max (ms)", justify="right")
+    results_table.add_column("Stddev (ms)", justify="right")
+    results_table.add_column("MB/s", justify="right")
+
+    for result in results:
+        results_table.add_row(
+            escape(result["name"]),
+            str(result["rounds"]),
+            f"{result['min_seconds'] * 1000:.1f}",
+            f"{result['median_seconds'] * 1000:.1f}",
+            f"{result['max_seconds'] * 1000:.1f}",
+            f"{result['stddev_seconds'] * 1000:.1f}",
+            f"{result['mb_per_second']:.1f}" if "mb_per_second" in result else "",
+        )
+
+    console.print(results_table)
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument(
+        "scenarios",
+        nargs="*",
+        help=f"Scenarios to run, all by default: {', '.join(SCENARIOS)}",
+    )
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument(
+        "--latency-ms",
+        type=float,
+        default=5,
+        help="Round trip time of every sandbox call.",
+    )
+    parser.add_argument(
+        "--bandwidth-mb-per-second",
+        type=float,
+        default=100,
+        help="Throughput of sandbox file transfers, 0 for unlimited.",
+    )
+    parser.add_argument(
+        "--model-latency-ms",
+        type=float,
+        default=0,
+        help="Time before each stub model response starts.",
+    )
+    parser.add_argument(
+        "--scale",
+        type=float,
+        default=1.0,
+        help="Multiplies the size of the generated datasets and outputs.",
+    )
+    parser.add_argument("--save", help="Write the results to this JSON file.")
+    parser.add_argument(
+        "--compare", help="Compare the medians to the results saved in this JSON file."
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="Relative slowdown of a median reported as a regression.",
+    )
+    args = parser.parse_args()
+
+    unknown_scenarios = set(args.scenarios) - set(SCENARIOS)
+    if unknown_scenarios:
+        parser.error(f"Unknown scenario(s): {', '.join(sorted(unknown_scenarios))}")
+
+    options = BenchmarkOptions(
+        rounds=args.rounds,
+        warmup=args.warmup,
+        latency_seconds=args.latency_ms / 1000,
+        bandwidth_bytes_per_second=args.bandwidth_mb_per_second * 1_000_000 or None,
+        model_latency_seconds=args.model_latency_ms / 1000,
+        scale=args.scale,
+    )
+
+    results = []
+    for name in args.scenarios or SCENARIOS:
+        console.print(f"[cyan]Running {name} benchmarks...[/cyan]")
+        results.extend(SCENARIOS[name](options))
+
+    display_results(results)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(
+                {
+                    "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "commit": git_commit(),
+                    "python": sys.version.split()[0],
+                    "platform": platform.platform(),
+                    "options": asdict(options),
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+        console.print(f"[dim]Results written to {args.save}[/dim]")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+        if baseline["options"] != asdict(options):
+            console.print(
+                "[yellow]The baseline was run with different options, its timings may not be comparable.[/yellow]"
+            )
+
+        regressions = find_regressions(results, baseline["results"], args.threshold)
+        for regression in regressions:
+            console.print(
+                f"[bold red]Regression: {escape(regression['name'])} median "
+                f"{regression['baseline_median_seconds'] * 1000:.1f} ms -> {regression['median_seconds'] * 1000:.1f} ms "
+                f"(+{regression['change']:.0%})[/bold red]"
+            )
+
+        if regressions:
+            return 1
+        console.print(
+            f"[bold green]No regressions against {args.compare} (commit {baseline['commit']})[/bold green]"
+        )
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,396 @@
+import asyncio
+import base64
+import io
+import random
+import shutil
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+
+import matplotlib.pyplot as plt
+from e2b_code_interpreter import Execution, Logs
+from e2b_code_interpreter.models import Result
+from openai import AsyncOpenAI
+from PIL import Image
+
+from benchmarks.harness import quiet, summarize, time_rounds, time_rounds_async
+from benchmarks.local_sandbox import LocalSandbox
+from benchmarks.stub_model_server import StubModelServer
+from sandbox_eda import SandboxEDA
+from tracing import Tracer
+
+# Every generated dataset comes from this seed, so every run benchmarks the same bytes.
+DATA_SEED = 1234
+
+# User message -> the scripted model responses to it, for the chat loop benchmarks.
+CHAT_SCRIPT = {
+    "answer without tools": [
+        {
+            "content": "The dataset has 12 columns and no missing values in the key fields."
+        }
+    ],
+    "one tool call": [
+        {
+            "tool_calls": [
+                {
+                    "name": "run_python_code",
+                    "arguments": {"python_code": "print(df_sales.describe())"},
+                }
+            ]
+        },
+        {"content": "Sales are right skewed, with a median well below the mean."},
+    ],
+    "four tool calls": [
+        {
+            "tool_calls": [
+                {
+                    "name": "run_python_code",
+                    "arguments": {"python_code": "print(df_sales.describe())"},
+                },
+                {
+                    "name": "run_python_code",
+                    "arguments": {"python_code": "print(df_sales.isna().sum())"},
+                },
+                {"name": "run_on_command_line", "arguments": {"command": "ls -la"}},
+                {
+                    "name": "run_on_command_line",
+                    "arguments": {"command": "head -n 5 sales.csv"},
+                },
+            ]
+        },
+        {"content": "Four checks done, the data is clean and ready to model."},
+    ],
+}
+
+
+@dataclass
+class BenchmarkOptions:
+    rounds: int = 10
+    warmup: int = 1
+    latency_seconds: float = 0.005
+    bandwidth_bytes_per_second: float | None = 100_000_000
+    model_latency_seconds: float = 0.0
+    scale: float = 1.0  # Multiplies the size of the generated data.
+
+
+def make_sandbox_eda(sandbox: LocalSandbox, work_dir: Path, **kwargs) -> SandboxEDA:
+    """
+    A SandboxEDA keeping everything it writes locally under work_dir, without the dataset profiling / preloading
+    that need pandas in the sandbox, and tracing in memory only.
+    """
+
+    return SandboxEDA(
+        sandbox,
+        "http://unused",
+        "unused",
+        fingerprint_index_path=str(work_dir / "fingerprints.json"),
+        sync_folder=str(work_dir / "sync_folder"),
+        artifact_store_path=str(work_dir / "artifacts"),
+        profile_cache_path=str(work_dir / "profiles"),
+        image_output_path=str(work_dir / "images"),
+        profile_datasets_on_upload=False,
+        preload_datasets_on_upload=False,
+        tracer=Tracer(trace_directory=None),
+        **kwargs,
+    )
+
+
+def close_sandbox_eda(sandbox_eda: SandboxEDA):
+    sandbox_eda.job_manager.shutdown()
+    sandbox_eda.image_pipeline.shutdown()
+    sandbox_eda.sandbox.kill()
+    plt.close("all")
+
+
+def write_csv(path: Path, size_bytes: int, rng: random.Random):
+    """
+    Writes a CSV of about size_bytes of made up sales data.
+    """
+
+    regions = ["north", "south", "east", "west"]
+    lines = ["order_id,region,units,unit_price,discount,returned"]
+    written = len(lines[0]) + 1
+    order_id = 0
+
+    while written < size_bytes:
+        order_id += 1
+        line = (
+            f"{order_id},{rng.choice(regions)},{rng.randint(1, 50)},"
+            f"{rng.uniform(1, 500):.2f},{rng.choice([0, 0, 0.05, 0.1])},{rng.random() < 0.03}"
+        )
+        lines.append(line)
+        written += len(line) + 1
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text("\n".join(lines) + "\n")
+
+
+def chat_turn_benchmarks(options: BenchmarkOptions) -> list[dict]:
+    """
+    Time per agent turn (model calls through the stub server, tool calls in the sandbox) with streamed and
+    plain responses. With no model latency this is the chat loop's own overhead per turn.
+    """
+
+    def code_handler(code: str) -> Execution:
+        if "getpid" in code:
+            return Execution(logs=Logs(stdout=["4242\n"], stderr=[]))
+        return Execution(
+            results=[Result(text="(1000, 6)", is_main_result=True)],
+            logs=Logs(stdout=[f"{line}\n" for line in range(20)], stderr=[]),
+        )
+
+    async def run_all(server: StubModelServer, work_dir: Path) -> list[dict]:
+        client = AsyncOpenAI(base_url=server.base_url, api_key="stub")
+        results = []
+
+        for stream in (False, True):
+            sandbox = LocalSandbox(
+                options.latency_seconds,
+                options.bandwidth_bytes_per_second,
+                code_handler=code_handler,
+            )
+            sandbox_eda = make_sandbox_eda(
+                sandbox, work_dir / f"stream-{stream}", stream_responses=stream
+            )
+            initial_messages = sandbox_eda.initial_messages(["sales.csv"])
+
+            for user_message in CHAT_SCRIPT:
+
+                async def run(messages):
+                    await sandbox_eda.run_agent_turn(client, messages, "stub-model")
+
+                samples = await time_rounds_async(
+                    run,
+                    options.rounds,
+                    options.warmup,
+                    setup=lambda: [
+                        *initial_messages,
+                        {"role": "user", "content": user_message},
+                    ],
+                )
+                results.append(
+                    summarize(
+                        f"chat_turn[{'stream' if stream else 'plain'}, {user_message}]",
+                        samples,
+                    )
+                )
+
+            close_sandbox_eda(sandbox_eda)
+
+        await client.close()
+        return results
+
+    with (
+        tempfile.TemporaryDirectory() as work_dir,
+        StubModelServer(
+            CHAT_SCRIPT, latency_seconds=options.model_latency_seconds
+        ) as server,
+    ):
+        with quiet():
+            return asyncio.run(run_all(server, Path(work_dir)))
+
+
+def upload_benchmarks(options: BenchmarkOptions) -> list[dict]:
+    """
+    Throughput of uploading datasets (one large file, many small ones) to a fresh sandbox, uncompressed and
+    gzip compressed.
+    """
+
+    rng = random.Random(DATA_SEED)
+    results = []
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        work_dir = Path(work_dir)
+
+        datasets = {
+            "one large file": [work_dir / "data" / "large.csv"],
+            "many small files": [
+                work_dir / "data" / f"small_{index}.csv" for index in range(40)
+            ],
+        }
+        write_csv(datasets["one large file"][0], int(32_000_000 * options.scale), rng)
+        for path in datasets["many small files"]:
+            write_csv(path, int(200_000 * options.scale), rng)
+
+        for name, file_paths in datasets.items():
+            total_bytes = sum(path.stat().st_size for path in file_paths)
+
+            for compression in (None, "gzip"):
+
+                def setup():
+                    round_dir = Path(tempfile.mkdtemp(dir=work_dir))
+                    sandbox = LocalSandbox(
+                        options.latency_seconds, options.bandwidth_bytes_per_second
+                    )
+                    return make_sandbox_eda(
+                        sandbox, round_dir, upload_compression=compression
+                    )
+
+                def run(sandbox_eda):
+                    sandbox_eda.upload_files_to_sandbox(
+                        [str(path) for path in file_paths],
+                        [path.name for path in file_paths],
+                    )
+
+                with quiet():
+                    samples = time_rounds(
+                        run,
+                        options.rounds,
+                        options.warmup,
+                        setup=setup,
+                        teardown=close_sandbox_eda,
+                    )
+
+                results.append(
+                    summarize(
+                        f"upload[{name}, {compression or 'uncompressed'}]",
+                        samples,
+                        bytes_per_round=total_bytes,
+                    )
+                )
+
+    return results
+
+
+def sync_benchmarks(options: BenchmarkOptions) -> list[dict]:
+    """
+    Throughput of syncing a sandbox output directory to the sync folder: from scratch, when nothing changed, and
+    when one file changed.
+    """
+
+    rng = random.Random(DATA_SEED)
+    results = []
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        work_dir = Path(work_dir)
+
+        sandbox = LocalSandbox(
+            options.latency_seconds, options.bandwidth_bytes_per_second
+        )
+        sandbox_eda = make_sandbox_eda(sandbox, work_dir)
+
+        outputs_dir = sandbox.files.local_path("outputs")
+        for index in range(200):
+            write_csv(
+                outputs_dir / "tables" / f"table_{index}.csv",
+                int(50_000 * options.scale),
+                rng,
+            )
+        for index in range(2):
+            write_csv(
+                outputs_dir / f"cleaned_{index}.csv",
+                int(4_000_000 * options.scale),
+                rng,
+            )
+        total_bytes = sum(
+            path.stat().st_size for path in outputs_dir.rglob("*") if path.is_file()
+        )
+        sync_folder = Path(sandbox_eda.sync_folder)
+
+        def sync():
+            result = sandbox_eda.sync_with_user("outputs", "outputs")
+            if result != "Sync Successful":
+                raise RuntimeError(result)
+
+        def from_scratch():
+            shutil.rmtree(sync_folder, ignore_errors=True)
+
+        def after_one_change():
+            with open(outputs_dir / "tables" / "table_0.csv", "a") as f:
+                f.write(f"{rng.randint(0, 10**9)},north,1,1.00,0,False\n")
+
+        with quiet():
+            sync()
+            for name, setup, bytes_per_round in (
+                ("from scratch", from_scratch, total_bytes),
+                ("unchanged", None, 0),
+                ("one file changed", after_one_change, 0),
+            ):
+                samples = time_rounds(
+                    lambda _: sync(), options.rounds, options.warmup, setup=setup
+                )
+                results.append(
+                    summarize(f"sync[{name}]", samples, bytes_per_round=bytes_per_round)
+                )
+
+            close_sandbox_eda(sandbox_eda)
+
+    return results
+
+
+def large_output_benchmarks(options: BenchmarkOptions) -> list[dict]:
+    """
+    Time to handle a code execution with a large output: megabytes of stdout streamed line by line, a large
+    text result and a few charts, through display, encoding for the model, artifact spilling and image saving.
+    """
+
+    rng = random.Random(DATA_SEED)
+
+    def chart(seed: int) -> str:
+        image = Image.new("RGB", (1000, 600), "white")
+        pixels = image.load()
+        for x in range(0, 1000, 2):
+            y = int(300 + 250 * ((x * seed) % 97 - 48) / 48)
+            for dy in range(-3, 4):
+                pixels[x, max(0, min(599, y + dy))] = (31, 119, 180)
+
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG")
+        return base64.b64encode(buffer.getvalue()).decode()
+
+    stdout = [
+        f"epoch {index}: loss={rng.random():.6f} accuracy={rng.random():.6f} "
+        f"lr={rng.random() / 100:.8f} grad_norm={rng.random() * 10:.4f}\n"
+        for index in range(int(10_000 * options.scale))
+    ]
+    table = "\n".join(
+        " ".join(f"{rng.random():12.6f}" for _ in range(10))
+        for _ in range(int(10_000 * options.scale))
+    )
+    execution = Execution(
+        results=[Result(png=chart(seed)) for seed in (3, 5, 7, 11)]
+        + [Result(text=table, is_main_result=True)],
+        logs=Logs(stdout=stdout, stderr=[]),
+    )
+
+    def code_handler(code: str) -> Execution:
+        if "getpid" in code:
+            return Execution(logs=Logs(stdout=["4242\n"], stderr=[]))
+        return execution
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        sandbox = LocalSandbox(
+            options.latency_seconds,
+            options.bandwidth_bytes_per_second,
+            code_handler=code_handler,
+        )
+        sandbox_eda = make_sandbox_eda(sandbox, Path(work_dir))
+
+        with quiet():
+            samples = time_rounds(
+                lambda _: sandbox_eda.handle_tool_call(
+                    "run_python_code", {"python_code": "train()"}, "call_1"
+                ),
+                options.rounds,
+                options.warmup,
+            )
+            close_sandbox_eda(sandbox_eda)
+
+        results.append(
+            summarize(
+                "large_output[run_python_code]",
+                samples,
+                bytes_per_round=sum(len(line) for line in stdout) + len(table),
+            )
+        )
+
+    return results
+
+
+SCENARIOS = {
+    "chat_turn": chat_turn_benchmarks,
+    "upload": upload_benchmarks,
+    "sync": sync_benchmarks,
+    "large_output": large_output_benchmarks,
+}
@@ -0,0 +1,251 @@
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubModelServer:
+    """
+    A local OpenAI compatible chat completions server that replays scripted responses, so the chat loop can be
+    exercised (and timed) without calling a real model.
+
+    The script maps a user message to the responses given to it, in order: the Nth response after a user message
+    is given when the request has N - 1 assistant messages after that user message. Responses are either
+    {"tool_calls": [{"name": str, "arguments": dict}, ...]} or {"content": str}. A user message that isn't in the
+    script, or runs out of responses, is answered with "Done.".
+
+    Both plain and streamed (server-sent events) responses are supported, with usage (prompt tokens estimated at
+    4 characters per token).
+    """
+
+    def __init__(
+        self,
+        script: dict[str, list[dict]],
+        latency_seconds: float = 0.0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        """
+        Args:
+            script (dict[str, list[dict]]): {user_message: [response, ...]}.
+            latency_seconds (float): Time before each response starts, to stand in for the model's time to first token.
+            host (str): Address to listen on.
+            port (int): Port to listen on, 0 for any free port.
+        """
+
+        self.script = script
+        self.latency_seconds = latency_seconds
+        self.requests = 0
+
+        self._tool_call_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "StubModelServer":
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="stub-model-server", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def response_for(self, messages: list[dict]) -> dict:
+        """
+        The scripted response to a conversation, as {"content": str | None, "tool_calls": [message tool call dicts]}.
+        """
+
+        user_indices = [
+            index for index, message in enumerate(messages) if message["role"] == "user"
+        ]
+        if not user_indices:
+            return {"content": "Done.", "tool_calls": []}
+
+        responses_given = sum(
+            message["role"] == "assistant" for message in messages[user_indices[-1] :]
+        )
+        responses = self.script.get(messages[user_indices[-1]]["content"], [])
+        if responses_given >= len(responses):
+            return {"content": "Done.", "tool_calls": []}
+
+        response = responses[responses_given]
+        with self._lock:
+            tool_calls = [
+                {
+                    "id": f"call_{next(self._tool_call_ids)}",
+                    "type": "function",
+                    "function": {
+                        "name": tool_call["name"],
+                        "arguments": json.dumps(tool_call["arguments"]),
+                    },
+                }
+                for tool_call in response.get("tool_calls", [])
+            ]
+
+        return {"content": response.get("content"), "tool_calls": tool_calls}
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are separate writes, Nagle's algorithm would hold the body back for a delayed ACK.
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+
+                if not self.path.endswith("/chat/completions"):
+                    self.send_error(404)
+                    return
+
+                with server._lock:
+                    server.requests += 1
+
+                if server.latency_seconds:
+                    time.sleep(server.latency_seconds)
+
+                response = server.response_for(body["messages"])
+                usage = {
+                    "prompt_tokens": len(json.dumps(body["messages"])) // 4,
+                    "completion_tokens": len(json.dumps(response)) // 4,
+                    "prompt_tokens_details": {"cached_tokens": 0},
+                }
+                usage["total_tokens"] = (
+                    usage["prompt_tokens"] + usage["completion_tokens"]
+                )
+
+                if body.get("stream"):
+                    self._send_stream(
+                        body["model"],
+                        response,
+                        (
+                            usage
+                            if (body.get("stream_options") or {}).get("include_usage")
+                            else None
+                        ),
+                    )
+                else:
+                    self._send_completion(body["model"], response, usage)
+
+            def _send_completion(self, model: str, response: dict, usage: dict):
+                message = {"role": "assistant", "content": response["content"]}
+                if response["tool_calls"]:
+                    message["tool_calls"] = response["tool_calls"]
+
+                data = json.dumps(
+                    {
+                        "id": "chatcmpl-stub",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": model,
+                        "choices": [
+                            {
+                                "index": 0,
+                                "message": message,
+                                "finish_reason": (
+                                    "tool_calls" if response["tool_calls"] else "stop"
+                                ),
+                            }
+                        ],
+                        "usage": usage,
+                    }
+                ).encode()
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_stream(self, model: str, response: dict, usage: dict | None):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                def send_chunk(choices: list, chunk_usage: dict | None = None):
+                    event = json.dumps(
+                        {
+                            "id": "chatcmpl-stub",
+                            "object": "chat.completion.chunk",
+                            "created": int(time.time()),
+                            "model": model,
+                            "choices": choices,
+                            "usage": chunk_usage,
+                        }
+                    )
+                    self._write_chunk(f"data: {event}\n\n".encode())
+
+                def send_delta(delta: dict, finish_reason: str | None = None):
+                    send_chunk(
+                        [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+                    )
+
+                send_delta({"role": "assistant", "content": ""})
+
+                # Text a few words at a time, tool call arguments in two halves, like a real stream.
+                words = (response["content"] or "").split(" ")
+                for start in range(0, len(words), 4) if response["content"] else []:
+                    send_delta({"content": " ".join(words[start : start + 4]) + " "})
+
+                for index, tool_call in enumerate(response["tool_calls"]):
+                    arguments = tool_call["function"]["arguments"]
+                    middle = len(arguments) // 2
+                    send_delta(
+                        {
+                            "tool_calls": [
+                                {
+                                    "index": index,
+                                    "id": tool_call["id"],
+                                    "type": "function",
+                                    "function": {
+                                        "name": tool_call["function"]["name"],
+                                        "arguments": arguments[:middle],
+                                    },
+                                }
+                            ]
+                        }
+                    )
+                    send_delta(
+                        {
+                            "tool_calls": [
+                                {
+                                    "index": index,
+                                    "function": {"arguments": arguments[middle:]},
+                                }
+                            ]
+                        }
+                    )
+
+                send_delta({}, "tool_calls" if response["tool_calls"] else "stop")
+                if usage:
+                    send_chunk([], usage)
+
+                self._write_chunk(b"data: [DONE]\n\n")
+                self._write_chunk(b"")
+
+            def _write_chunk(self, data: bytes):
+                self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -2,11 +2,15 @@ from typing import Tuple, Optional
 
 from browser_use import Agent, BrowserProfile, BrowserSession, Controller
 from browser_use.llm import ChatOpenAI
+from browser_use.llm.views import ChatInvokeCompletion
 from pydantic import BaseModel, Field
 from rich.console import Console
 from rich.panel import Panel
 from pathlib import Path
 
+from response_cache import ResponseCache
+from tracing import Tracer
+
 console = Console()
 
 
@@ -29,6 +33,57 @@ class AgentOutput(BaseModel):
     )
 
 
+# The ChatOpenAI settings a response depends on, part of the response cache keys.
+CHAT_MODEL_CACHE_KEY_FIELDS = (
+    "model",
+    "temperature",
+    "frequency_penalty",
+    "top_p",
+    "seed",
+    "max_completion_tokens",
+    "reasoning_effort",
+    "service_tier",
+)
+
+
+class CachedChatModel:
+    """
+    A browser_use chat model whose responses go through a ResponseCache, everything else is the wrapped model's.
+    """
+
+    def __init__(self, llm: ChatOpenAI, response_cache: ResponseCache):
+        self.llm = llm
+        self.response_cache = response_cache
+
+    def __getattr__(self, name: str):
+        if name == "llm":  # Not set yet, e.g. while being copied.
+            raise AttributeError(name)
+        return getattr(self.llm, name)
+
+    async def ainvoke(self, messages, output_format=None, **kwargs):
+        def load(data: dict) -> ChatInvokeCompletion:
+            if output_format is not None:
+                data["completion"] = output_format.model_validate(data["completion"])
+            return ChatInvokeCompletion(**data)
+
+        return await self.response_cache.cached_call(
+            {
+                "api": f"browser_use.{self.llm.provider}",
+                "params": {
+                    field: getattr(self.llm, field, None)
+                    for field in CHAT_MODEL_CACHE_KEY_FIELDS
+                },
+                "messages": messages,
+                "output_format": (
+                    output_format.model_json_schema() if output_format else None
+                ),
+            },
+            lambda: self.llm.ainvoke(messages, output_format, **kwargs),
+            lambda response: response.model_dump(mode="json"),
+            load,
+        )
+
+
 async def downloading_task_for_browser_agent(
     task: str,
     api_key: str,
@@ -36,6 +91,8 @@ async def downloading_task_for_browser_agent(
     model_api_base_url: str,
     use_vision: bool,
     download_dir_path: str = "./Download",
+    tracer: Tracer | None = None,
+    response_cache: ResponseCache | None = None,
 ) -> Tuple[str, list[str]]:
     """
     Will perform the user's download task via browser use and return download directory path and the
@@ -43,17 +100,28 @@ async def downloading_task_for_browser_agent(
 
     Returns:
         Tuple of (download_directory, filenames_with_extension)
+
+    Note:
+        The agent run is recorded as a "browser_download" span on the tracer, with its token usage. With a
+        response_cache the model's responses are recorded or replayed (see response_cache.py), though pages that
+        changed since they were recorded make different requests.
     """
 
+    tracer = tracer or Tracer(trace_directory=None)
+
+    llm = ChatOpenAI(
+        base_url=model_api_base_url,
+        model=model,
+        api_key=api_key,
+        max_completion_tokens=20_000,
+        frequency_penalty=0,  # This penalty can slightly affect tool use; keep at 0.
+    )
+    if response_cache and response_cache.enabled:
+        llm = CachedChatModel(llm, response_cache)
+
     agent = Agent(
         task=task,
-        llm=ChatOpenAI(
-            base_url=model_api_base_url,
-            model=model,
-            api_key=api_key,
-            max_completion_tokens=20_000,
-            frequency_penalty=0,  # This penalty can slightly affect tool use; keep at 0.
-        ),
+        llm=llm,
         use_vision=use_vision,
         vision_detail_level="auto",  # available options ['low', 'high', 'auto']; note high detail means more token cost; low should suffice for most tasks.
         browser_session=BrowserSession(
@@ -70,7 +138,16 @@ async def downloading_task_for_browser_agent(
 
     try:
         # Run the agent and structure its output
-        all_results = await agent.run()
+        with tracer.span("browser_download", model=model) as span:
+            all_results = await agent.run()
+
+            if all_results.usage:
+                span.set(
+                    prompt_tokens=all_results.usage.total_prompt_tokens,
+                    cached_tokens=all_results.usage.total_prompt_cached_tokens,
+                    completion_tokens=all_results.usage.total_completion_tokens,
+                )
+
         final_output: AgentOutput = AgentOutput.model_validate_json(
             all_results.final_result()
         )
@@ -0,0 +1,214 @@
+import json
+import keyword
+import re
+from pathlib import Path
+
+from e2b_code_interpreter import Sandbox
+
+from sandbox_upload import SANDBOX_HOME_DIR, sandbox_absolute_path
+
+# Columnar copies of the datasets, named by content hash so a dataset is only converted once per sandbox.
+SANDBOX_COLUMNAR_DIR = f"{SANDBOX_HOME_DIR}/.columnar"
+
+# Run in the kernel after _EDA_PRELOAD_SPECS (JSON) and _EDA_COLUMNAR_DIR are set: loads every dataset into a
+# global, from its columnar copy when there is one (converting it otherwise), and prints {dataframe_name: "dataframe" | "memory_mapped" | "error: ..."} as JSON.
+# The fingerprint of each DataFrame as loaded is kept in _EDA_PRELOADED_FINGERPRINTS, so a checkpoint can leave out
+# the ones the session didn't change (they're preloaded again on resume).
+# Datasets too big to keep resident are streamed into an uncompressed Arrow IPC file and memory mapped as a
+# pyarrow Table, so their pages are only read from disk when used.
+PRELOAD_CODE = r"""
+import json as _json, os as _os
+
+import pandas as _pd
+import pyarrow as _pa
+import pyarrow.csv as _pa_csv
+import pyarrow.ipc as _pa_ipc
+import pyarrow.parquet as _pq
+
+_EDA_PRELOADED_FINGERPRINTS = globals().get("_EDA_PRELOADED_FINGERPRINTS", {})
+
+
+def _eda_dataframe_fingerprint(df):
+    # Changes with the columns, the dtypes, the index or any value (and their order), None if a value can't be hashed.
+    import hashlib
+
+    try:
+        row_hashes = _pd.util.hash_pandas_object(df, index=True).values
+    except Exception:
+        return None
+    return [list(map(str, df.columns)), list(map(str, df.dtypes)), hashlib.blake2b(row_hashes.tobytes()).hexdigest()]
+
+
+def _eda_read_with_pandas(path, extension):
+    if extension in (".csv", ".tsv"):
+        return _pd.read_csv(path, sep="\t" if extension == ".tsv" else ",", low_memory=False)
+    if extension == ".parquet":
+        return _pd.read_parquet(path)
+    if extension in (".json", ".jsonl"):
+        return _pd.read_json(path, lines=extension == ".jsonl")
+    if extension in (".xlsx", ".xls"):
+        return _pd.read_excel(path)
+    raise ValueError(f"unsupported file type {extension}")
+
+
+def _eda_write_arrow(path, extension, arrow_path):
+    if extension in (".csv", ".tsv"):
+        batches = _pa_csv.open_csv(
+            path,
+            read_options=_pa_csv.ReadOptions(block_size=64 * 1024 * 1024),
+            parse_options=_pa_csv.ParseOptions(delimiter="\t" if extension == ".tsv" else ","),
+        )
+        schema = batches.schema
+    elif extension == ".parquet":
+        parquet_file = _pq.ParquetFile(path)
+        batches, schema = parquet_file.iter_batches(), parquet_file.schema_arrow
+    else:
+        table = _pa.Table.from_pandas(_eda_read_with_pandas(path, extension), preserve_index=False)
+        batches, schema = table.to_batches(), table.schema
+
+    temp_path = f"{arrow_path}.tmp"
+    with _pa_ipc.new_file(temp_path, schema) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+    _os.replace(temp_path, arrow_path)
+
+
+def _eda_preload(specs, columnar_dir):
+    _os.makedirs(columnar_dir, exist_ok=True)
+    loaded = {}
+
+    for spec in specs:
+        path, name, extension = spec["path"], spec["name"], _os.path.splitext(spec["path"])[1].lower()
+
+        try:
+            if spec["memory_mapped"]:
+                arrow_path = f"{columnar_dir}/{spec['sha256']}.arrow"
+                if not _os.path.exists(arrow_path):
+                    _eda_write_arrow(path, extension, arrow_path)
+                globals()[name] = _pa_ipc.open_file(_pa.memory_map(arrow_path)).read_all()
+                loaded[name] = "memory_mapped"
+                continue
+
+            parquet_path = f"{columnar_dir}/{spec['sha256']}.parquet"
+            if _os.path.exists(parquet_path):
+                globals()[name] = _pd.read_parquet(parquet_path)
+            else:
+                globals()[name] = df = _eda_read_with_pandas(path, extension)
+                try:
+                    df.to_parquet(f"{parquet_path}.tmp")
+                    _os.replace(f"{parquet_path}.tmp", parquet_path)
+                except Exception:  # e.g. mixed type object columns, the DataFrame is still loaded.
+                    if _os.path.exists(f"{parquet_path}.tmp"):
+                        _os.remove(f"{parquet_path}.tmp")
+            _EDA_PRELOADED_FINGERPRINTS[name] = _eda_dataframe_fingerprint(globals()[name])
+            loaded[name] = "dataframe"
+
+        except Exception as e:
+            loaded[name] = f"error: {type(e).__name__}: {e}"
+
+    return loaded
+
+
+print(_json.dumps(_eda_preload(_json.loads(_EDA_PRELOAD_SPECS), _EDA_COLUMNAR_DIR)))
+"""
+
+
+def dataframe_name(file_name_in_sandbox: str, taken: set[str]) -> str:
+    """
+    A well-known, valid Python name for a dataset's DataFrame (e.g. "sales 2024.csv" -> "df_sales_2024").
+    """
+
+    stem = re.sub(r"\W+", "_", Path(file_name_in_sandbox).stem).strip("_").lower()
+    name = f"df_{stem}" if stem else "df"
+
+    candidate, number = name, 2
+    while candidate in taken or keyword.iskeyword(candidate):
+        candidate, number = f"{name}_{number}", number + 1
+
+    taken.add(candidate)
+    return candidate
+
+
+def preload_datasets(
+    sandbox: Sandbox,
+    dataset_hashes: dict[str, str],
+    dataset_sizes: dict[str, int],
+    dataframe_names: dict[str, str],
+    resident_limit_bytes: int,
+    timeout: float = 600,
+) -> dict[str, dict]:
+    """
+    Loads datasets into the sandbox's kernel under well-known names, converting each to a columnar copy once
+    (Parquet, or Arrow IPC for memory mapped ones) so reloading them never parses the original file again.
+
+    Args:
+        sandbox (Sandbox): The sandbox whose kernel the datasets are loaded in.
+        dataset_hashes (dict[str, str]): {file_name_in_sandbox: sha256 of its content}.
+        dataset_sizes (dict[str, int]): {file_name_in_sandbox: size in bytes}.
+        dataframe_names (dict[str, str]): {file_name_in_sandbox: the global name to load it under}.
+        resident_limit_bytes (int): Datasets larger than this are memory mapped as a pyarrow Table instead of
+            being loaded as a pandas DataFrame.
+        timeout (float): Seconds the loading may take.
+
+    Returns:
+        dict[str, dict]: {file_name_in_sandbox: {"name": str, "status": "dataframe" | "memory_mapped" | "error: ...",
+        "columnar_path": str}}
+    """
+
+    specs = []
+    for file_name_in_sandbox, file_hash in dataset_hashes.items():
+        specs.append(
+            {
+                "path": sandbox_absolute_path(file_name_in_sandbox),
+                "name": dataframe_names[file_name_in_sandbox],
+                "sha256": file_hash,
+                "memory_mapped": dataset_sizes[file_name_in_sandbox]
+                > resident_limit_bytes,
+            }
+        )
+
+    execution = sandbox.run_code(
+        f"_EDA_PRELOAD_SPECS = {json.dumps(specs)!r}\n"
+        f"_EDA_COLUMNAR_DIR = {SANDBOX_COLUMNAR_DIR!r}\n" + PRELOAD_CODE,
+        language="python",
+        timeout=timeout,
+    )
+
+    if execution.error:
+        raise RuntimeError(f"{execution.error.name}: {execution.error.value}")
+
+    statuses = json.loads("".join(execution.logs.stdout).strip().splitlines()[-1])
+
+    return {
+        file_name_in_sandbox: {
+            "name": spec["name"],
+            "status": statuses[spec["name"]],
+            "columnar_path": f"{SANDBOX_COLUMNAR_DIR}/{spec['sha256']}."
+            + ("arrow" if spec["memory_mapped"] else "parquet"),
+        }
+        for file_name_in_sandbox, spec in zip(dataset_hashes, specs)
+    }
+
+
+def format_preloaded(preloaded: dict[str, dict]) -> str:
+    """
+    Tells the model which names the datasets are preloaded under.
+    """
+
+    lines = []
+    for file_name_in_sandbox, entry in preloaded.items():
+        if entry["status"] == "dataframe":
+            lines.append(
+                f"- {entry['name']}: pandas DataFrame of {file_name_in_sandbox}"
+            )
+        elif entry["status"] == "memory_mapped":
+            lines.append(
+                f"- {entry['name']}: pyarrow Table memory mapped from {entry['columnar_path']}, {file_name_in_sandbox} "
+                f"is too big to keep in memory as a DataFrame, select columns / filter rows before calling .to_pandas()"
+            )
+        else:
+            lines.append(
+                f"- {file_name_in_sandbox} could not be preloaded ({entry['status']}), read it yourself"
+            )
+
+    return "\n".join(lines)
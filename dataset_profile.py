@@ -0,0 +1,187 @@
+import json
+from pathlib import Path
+
+from e2b_code_interpreter import Sandbox
+
+from disk_lru_store import DiskLRUStore
+from sandbox_upload import sandbox_absolute_path
+
+# Run in the kernel after _EDA_PROFILE_SPECS (JSON) and _EDA_PROFILE_TOP_VALUES are set: profiles every dataset,
+# printing {path: profile} as JSON. A preloaded dataset (see dataset_preload.py) is profiled from the DataFrame or
+# memory mapped Table already in the kernel rather than parsing its file again, others are read and dropped
+# afterwards. Columns are profiled with whole column (vectorized) pandas operations so it stays fast on large files.
+PROFILE_CODE = r"""
+import json as _json, os as _os
+
+import pandas as _pd
+
+_EDA_PROFILE_READERS = {
+    ".csv": lambda path: _pd.read_csv(path, low_memory=False),
+    ".tsv": lambda path: _pd.read_csv(path, sep="\t", low_memory=False),
+    ".parquet": _pd.read_parquet,
+    ".json": _pd.read_json,
+    ".jsonl": lambda path: _pd.read_json(path, lines=True),
+    ".xlsx": _pd.read_excel,
+    ".xls": _pd.read_excel,
+}
+
+
+def _eda_profile_column(series, top_values_count):
+    profile = {
+        "dtype": str(series.dtype),
+        "nulls": int(series.isna().sum()),
+        "unique": int(series.nunique(dropna=True)),
+    }
+    if _pd.api.types.is_numeric_dtype(series) and not _pd.api.types.is_bool_dtype(series):
+        for stat in ("min", "mean", "std", "max"):
+            value = getattr(series, stat)()
+            profile[stat] = None if _pd.isna(value) else round(float(value), 4)
+    else:
+        top_values = series.value_counts(dropna=True).head(top_values_count)
+        profile["top"] = [[str(value)[:40], int(count)] for value, count in top_values.items()]
+    return profile
+
+
+def _eda_profile(spec, top_values_count):
+    data = globals().get(spec["name"]) if spec["name"] else None
+    if data is None:
+        reader = _EDA_PROFILE_READERS.get(_os.path.splitext(spec["path"])[1].lower())
+        if reader is None:
+            return {"error": "unsupported file type"}
+        data = reader(spec["path"])
+
+    if isinstance(data, _pd.DataFrame):
+        rows, memory_bytes = len(data), int(data.memory_usage(deep=True).sum())
+        columns = ((column, data[column]) for column in data.columns)
+    else:  # A memory mapped pyarrow Table, converted one column at a time so it's never all in memory.
+        rows, memory_bytes = data.num_rows, data.nbytes
+        columns = ((column, data.column(column).to_pandas()) for column in data.column_names)
+
+    return {
+        "rows": rows,
+        "columns": {str(column): _eda_profile_column(series, top_values_count) for column, series in columns},
+        "memory_mb": round(memory_bytes / 1_000_000, 1),
+    }
+
+
+def _eda_profile_all(specs, top_values_count):
+    profiles = {}
+    for spec in specs:
+        try:
+            profiles[spec["path"]] = _eda_profile(spec, top_values_count)
+        except Exception as e:
+            profiles[spec["path"]] = {"error": f"{type(e).__name__}: {e}"}
+    return profiles
+
+
+print(_json.dumps(_eda_profile_all(_json.loads(_EDA_PROFILE_SPECS), _EDA_PROFILE_TOP_VALUES)))
+"""
+
+
+def profile_cache_key(file_name_in_sandbox: str, file_hash: str) -> str:
+    # The same bytes can be parsed differently depending on the extension (e.g. .csv vs .tsv).
+    suffix = Path(file_name_in_sandbox).suffix.lower().lstrip(".") or "none"
+    return f"{file_hash}-{suffix}.json"
+
+
+def profile_datasets(
+    sandbox: Sandbox,
+    dataset_hashes: dict[str, str],
+    profile_store: DiskLRUStore,
+    preloaded_names: dict[str, str] | None = None,
+    top_values_count: int = 5,
+    timeout: float = 300,
+) -> dict[str, dict]:
+    """
+    Profiles datasets in the sandbox's kernel (row count, and per column dtype, nulls, unique values, numeric stats
+    or most frequent values), reusing the locally cached profile of any content that was profiled before.
+
+    Args:
+        sandbox (Sandbox): The sandbox the datasets are in.
+        dataset_hashes (dict[str, str]): {file_name_in_sandbox: sha256 of its content}.
+        profile_store (DiskLRUStore): Local cache of profiles, keyed by content hash.
+        preloaded_names (dict[str, str] | None): {file_name_in_sandbox: the global it's preloaded under}, these
+            datasets are profiled from the kernel's copy instead of parsing their file again.
+        top_values_count (int): Most frequent values kept for non numeric columns.
+        timeout (float): Seconds the profiling may run for.
+
+    Returns:
+        dict[str, dict]: {file_name_in_sandbox: profile}, a profile is {"error": str} if the dataset couldn't be read.
+    """
+
+    preloaded_names = preloaded_names or {}
+
+    profiles = {}
+    for name, file_hash in dataset_hashes.items():
+        cached = profile_store.get(profile_cache_key(name, file_hash))
+        if cached is not None:
+            profiles[name] = json.loads(cached)
+
+    missing = [name for name in dataset_hashes if name not in profiles]
+    if not missing:
+        return profiles
+
+    # A single round trip for all the datasets not profiled before.
+    specs = [
+        {"path": sandbox_absolute_path(name), "name": preloaded_names.get(name)}
+        for name in missing
+    ]
+    execution = sandbox.run_code(
+        f"_EDA_PROFILE_SPECS = {json.dumps(specs)!r}\n"
+        f"_EDA_PROFILE_TOP_VALUES = {top_values_count}\n" + PROFILE_CODE,
+        language="python",
+        timeout=timeout,
+    )
+
+    if execution.error:
+        raise RuntimeError(f"{execution.error.name}: {execution.error.value}")
+
+    profiles_by_path = json.loads(
+        "".join(execution.logs.stdout).strip().splitlines()[-1]
+    )
+
+    for name in missing:
+        profile = profiles_by_path[sandbox_absolute_path(name)]
+        profiles[name] = profile
+
+        # Read errors may be transient (e.g. a missing package), only cache real profiles.
+        if "error" not in profile:
+            profile_store.put(
+                profile_cache_key(name, dataset_hashes[name]),
+                json.dumps(profile).encode(),
+            )
+
+    return profiles
+
+
+def format_profile(name: str, profile: dict, max_columns: int = 60) -> str:
+    """
+    Compact text form of a dataset profile for the model's context.
+    """
+
+    if "error" in profile:
+        return f"{name}: could not be profiled ({profile['error']})"
+
+    columns = profile["columns"]
+    lines = [
+        f"{name}: {profile['rows']} rows, {len(columns)} columns, {profile['memory_mb']} MB in memory"
+    ]
+
+    for column, stats in list(columns.items())[:max_columns]:
+        line = f"- {column}: {stats['dtype']}, {stats['nulls']} nulls, {stats['unique']} unique"
+
+        if "mean" in stats:
+            line += ", " + ", ".join(
+                f"{stat} {stats[stat]}" for stat in ("min", "mean", "std", "max")
+            )
+        elif stats.get("top"):
+            line += ", top: " + ", ".join(
+                f"{value!r} ({count})" for value, count in stats["top"]
+            )
+
+        lines.append(line)
+
+    if len(columns) > max_columns:
+        lines.append(f"- ... {len(columns) - max_columns} more columns")
+
+    return "\n".join(lines)
@@ -0,0 +1,88 @@
+import os
+import threading
+import time
+from pathlib import Path
+
+# Marks the temporary files put writes before renaming them. They belong to a write in progress (possibly in
+# another process) so eviction leaves them alone, unless they're older than STALE_TEMP_FILE_SECONDS: a writer that
+# crashed left them behind.
+TEMP_FILE_MARKER = ".tmp-"
+STALE_TEMP_FILE_SECONDS = 3600
+
+
+class DiskLRUStore:
+    """
+    A directory of files bounded in total size. When it outgrows max_bytes the least recently used files are
+    deleted first, recency is tracked through the files' modification times (refreshed on every read) so no
+    separate index is needed and several processes can share the directory.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+
+    def path(self, key: str) -> Path:
+        # Keys can come from the agent (e.g. artifact ids), never let them point outside the directory.
+        if not key or key in (".", "..") or Path(key).name != key:
+            raise ValueError(f"Invalid key: {key!r}")
+
+        return self.directory / key
+
+    def put(self, key: str, data: bytes):
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        # Write then rename so readers never see a partially written file. The temporary name is unique per
+        # process and thread, as concurrent sessions (e.g. batch_eda.py) may put the same key at the same time.
+        temp_path = self.path(
+            f"{key}{TEMP_FILE_MARKER}{os.getpid()}-{threading.get_ident()}"
+        )
+        temp_path.write_bytes(data)
+        temp_path.replace(self.path(key))
+
+        self.evict()
+
+    def get(self, key: str) -> bytes | None:
+        path = self.path(key)
+
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+
+        # Mark as recently used. Never recreate it (touch would) if another process evicted it meanwhile.
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return data
+
+    def contains(self, key: str) -> bool:
+        return self.path(key).is_file()
+
+    def evict(self):
+        """
+        Deletes least recently used files until the store fits in max_bytes.
+        """
+
+        entries = []
+        for path in self.directory.iterdir():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:  # Evicted by another process meanwhile.
+                continue
+
+            if TEMP_FILE_MARKER in path.name:
+                if time.time() - stat.st_mtime > STALE_TEMP_FILE_SECONDS:
+                    path.unlink(missing_ok=True)
+                continue
+
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+
+        total_bytes = sum(size for _, size, _ in entries)
+
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+
+            path.unlink(missing_ok=True)
+            total_bytes -= size
@@ -0,0 +1,669 @@
+import argparse
+import asyncio
+import collections
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable
+
+from aiohttp import WSMsgType, web
+from dotenv import load_dotenv
+from e2b_code_interpreter import Sandbox
+from openai import AsyncOpenAI
+from rich.console import Console
+
+from sandbox_eda import SandboxEDA
+from sandbox_pool import SandboxPool
+from sandbox_sql import prewarm_duckdb
+from sandbox_sync import resolve_sync_destination
+from tracing import Tracer
+
+# Load environment variables from .env file
+load_dotenv()
+
+console = Console()
+
+
+class EDASession:
+    """
+    One analyst's EDA session: its sandbox, conversation and the events of its turns. Events are numbered and
+    the latest are kept, so a client that reconnects gets what it missed (Last-Event-ID / ?since=).
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        directory: Path,
+        dataset_names: list[str],
+        max_buffered_events: int = 1000,
+    ):
+        self.session_id = session_id
+        self.directory = directory
+        self.dataset_names = dataset_names
+        self.created_at = time.time()
+        self.last_active = time.monotonic()
+
+        self.sandbox: Sandbox | None = None
+        self.sandbox_eda: SandboxEDA | None = None
+        self.client: AsyncOpenAI | None = None
+        self.messages: list = []
+        self.turn: asyncio.Task | None = None
+        self.turns = 0
+
+        self.events = collections.deque(maxlen=max_buffered_events)
+        self.subscribers: set[asyncio.Queue] = set()
+        self._last_sequence = 0
+
+    @property
+    def ready(self) -> bool:
+        """
+        Whether the session has its sandbox and datasets (see EDAServer.create_session).
+        """
+
+        return self.client is not None
+
+    @property
+    def turn_running(self) -> bool:
+        return self.turn is not None and not self.turn.done()
+
+    def publish(self, event: dict):
+        """
+        Numbers the event and sends it to every subscriber. Must be called on the event loop.
+        """
+
+        self._last_sequence += 1
+        event = {"sequence": self._last_sequence, **event}
+        self.events.append(event)
+
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # A client that stopped reading, end its stream rather than buffer without bound (it can
+                # reconnect and resume from the last event it got).
+                self.unsubscribe(queue)
+                queue.get_nowait()
+                queue.put_nowait(None)
+
+    def subscribe(self, since_sequence: int = 0, max_queued_events: int = 5000):
+        """
+        Returns:
+            asyncio.Queue: Gets the buffered events after since_sequence, then every new event, then None when
+            the session closes (or the subscriber falls too far behind).
+        """
+
+        queue = asyncio.Queue(maxsize=max_queued_events)
+        for event in self.events:
+            if event["sequence"] > since_sequence:
+                queue.put_nowait(event)
+
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+
+    def summary(self) -> dict:
+        return {
+            "session_id": self.session_id,
+            "datasets": self.dataset_names,
+            "created_at": self.created_at,
+            "turns": self.turns,
+            "turn_running": self.turn_running,
+            "usage": (
+                self.sandbox_eda.history_manager.usage_summary()
+                if self.sandbox_eda
+                else None
+            ),
+        }
+
+
+class EDAServer:
+    """
+    Hosts many concurrent EDA sessions in one process, each with its own sandbox and conversation, over the same
+    agent loop as the terminal app (SandboxEDA.run_agent_turn).
+
+    Limits: at most max_sessions sessions (i.e. sandboxes) at a time, at most max_concurrent_turns turns running
+    across all sessions (the others wait their turn) and one turn at a time per session. Sessions idle for
+    idle_timeout_seconds are closed.
+    """
+
+    def __init__(
+        self,
+        sandbox_factory: Callable[[], Sandbox],
+        model_api_base_url: str,
+        model_api_key: str,
+        model_for_eda: str,
+        data_directory: str = "./server_data",
+        max_sessions: int = 20,
+        max_concurrent_turns: int = 8,
+        idle_timeout_seconds: float = 1800,
+        sandbox_timeout: int = 900,
+        upload_compression: str | None = None,
+        sandbox_pool: SandboxPool | None = None,
+    ):
+        """
+        Args:
+            sandbox_factory (Callable[[], Sandbox]): Creates a session's sandbox when the pool has none ready.
+            model_api_base_url (str): The model API's base URL.
+            model_api_key (str): The model API's key.
+            model_for_eda (str): The underlying model to use.
+            data_directory (str): Sessions' uploads, synced files, images and traces go to {data_directory}/{session_id}.
+            max_sessions (int): Sessions open at the same time.
+            max_concurrent_turns (int): Turns running at the same time, across sessions.
+            idle_timeout_seconds (float): Sessions without a turn for this long are closed.
+            sandbox_timeout (int): Seconds a session's sandbox lives without activity, extended while it's in use.
+            upload_compression (str | None): None, "gzip" or "zstd", for the datasets' upload to the sandbox.
+            sandbox_pool (SandboxPool | None): Warm sandboxes, taken before creating new ones.
+        """
+
+        self.sandbox_factory = sandbox_factory
+        self.model_api_base_url = model_api_base_url
+        self.model_api_key = model_api_key
+        self.model_for_eda = model_for_eda
+        self.data_directory = Path(data_directory)
+        self.max_sessions = max_sessions
+        self.max_concurrent_turns = max_concurrent_turns
+        self.idle_timeout_seconds = idle_timeout_seconds
+        self.sandbox_timeout = sandbox_timeout
+        self.upload_compression = upload_compression
+        self.sandbox_pool = sandbox_pool
+
+        self.sessions: dict[str, EDASession] = {}
+        self.turn_slots: asyncio.Semaphore | None = None
+        self.turns_running = 0
+        self._reaper: asyncio.Task | None = None
+
+    async def start(self):
+        # Every session's tool calls run in the default executor, size it so sessions don't queue behind each other.
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(max_workers=self.max_concurrent_turns * 8)
+        )
+        self.turn_slots = asyncio.Semaphore(self.max_concurrent_turns)
+        self._reaper = asyncio.create_task(self._close_idle_sessions())
+
+    async def stop(self):
+        if self._reaper:
+            self._reaper.cancel()
+
+        await asyncio.gather(
+            *(self.close_session(session) for session in list(self.sessions.values()))
+        )
+
+        if self.sandbox_pool:
+            await asyncio.to_thread(self.sandbox_pool.shutdown)
+
+    async def create_session(self, session: EDASession, dataset_paths: list[str]):
+        """
+        Starts a registered session: gets it a sandbox and uploads its datasets.
+        """
+
+        loop = asyncio.get_running_loop()
+
+        loop_thread = threading.get_ident()
+
+        def on_event(event: dict):
+            event = {"session_id": session.session_id, **event}
+
+            # Published right away on the loop, so events keep their order with the turn's own events. Tool call
+            # threads hand them over, in order, before their tool call's result.
+            if threading.get_ident() == loop_thread:
+                session.publish(event)
+            else:
+                loop.call_soon_threadsafe(session.publish, event)
+
+        tracer = Tracer(trace_directory=str(session.directory))
+        with tracer.span("sandbox_creation", pooled=self.sandbox_pool is not None):
+            session.sandbox = await asyncio.to_thread(
+                self.sandbox_pool.acquire if self.sandbox_pool else self.sandbox_factory
+            )
+        if not self.sandbox_pool:  # Pooled sandboxes started it when they were created.
+            prewarm_duckdb(session.sandbox)
+
+        session.sandbox_eda = SandboxEDA(
+            session.sandbox,
+            self.model_api_base_url,
+            self.model_api_key,
+            upload_compression=self.upload_compression,
+            sync_folder=str(session.directory / "sync_folder"),
+            artifact_store_path=str(session.directory / "artifacts"),
+            image_output_path=str(session.directory / "images"),
+            # Per session, so concurrent sessions never write the same index file.
+            fingerprint_index_path=str(session.directory / "fingerprints.json"),
+            stream_execution_output=False,
+            tracer=tracer,
+            on_event=on_event,
+            live_display=False,
+            display_images=False,  # Headless, the images are streamed as events instead.
+            checkpoint_directory=None,
+            # The sandbox lives as long as the session is in use, and is replaced if it dies anyway.
+            sandbox_timeout=self.sandbox_timeout,
+            sandbox_factory=self.sandbox_factory,
+        )
+
+        await asyncio.to_thread(
+            session.sandbox_eda.upload_files_to_sandbox,
+            dataset_paths,
+            session.dataset_names,
+        )
+
+        session.client = AsyncOpenAI(
+            base_url=self.model_api_base_url, api_key=self.model_api_key
+        )
+        session.messages = session.sandbox_eda.initial_messages(session.dataset_names)
+        session.publish({"session_id": session.session_id, "type": "session_ready"})
+
+    def start_turn(self, session: EDASession, content: str) -> int:
+        """
+        Starts a turn answering the message in the background, its progress is published as events.
+
+        Returns:
+            int: The turn's number.
+
+        Raises:
+            RuntimeError: If the session is already running a turn.
+        """
+
+        if not session.ready:
+            raise RuntimeError("The session is still starting")
+        if session.turn_running:
+            raise RuntimeError("A turn is already running in this session")
+
+        session.turns += 1
+        session.last_active = time.monotonic()
+        session.turn = asyncio.create_task(
+            self._run_turn(session, content, session.turns)
+        )
+        return session.turns
+
+    async def _run_turn(self, session: EDASession, content: str, turn: int):
+        def publish(event_type: str, **data):
+            session.publish(
+                {
+                    "session_id": session.session_id,
+                    "type": event_type,
+                    "turn": turn,
+                    **data,
+                }
+            )
+
+        if self.turn_slots.locked():
+            publish("turn_queued")
+
+        try:
+            async with self.turn_slots:
+                self.turns_running += 1
+                publish("turn_started")
+
+                try:
+                    session.messages.append({"role": "user", "content": content})
+                    answer = await session.sandbox_eda.run_agent_turn(
+                        session.client, session.messages, self.model_for_eda
+                    )
+                    publish("turn_finished", answer=answer)
+
+                finally:
+                    self.turns_running -= 1
+                    session.last_active = time.monotonic()
+
+        except asyncio.CancelledError:
+            publish("turn_cancelled")
+
+        except Exception as e:
+            publish("turn_failed", error=f"{type(e).__name__}: {e}")
+
+    def cancel_turn(self, session: EDASession) -> bool:
+        if not session.turn_running:
+            return False
+
+        # run_agent_turn interrupts the running code and commands, and keeps the conversation valid.
+        session.turn.cancel()
+        return True
+
+    async def close_session(self, session: EDASession):
+        if self.sessions.pop(session.session_id, None) is None:
+            return  # Already closed.
+
+        if session.turn_running:
+            session.turn.cancel()
+            await asyncio.gather(session.turn, return_exceptions=True)
+
+        if session.sandbox_eda:
+            session.sandbox_eda.job_manager.shutdown()
+            await asyncio.to_thread(session.sandbox_eda.image_pipeline.shutdown)
+            session.sandbox_eda.lease.stop()
+            session.sandbox = session.sandbox_eda.sandbox  # It may have been replaced.
+        if session.client:
+            await session.client.close()
+        if session.sandbox:
+            await asyncio.to_thread(session.sandbox.kill)
+
+        session.publish({"session_id": session.session_id, "type": "session_closed"})
+        for queue in list(session.subscribers):
+            session.unsubscribe(queue)
+            queue.put_nowait(None)
+
+        console.print(f"[cyan]Closed session {session.session_id}[/cyan]")
+
+    async def _close_idle_sessions(self):
+        while True:
+            await asyncio.sleep(60)
+
+            now = time.monotonic()
+            for session in list(self.sessions.values()):
+                if (
+                    not session.turn_running
+                    and session.sandbox_eda is not None
+                    and now - session.last_active > self.idle_timeout_seconds
+                ):
+                    await self.close_session(session)
+
+    # HTTP API
+
+    def _session_or_404(self, request) -> EDASession:
+        session = self.sessions.get(request.match_info["session_id"])
+        if session is None:
+            raise web.HTTPNotFound(text="No such session")
+        return session
+
+    async def handle_create_session(self, request):
+        """
+        POST /sessions, multipart with the datasets as "file" fields. Returns once the sandbox is ready and the
+        datasets uploaded.
+        """
+
+        if len(self.sessions) >= self.max_sessions:
+            raise web.HTTPServiceUnavailable(
+                text=f"All {self.max_sessions} sessions are in use, try again later"
+            )
+
+        session_id = uuid.uuid4().hex
+        directory = self.data_directory / session_id
+        upload_directory = directory / "uploads"
+        upload_directory.mkdir(parents=True, exist_ok=True)
+
+        # Registered right away so concurrent requests count it against max_sessions.
+        session = EDASession(session_id, directory, [])
+        self.sessions[session_id] = session
+
+        try:
+            dataset_paths = []
+            reader = await request.multipart()
+            async for part in reader:
+                if part.name != "file" or not part.filename:
+                    continue
+
+                file_name = os.path.basename(part.filename)
+                if not file_name or file_name in session.dataset_names:
+                    raise web.HTTPBadRequest(
+                        text=f"Invalid or duplicate file name '{part.filename}'"
+                    )
+
+                path = upload_directory / file_name
+                with open(path, "wb") as f:
+                    while chunk := await part.read_chunk(1024 * 1024):
+                        f.write(chunk)
+
+                session.dataset_names.append(file_name)
+                dataset_paths.append(str(path))
+
+            if not dataset_paths:
+                raise web.HTTPBadRequest(text="Upload at least one dataset as 'file'")
+
+            await self.create_session(session, dataset_paths)
+
+        except BaseException:
+            await self.close_session(session)
+            shutil.rmtree(directory, ignore_errors=True)
+            raise
+
+        console.print(
+            f"[cyan]Started session {session_id}[/cyan] (sandbox {session.sandbox.sandbox_id}, {len(self.sessions)} open)"
+        )
+
+        return web.json_response(
+            {
+                **session.summary(),
+                "events_url": f"/sessions/{session_id}/events",
+                "websocket_url": f"/sessions/{session_id}/ws",
+            },
+            status=201,
+        )
+
+    async def handle_get_session(self, request):
+        return web.json_response(self._session_or_404(request).summary())
+
+    async def handle_delete_session(self, request):
+        await self.close_session(self._session_or_404(request))
+        return web.json_response({"closed": True})
+
+    async def handle_post_message(self, request):
+        """
+        POST /sessions/{id}/messages {"content": str}, answered through the session's events.
+        """
+
+        session = self._session_or_404(request)
+        body = await request.json()
+
+        if not isinstance(body.get("content"), str) or not body["content"].strip():
+            raise web.HTTPBadRequest(text="'content' must be a non empty string")
+
+        try:
+            turn = self.start_turn(session, body["content"])
+        except RuntimeError as e:
+            raise web.HTTPConflict(text=str(e))
+
+        return web.json_response({"turn": turn}, status=202)
+
+    async def handle_cancel(self, request):
+        return web.json_response(
+            {"cancelled": self.cancel_turn(self._session_or_404(request))}
+        )
+
+    async def handle_events(self, request):
+        """
+        GET /sessions/{id}/events, the session's events as server-sent events.
+        """
+
+        session = self._session_or_404(request)
+        since = int(
+            request.headers.get("Last-Event-ID") or request.query.get("since", 0)
+        )
+
+        response = web.StreamResponse(
+            headers={
+                "Content-Type": "text/event-stream",
+                "Cache-Control": "no-cache",
+                "X-Accel-Buffering": "no",
+            }
+        )
+        await response.prepare(request)
+
+        queue = session.subscribe(since)
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    await response.write(b": keep-alive\n\n")
+                    continue
+
+                if event is None:
+                    break
+
+                await response.write(
+                    f"id: {event['sequence']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n".encode()
+                )
+
+        except ConnectionResetError:
+            pass
+
+        finally:
+            session.unsubscribe(queue)
+
+        return response
+
+    async def handle_websocket(self, request):
+        """
+        GET /sessions/{id}/ws: the session's events are sent as JSON, and the client sends
+        {"type": "message", "content": str} or {"type": "cancel"}.
+        """
+
+        session = self._session_or_404(request)
+        websocket = web.WebSocketResponse(heartbeat=15)
+        await websocket.prepare(request)
+
+        queue = session.subscribe(int(request.query.get("since", 0)))
+
+        async def send_events():
+            while (event := await queue.get()) is not None:
+                await websocket.send_json(event)
+            await websocket.close()
+
+        sender = asyncio.create_task(send_events())
+        try:
+            async for message in websocket:
+                if message.type != WSMsgType.TEXT:
+                    continue
+
+                try:
+                    command = json.loads(message.data)
+                    if command.get("type") == "message":
+                        self.start_turn(session, command["content"])
+                    elif command.get("type") == "cancel":
+                        self.cancel_turn(session)
+                    else:
+                        raise ValueError(f"Unknown message type: {command.get('type')}")
+
+                except (ValueError, KeyError, RuntimeError) as e:
+                    await websocket.send_json({"type": "error", "error": str(e)})
+
+        finally:
+            sender.cancel()
+            session.unsubscribe(queue)
+
+        return websocket
+
+    async def handle_sync_file(self, request):
+        """
+        GET /sessions/{id}/files/{path}, a file the agent synced to the session's sync folder.
+        """
+
+        session = self._session_or_404(request)
+        if not session.ready:
+            raise web.HTTPConflict(text="The session is still starting")
+
+        try:
+            path = resolve_sync_destination(
+                session.sandbox_eda.sync_folder, request.match_info["path"]
+            )
+        except ValueError as e:
+            raise web.HTTPBadRequest(text=str(e))
+
+        if not path.is_file():
+            raise web.HTTPNotFound(text="No such file")
+        return web.FileResponse(path)
+
+    async def handle_health(self, request):
+        return web.json_response(
+            {
+                "sessions": len(self.sessions),
+                "max_sessions": self.max_sessions,
+                "turns_running": self.turns_running,
+                "max_concurrent_turns": self.max_concurrent_turns,
+            }
+        )
+
+    def application(self) -> "web.Application":
+        app = web.Application(client_max_size=1024**3)
+        app.add_routes(
+            [
+                web.get("/health", self.handle_health),
+                web.post("/sessions", self.handle_create_session),
+                web.get("/sessions/{session_id}", self.handle_get_session),
+                web.delete("/sessions/{session_id}", self.handle_delete_session),
+                web.post("/sessions/{session_id}/messages", self.handle_post_message),
+                web.post("/sessions/{session_id}/cancel", self.handle_cancel),
+                web.get("/sessions/{session_id}/events", self.handle_events),
+                web.get("/sessions/{session_id}/ws", self.handle_websocket),
+                web.get(
+                    "/sessions/{session_id}/files/{path:.+}", self.handle_sync_file
+                ),
+            ]
+        )
+
+        async def on_startup(app):
+            await self.start()
+
+        async def on_cleanup(app):
+            await self.stop()
+
+        app.on_startup.append(on_startup)
+        app.on_cleanup.append(on_cleanup)
+        return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Serves EDA sessions over HTTP (server-sent events) and WebSocket."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--data-dir", default="./server_data")
+    parser.add_argument("--max-sessions", type=int, default=20)
+    parser.add_argument("--max-concurrent-turns", type=int, default=8)
+    parser.add_argument("--idle-timeout", type=float, default=1800)
+    parser.add_argument(
+        "--sandbox-pool-size",
+        type=int,
+        default=0,
+        help="Warm sandboxes kept ready for new sessions.",
+    )
+    args = parser.parse_args()
+
+    NOVITA_API_KEY = os.getenv("NOVITA_API_KEY")
+    NOVITA_BASE_URL = os.getenv("NOVITA_BASE_URL")
+    NOVITA_E2B_DOMAIN = os.getenv("NOVITA_E2B_DOMAIN")
+    NOVITA_E2B_TEMPLATE = os.getenv("NOVITA_E2B_TEMPLATE")
+    NOVITA_MODEL_FOR_EDA = "qwen/qwen3-coder-480b-a35b-instruct"
+    NOVITA_SANDBOX_TIMEOUT_SECONDS = (
+        900  # Extended at every turn, so only idle sandboxes expire.
+    )
+    UPLOAD_COMPRESSION = "gzip"  # Compress datasets on the wire; options [None, 'gzip', 'zstd' (needs the zstandard package)].
+
+    def create_sandbox():
+        return Sandbox(
+            template=NOVITA_E2B_TEMPLATE,
+            api_key=NOVITA_API_KEY,
+            domain=NOVITA_E2B_DOMAIN,
+            timeout=NOVITA_SANDBOX_TIMEOUT_SECONDS,
+        )
+
+    server = EDAServer(
+        create_sandbox,
+        NOVITA_BASE_URL,
+        NOVITA_API_KEY,
+        NOVITA_MODEL_FOR_EDA,
+        data_directory=args.data_dir,
+        max_sessions=args.max_sessions,
+        max_concurrent_turns=args.max_concurrent_turns,
+        idle_timeout_seconds=args.idle_timeout,
+        sandbox_timeout=NOVITA_SANDBOX_TIMEOUT_SECONDS,
+        upload_compression=UPLOAD_COMPRESSION,
+        sandbox_pool=(
+            SandboxPool(
+                create_sandbox,
+                size=args.sandbox_pool_size,
+                sandbox_timeout=NOVITA_SANDBOX_TIMEOUT_SECONDS,
+            ).start()
+            if args.sandbox_pool_size
+            else None
+        ),
+    )
+
+    web.run_app(server.application(), host=args.host, port=args.port)
@@ -0,0 +1,310 @@
+import ast
+import hashlib
+import json
+import re
+import uuid
+
+from e2b_code_interpreter import Execution
+
+from disk_lru_store import DiskLRUStore
+from result_encoding import load_recorded_execution
+
+# Names that make a cell's output change from one run to the next: the clock, random numbers (including
+# df.sample without a seed), the network, and the machine the code runs on. Matched against the cell's names,
+# attributes and imported modules, so false positives (a column called "date") only cost a cache miss.
+NONDETERMINISTIC_NAMES = {
+    "time",
+    "datetime",
+    "now",
+    "today",
+    "utcnow",
+    "perf_counter",
+    "monotonic",
+    "random",
+    "rand",
+    "randn",
+    "randint",
+    "choice",
+    "shuffle",
+    "sample",
+    "permutation",
+    "default_rng",
+    "secrets",
+    "uuid",
+    "uuid1",
+    "uuid4",
+    "requests",
+    "httpx",
+    "urllib",
+    "urlopen",
+    "http",
+    "socket",
+    "aiohttp",
+    "subprocess",
+    "system",
+    "environ",
+    "getpid",
+    "psutil",
+    "memory_usage",
+}
+
+# The only calls a cacheable cell may make: functions and methods known not to change the kernel's state or the
+# sandbox's files (inspecting and summarizing data, plotting, printing). Any other call (model.fit(...), np.save(...),
+# a function defined in the session) may change something, so the cell always runs.
+READ_ONLY_FUNCTION_NAMES = {
+    "print",
+    "display",
+    "len",
+    "repr",
+    "str",
+    "int",
+    "float",
+    "bool",
+    "round",
+    "abs",
+    "sum",
+    "min",
+    "max",
+    "any",
+    "all",
+    "sorted",
+    "list",
+    "tuple",
+    "set",
+    "dict",
+    "range",
+    "enumerate",
+    "zip",
+    "type",
+    "isinstance",
+}
+READ_ONLY_METHOD_NAMES = {
+    # Inspecting and summarizing
+    "head",
+    "tail",
+    "describe",
+    "info",
+    "value_counts",
+    "nunique",
+    "unique",
+    "isna",
+    "isnull",
+    "notna",
+    "notnull",
+    "duplicated",
+    "count",
+    "sum",
+    "mean",
+    "median",
+    "mode",
+    "std",
+    "var",
+    "min",
+    "max",
+    "idxmin",
+    "idxmax",
+    "quantile",
+    "corr",
+    "cov",
+    "skew",
+    "kurt",
+    "cumsum",
+    "pct_change",
+    "diff",
+    "abs",
+    "round",
+    "groupby",
+    "agg",
+    "aggregate",
+    "size",
+    "pivot_table",
+    "crosstab",
+    "sort_values",
+    "sort_index",
+    "nlargest",
+    "nsmallest",
+    "query",
+    "filter",
+    "select_dtypes",
+    "isin",
+    "between",
+    "dropna",
+    "fillna",
+    "astype",
+    "reset_index",
+    "to_string",
+    "to_markdown",
+    "keys",
+    "values",
+    "items",
+    "get",
+    "format",
+    "join",
+    # Plotting
+    "plot",
+    "hist",
+    "boxplot",
+    "bar",
+    "barh",
+    "scatter",
+    "pie",
+    "line",
+    "kde",
+    "area",
+    "figure",
+    "subplots",
+    "title",
+    "suptitle",
+    "xlabel",
+    "ylabel",
+    "xlim",
+    "ylim",
+    "xticks",
+    "yticks",
+    "legend",
+    "grid",
+    "tight_layout",
+    "show",
+    "histplot",
+    "countplot",
+    "barplot",
+    "scatterplot",
+    "lineplot",
+    "heatmap",
+    "pairplot",
+    "kdeplot",
+    "violinplot",
+    "displot",
+    "regplot",
+    "catplot",
+    "lmplot",
+}
+
+URL_PATTERN = re.compile(r"^[a-z][a-z0-9+.-]*://", re.IGNORECASE)
+
+# SQL queries that only read, others (e.g. COPY ... TO) may write files later cells read.
+READ_ONLY_SQL_PATTERN = re.compile(
+    r"^\s*(select|with|describe|show|summarize|explain|from)\b", re.IGNORECASE
+)
+
+# Code containing this comment always runs, e.g. for a cell that reads a file the agent keeps changing.
+NO_CACHE_MARKER = "# no-cache"
+
+
+def uncacheable_reason(python_code: str) -> str | None:
+    """
+    Why a cell's outputs can't be served from the cache, None if they can.
+
+    Only read-only cells are cached: cells made of expressions (df.describe(), a plot, print(...)) that don't
+    assign, import, define or delete anything and only call functions and methods known to be read-only (see
+    READ_ONLY_METHOD_NAMES), so skipping them on a hit leaves the kernel as running them would have. Cells that
+    touch time, randomness or the network are never cached.
+    """
+
+    if NO_CACHE_MARKER in python_code:
+        return "marked no-cache"
+
+    try:
+        tree = ast.parse(python_code)
+    except SyntaxError:
+        return "syntax error"
+
+    if not tree.body:
+        return "empty"
+
+    for statement in tree.body:
+        if not isinstance(statement, ast.Expr):
+            return f"not read-only ({type(statement).__name__})"
+
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.NamedExpr, ast.Await, ast.Yield, ast.YieldFrom)):
+            return f"not read-only ({type(node).__name__})"
+
+        if isinstance(node, ast.Name) and node.id in NONDETERMINISTIC_NAMES:
+            return f"nondeterministic ({node.id})"
+
+        if isinstance(node, ast.Attribute) and node.attr in NONDETERMINISTIC_NAMES:
+            return f"nondeterministic ({node.attr})"
+
+        if isinstance(node, ast.Call):
+            if isinstance(node.func, ast.Name):
+                name, read_only_names = node.func.id, READ_ONLY_FUNCTION_NAMES
+            elif isinstance(node.func, ast.Attribute):
+                name, read_only_names = node.func.attr, READ_ONLY_METHOD_NAMES
+            else:
+                return "not read-only (call)"
+
+            if name not in read_only_names:
+                return f"not read-only ({name})"
+            for keyword in node.keywords:
+                if keyword.arg in (
+                    "inplace",
+                    "file",
+                    "buf",
+                ):  # Mutates, or writes to a file.
+                    return f"not read-only ({keyword.arg})"
+
+        if (
+            isinstance(node, ast.Constant)
+            and isinstance(node.value, str)
+            and URL_PATTERN.match(node.value)
+        ):
+            return "nondeterministic (url)"
+
+    return None
+
+
+class ExecutionCache:
+    """
+    Outputs of read-only cells (see uncacheable_reason), kept in a DiskLRUStore bounded in size and shared across
+    sessions.
+
+    A cell's outputs depend on its code, on the datasets and on the kernel's state, so they are keyed on all
+    three: the code, the content hashes of the uploaded datasets and the lineage of the kernel, a hash chained over
+    everything that may have changed the sandbox since the kernel started (cells that aren't read-only, commands,
+    jobs). The same cell after the same steps on the same datasets is a hit, in this session or a later one.
+    """
+
+    ROOT_LINEAGE = "fresh-kernel"
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.store = DiskLRUStore(directory, max_bytes)
+        self.lineage = self.ROOT_LINEAGE
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, python_code: str, dataset_hashes: dict[str, str]) -> str:
+        return hashlib.sha256(
+            json.dumps(
+                [python_code, sorted(dataset_hashes.items()), self.lineage]
+            ).encode("utf-8")
+        ).hexdigest()
+
+    def advance(self, step: str):
+        """
+        Records a step that may have changed the sandbox's state (e.g. the code of a cell that isn't read-only).
+        """
+
+        self.lineage = hashlib.sha256(
+            f"{self.lineage}\n{step}".encode("utf-8")
+        ).hexdigest()
+
+    def reset(self, fresh_kernel: bool = False):
+        """
+        Starts a new lineage: from the root if the kernel is fresh (only setup code and the preloaded datasets in
+        it), otherwise (e.g. variables restored from a checkpoint) from a unique one, as its state is unknown.
+        """
+
+        self.lineage = self.ROOT_LINEAGE if fresh_kernel else uuid.uuid4().hex
+
+    def get(self, key: str) -> Execution | None:
+        data = self.store.get(key)
+        if data is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return load_recorded_execution(data.decode("utf-8"))
+
+    def put(self, key: str, execution: Execution):
+        self.store.put(key, execution.to_json().encode("utf-8"))
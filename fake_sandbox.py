@@ -0,0 +1,229 @@
+import datetime
+import posixpath
+import threading
+import uuid
+from typing import Callable
+
+from e2b_code_interpreter import (
+    CommandResult,
+    Context,
+    EntryInfo,
+    Execution,
+    FileType,
+    Logs,
+)
+
+from sandbox_upload import SANDBOX_HOME_DIR
+
+
+class _FakeFilesystem:
+    """
+    In-memory stand-in for Sandbox.files, directories are implied by the paths of the files they contain.
+    """
+
+    def __init__(self):
+        self.file_contents: dict[str, bytes] = {}
+        self.directories: set[str] = {"/", SANDBOX_HOME_DIR}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _absolute(path) -> str:
+        return posixpath.normpath(posixpath.join(SANDBOX_HOME_DIR, str(path)))
+
+    def write(self, path, data, **kwargs):
+        if hasattr(data, "read"):
+            data = data.read()
+        if isinstance(data, str):
+            data = data.encode()
+
+        path = self._absolute(path)
+        with self.lock:
+            self.file_contents[path] = bytes(data)
+
+            parent = posixpath.dirname(path)
+            while parent not in self.directories:
+                self.directories.add(parent)
+                parent = posixpath.dirname(parent)
+
+    def read(self, path, format="text", **kwargs):
+        path = self._absolute(path)
+        if path not in self.file_contents:
+            raise FileNotFoundError(f"No such file: {path}")
+
+        content = self.file_contents[path]
+        if format == "bytes":
+            return bytearray(content)
+        if format == "stream":
+            return iter([content[i : i + 65536] for i in range(0, len(content), 65536)])
+        return content.decode()
+
+    def exists(self, path, **kwargs) -> bool:
+        path = self._absolute(path)
+        return path in self.file_contents or path in self.directories
+
+    def get_info(self, path, **kwargs) -> EntryInfo:
+        path = self._absolute(path)
+
+        if path in self.file_contents:
+            file_type, size = FileType.FILE, len(self.file_contents[path])
+        elif path in self.directories:
+            file_type, size = FileType.DIR, 0
+        else:
+            raise FileNotFoundError(f"No such file or directory: {path}")
+
+        return EntryInfo(
+            name=posixpath.basename(path),
+            type=file_type,
+            path=path,
+            size=size,
+            mode=0o644,
+            permissions="-rw-r--r--",
+            owner="user",
+            group="user",
+            modified_time=datetime.datetime.now(),
+        )
+
+    def list(self, path, **kwargs) -> list[EntryInfo]:
+        path = self._absolute(path)
+        children = {
+            entry
+            for entry in [*self.file_contents, *self.directories]
+            if entry != path and posixpath.dirname(entry) == path
+        }
+        return [self.get_info(child) for child in sorted(children)]
+
+    def make_dir(self, path, **kwargs) -> bool:
+        path = self._absolute(path)
+        created = path not in self.directories
+        self.directories.add(path)
+        return created
+
+    def remove(self, path, **kwargs):
+        path = self._absolute(path)
+        with self.lock:
+            self.file_contents = {
+                entry: content
+                for entry, content in self.file_contents.items()
+                if entry != path and not entry.startswith(path + "/")
+            }
+            self.directories = {
+                entry
+                for entry in self.directories
+                if entry != path and not entry.startswith(path + "/")
+            }
+
+
+class _FakeCommands:
+    def __init__(self, command_handler: Callable[[str], CommandResult] | None):
+        self.command_handler = command_handler
+        self.history: list[str] = []
+
+    def run(
+        self, cmd: str, background: bool | None = None, **kwargs
+    ) -> "CommandResult | _FakeCommandHandle":
+        self.history.append(cmd)
+
+        if self.command_handler:
+            result = self.command_handler(cmd)
+        else:
+            result = CommandResult(stderr="", stdout="", exit_code=0, error=None)
+
+        return _FakeCommandHandle(result) if background else result
+
+
+class _FakeCommandHandle:
+    """
+    What Sandbox.commands.run returns for background commands, the command has already finished.
+    """
+
+    def __init__(self, result: CommandResult):
+        self.result = result
+        self.killed = False
+
+    def wait(self, on_stdout=None, on_stderr=None, **kwargs) -> CommandResult:
+        if on_stdout and self.result.stdout:
+            on_stdout(self.result.stdout)
+        if on_stderr and self.result.stderr:
+            on_stderr(self.result.stderr)
+
+        return self.result
+
+    def kill(self) -> bool:
+        self.killed = True
+        return True
+
+
+class FakeSandbox:
+    """
+    An offline stand-in for e2b's Sandbox, so sandbox management (e.g. the SandboxPool) can be exercised without
+    network access or credentials.
+
+    Files live in memory, commands and code succeed with empty output unless a command_handler / code_handler
+    is given to script their results. Every command and code cell run is recorded in commands.history and
+    code_history.
+    """
+
+    def __init__(
+        self,
+        template: str | None = None,
+        timeout: int = 300,
+        command_handler: Callable[[str], CommandResult] | None = None,
+        code_handler: Callable[[str], Execution] | None = None,
+        **kwargs,
+    ):
+        self.sandbox_id = f"fake-{uuid.uuid4().hex[:12]}"
+        self.template = template
+        self.timeout = timeout
+        self.files = _FakeFilesystem()
+        self.commands = _FakeCommands(command_handler)
+        self.code_handler = code_handler
+        self.code_history: list[str] = []
+        self.code_contexts: dict[str, Context] = {}
+        self.killed = False
+
+    def run_code(self, code: str, **kwargs) -> Execution:
+        if self.killed:
+            raise RuntimeError(f"Sandbox {self.sandbox_id} is not running")
+
+        self.code_history.append(code)
+
+        if self.code_handler:
+            return self.code_handler(code)
+
+        return Execution(results=[], logs=Logs(stdout=[], stderr=[]), error=None)
+
+    def create_code_context(
+        self, cwd: str | None = None, language: str | None = None, **kwargs
+    ) -> Context:
+        context = Context(
+            context_id=uuid.uuid4().hex,
+            language=language or "python",
+            cwd=cwd or "/home/user",
+        )
+        self.code_contexts[context.id] = context
+        return context
+
+    def list_code_contexts(self, **kwargs) -> list[Context]:
+        return list(self.code_contexts.values())
+
+    def remove_code_context(self, context: Context | str, **kwargs):
+        self.code_contexts.pop(getattr(context, "id", context), None)
+
+    def restart_code_context(self, context: Context | str, **kwargs):
+        pass
+
+    def set_timeout(self, timeout: int, **kwargs):
+        self.timeout = timeout
+
+    def is_running(self, **kwargs) -> bool:
+        return not self.killed
+
+    def kill(self, **kwargs) -> bool:
+        self.killed = True
+        return True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.kill()
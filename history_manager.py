@@ -0,0 +1,213 @@
+import json
+
+# Rough average for English text and code, close enough to budget a context window without a tokenizer.
+CHARACTERS_PER_TOKEN = 4
+
+ELIDED_MARKER = (
+    "elided from this older output to save context, re-run the call if you need them"
+)
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARACTERS_PER_TOKEN + 1
+
+
+def message_text(message: dict) -> str:
+    """
+    All the text of a chat message that counts towards the prompt: its content (plain or a list of text
+    parts) and the arguments of any tool calls it makes.
+    """
+
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        content = "".join(part.get("text", "") for part in content)
+
+    tool_calls = message.get("tool_calls") or []
+    return content + "".join(
+        tool_call["function"]["name"] + tool_call["function"]["arguments"]
+        for tool_call in tool_calls
+    )
+
+
+def cached_prompt_tokens(usage) -> int:
+    """
+    Prompt tokens the provider served from its prompt cache, 0 when it doesn't report them.
+    """
+
+    details = getattr(usage, "prompt_tokens_details", None)
+    return (getattr(details, "cached_tokens", None) or 0) if details else 0
+
+
+class HistoryManager:
+    """
+    Keeps an EDA conversation within a token budget.
+
+    When the conversation grows past the budget, the outputs of older tool calls are replaced with short stubs
+    (their first few hundred characters), and if that is not enough the arguments of older tool calls (e.g.
+    long code cells) are shortened too. The system prompt, the user's messages and the most recent exchanges (an
+    assistant message and the outputs of its tool calls) are never touched, so a single question driving a long
+    chain of tool calls is compacted as it grows.
+
+    Prompt token counts reported by the model API (response.usage) are recorded per request, and used to
+    calibrate the character based token estimate. Compaction only rewrites messages older than the recent exchanges,
+    so the conversation's prefix (and the provider's prompt cache hits on it) stays stable between compactions.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = 60_000,
+        keep_recent_exchanges: int = 3,
+        stub_characters: int = 300,
+        tool_schemas: list[dict] | None = None,
+    ):
+        """
+        Args:
+            token_budget (int): Compact the conversation when its estimated prompt size exceeds this many tokens.
+            keep_recent_exchanges (int): Number of most recent assistant messages (with their tool outputs) kept
+                verbatim.
+            stub_characters (int): Characters of an elided tool output or argument that are kept.
+            tool_schemas (list[dict] | None): The tools sent with every request, they count towards the reported
+                prompt tokens but aren't part of the messages.
+        """
+
+        self.token_budget = token_budget
+        self.keep_recent_exchanges = keep_recent_exchanges
+        self.stub_characters = stub_characters
+        self.tool_schema_tokens = (
+            estimate_tokens(json.dumps(tool_schemas)) if tool_schemas else 0
+        )
+
+        # {"prompt_tokens": int, "cached_tokens": int, "completion_tokens": int} for every model request made.
+        self.usage_per_request: list[dict] = []
+
+        # Ratio of real prompt tokens to estimated tokens, learned from the last reported usage.
+        self.calibration = 1.0
+
+    def estimated_tokens(self, messages: list[dict]) -> int:
+        return int(
+            sum(estimate_tokens(message_text(message)) for message in messages)
+            * self.calibration
+        )
+
+    def record_usage(self, messages: list[dict], usage):
+        """
+        Records the usage reported for a request that was made with messages.
+
+        Args:
+            messages (list[dict]): The messages the request was made with.
+            usage: The response.usage of the request (may be None if the API didn't report it).
+        """
+
+        if usage is None:
+            return
+
+        self.usage_per_request.append(
+            {
+                "prompt_tokens": usage.prompt_tokens,
+                "cached_tokens": cached_prompt_tokens(usage),
+                "completion_tokens": usage.completion_tokens,
+            }
+        )
+
+        # The tool schemas are in every request's prompt tokens, calibrate on the messages' share only.
+        message_tokens = usage.prompt_tokens - self.tool_schema_tokens
+        if message_tokens > 0:
+            estimated = sum(
+                estimate_tokens(message_text(message)) for message in messages
+            )
+            self.calibration = message_tokens / estimated
+
+    def usage_summary(self) -> dict:
+        """
+        Totals of the recorded usage.
+
+        Returns:
+            dict: {"requests", "prompt_tokens", "cached_tokens", "completion_tokens": int, "cache_hit_percent": float}
+        """
+
+        prompt_tokens = sum(usage["prompt_tokens"] for usage in self.usage_per_request)
+        cached_tokens = sum(usage["cached_tokens"] for usage in self.usage_per_request)
+
+        return {
+            "requests": len(self.usage_per_request),
+            "prompt_tokens": prompt_tokens,
+            "cached_tokens": cached_tokens,
+            "completion_tokens": sum(
+                usage["completion_tokens"] for usage in self.usage_per_request
+            ),
+            "cache_hit_percent": (
+                100 * cached_tokens / prompt_tokens if prompt_tokens else 0.0
+            ),
+        }
+
+    def _stub(self, text: str) -> str:
+        return (
+            f"{text[:self.stub_characters]}\n"
+            f"[... {len(text) - self.stub_characters} more characters {ELIDED_MARKER}]"
+        )
+
+    def _is_stub(self, text: str) -> bool:
+        return text.endswith(f"{ELIDED_MARKER}]") or text.endswith(
+            f'{ELIDED_MARKER}]"}}'
+        )
+
+    def compact(self, messages: list[dict]) -> int:
+        """
+        Shrinks older messages in place until the conversation fits the token budget (or there is nothing
+        left to shrink).
+
+        Returns:
+            int: The estimated number of tokens saved.
+        """
+
+        tokens_before = tokens = self.estimated_tokens(messages)
+        if tokens <= self.token_budget:
+            return 0
+
+        assistant_message_indexes = [
+            index
+            for index, message in enumerate(messages)
+            if message["role"] == "assistant"
+        ]
+        if len(assistant_message_indexes) <= self.keep_recent_exchanges:
+            return 0
+
+        # Everything from this message on is recent and kept verbatim.
+        protected_from = assistant_message_indexes[-self.keep_recent_exchanges]
+
+        def shrink(message: dict, apply_stub) -> int:
+            """
+            Applies apply_stub to the message, returning the change in estimated tokens.
+            """
+            before = estimate_tokens(message_text(message))
+            apply_stub(message)
+            return int(
+                (estimate_tokens(message_text(message)) - before) * self.calibration
+            )
+
+        def stub_content(message: dict):
+            text = message_text(message)
+            if len(text) > self.stub_characters and not self._is_stub(text):
+                message["content"] = self._stub(text)
+
+        def stub_arguments(message: dict):
+            for tool_call in message.get("tool_calls") or []:
+                arguments = tool_call["function"]["arguments"]
+                if len(arguments) > self.stub_characters and not self._is_stub(
+                    arguments
+                ):
+                    # Arguments must stay valid JSON for the API.
+                    tool_call["function"]["arguments"] = json.dumps(
+                        {"elided_arguments": self._stub(arguments)}
+                    )
+
+        # First the (usually much larger) tool outputs, oldest first, then the tool call arguments.
+        for role, apply_stub in (("tool", stub_content), ("assistant", stub_arguments)):
+            for message in messages[:protected_from]:
+                if tokens <= self.token_budget:
+                    return tokens_before - tokens
+
+                if message["role"] == role:
+                    tokens += shrink(message, apply_stub)
+
+        return tokens_before - tokens
@@ -0,0 +1,119 @@
+import base64
+import io
+import math
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import matplotlib.pyplot as plt
+from PIL import Image
+
+from disk_lru_store import DiskLRUStore
+
+# Matplotlib backends that only render to files, plt.show displays nothing with them (e.g. no display available).
+NON_INTERACTIVE_BACKENDS = {"agg", "cairo", "pdf", "pgf", "ps", "svg", "template"}
+
+
+class ImagePipeline:
+    """
+    Handles the images produced by code executions: each is base64 decoded once, and the decoded bytes are
+    written to the output directory from a thread pool (so saving dozens of charts doesn't hold up the chat) and
+    displayed (see display_image_grid).
+
+    The output directory is bounded in size, the oldest images are deleted first once it outgrows max_bytes.
+    """
+
+    def __init__(
+        self,
+        directory: str = "./temp_image_output",
+        max_bytes: int = 200 * 1024 * 1024,
+        max_workers: int = 4,
+    ):
+        """
+        Args:
+            directory (str): Where images are saved (as temp-{timestamp}.png).
+            max_bytes (int): Total size of the saved images, the oldest are deleted beyond it.
+            max_workers (int): Threads writing images.
+        """
+
+        self.store = DiskLRUStore(directory, max_bytes)
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="eda-image"
+        )
+        self._last_timestamp = 0
+        self._lock = threading.Lock()
+
+    def decode(self, b64_images: list[str]) -> list[bytes]:
+        return [base64.b64decode(b64_image) for b64_image in b64_images]
+
+    def save(self, images: list[bytes]) -> list[Future]:
+        """
+        Saves images in the background.
+
+        Returns:
+            list[Future]: One per image, resolving to the path it was saved at.
+        """
+
+        futures = []
+        for image in images:
+            # Unique even when images come faster than the clock's resolution.
+            with self._lock:
+                timestamp = self._last_timestamp = max(
+                    time.time_ns(), self._last_timestamp + 1
+                )
+
+            file_name = f"temp-{timestamp}.png"
+            futures.append(self._executor.submit(self._write, file_name, image))
+
+        return futures
+
+    def _write(self, file_name: str, image: bytes):
+        self.store.put(file_name, image)
+        return self.store.path(file_name)
+
+    def shutdown(self):
+        """
+        Waits for the pending writes.
+        """
+
+        self._executor.shutdown(wait=True)
+
+
+def display_image_grid(
+    images: list[bytes], thumbnail_size: tuple[int, int] | None = (800, 800)
+):
+    """
+    Displays images together in a single grid figure, rather than a figure each.
+
+    Args:
+        images (list[bytes]): The decoded (PNG) images.
+        thumbnail_size (tuple[int, int] | None): Images are shrunk to fit this size (width, height) for display,
+            None to display them at full size.
+    """
+
+    if not images:
+        return
+
+    columns = math.ceil(math.sqrt(len(images)))
+    rows = math.ceil(len(images) / columns)
+
+    figure, axes = plt.subplots(
+        rows, columns, figsize=(5 * columns, 4 * rows), squeeze=False
+    )
+
+    for axis in axes.flat:
+        axis.axis("off")
+
+    for axis, image_data in zip(axes.flat, images):
+        image = Image.open(io.BytesIO(image_data))
+        if thumbnail_size:
+            image.thumbnail(thumbnail_size)
+        axis.imshow(image)
+
+    figure.tight_layout()
+    plt.show(block=False)  # continue running the program while the plot is open
+
+    if plt.get_backend().lower() in NON_INTERACTIVE_BACKENDS:
+        # A non interactive backend shows nothing, don't keep the figure in memory.
+        plt.close(figure)
@@ -0,0 +1,206 @@
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from e2b.exceptions import TimeoutException
+from e2b_code_interpreter import Execution, Sandbox
+
+# Job states, a job ends in one of the last four.
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+JOB_TIMED_OUT = "timed_out"
+JOB_CANCELLED = "cancelled"
+
+FINISHED_JOB_STATES = (JOB_SUCCEEDED, JOB_FAILED, JOB_TIMED_OUT, JOB_CANCELLED)
+
+
+class Job:
+    def __init__(self, job_id: str, code: str, description: str, timeout: float):
+        self.job_id = job_id
+        self.code = code
+        self.description = description
+        self.timeout = timeout
+
+        self.status = JOB_QUEUED
+        self.context = None
+        self.execution: Execution | None = None
+        self.error: str | None = None
+        self.stdout: list[str] = []
+        self.submitted_at = time.time()
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+        self.cancel_requested = False
+
+    def summary(self, stdout_tail_characters: int = 500) -> dict:
+        """
+        The job's state, with the end of its output so far.
+        """
+
+        end = self.finished_at or time.time()
+        summary = {
+            "job_id": self.job_id,
+            "description": self.description,
+            "status": self.status,
+            "seconds_running": (
+                round(end - self.started_at, 1) if self.started_at else 0.0
+            ),
+        }
+
+        stdout = "".join(self.stdout)
+        if stdout:
+            summary["stdout_tail"] = stdout[-stdout_tail_characters:]
+
+        if self.error:
+            summary["error"] = self.error
+
+        return summary
+
+
+class JobManager:
+    """
+    Runs code as background jobs, each in its own code context (a separate kernel) of the sandbox, so long running
+    work (e.g. fitting a model) neither blocks the chat nor the main kernel.
+
+    Jobs run on a thread pool, at most max_parallel_jobs at a time, the others wait in the queue. A job that
+    runs past its timeout, or is cancelled, has its kernel restarted to stop it. A job's context is removed
+    when it finishes, so its variables are gone: jobs hand their results back through files.
+    """
+
+    def __init__(
+        self,
+        sandbox: Sandbox,
+        max_parallel_jobs: int = 2,
+        default_timeout: float = 1800,
+    ):
+        """
+        Args:
+            sandbox (Sandbox): The sandbox the jobs run in.
+            max_parallel_jobs (int): Maximum number of jobs running at the same time.
+            default_timeout (float): Seconds a job may run for when it isn't given a timeout.
+        """
+
+        self.sandbox = sandbox
+        self.default_timeout = default_timeout
+        self.jobs: dict[str, Job] = {}
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_parallel_jobs, thread_name_prefix="eda-job"
+        )
+        self._futures = {}
+        self._job_numbers = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def submit(
+        self, code: str, description: str = "", timeout: float | None = None
+    ) -> Job:
+        with self._lock:
+            job = Job(
+                f"job-{next(self._job_numbers)}",
+                code,
+                description,
+                timeout or self.default_timeout,
+            )
+            self.jobs[job.job_id] = job
+            self._futures[job.job_id] = self._executor.submit(self._run, job)
+
+        return job
+
+    def _run(self, job: Job):
+        with self._lock:
+            if job.cancel_requested:
+                return
+            job.status = JOB_RUNNING
+            job.started_at = time.time()
+
+        try:
+            job.context = self.sandbox.create_code_context(language="python")
+            if job.cancel_requested:  # Cancelled while its kernel was starting.
+                raise RuntimeError("cancelled")
+
+            job.execution = self.sandbox.run_code(
+                job.code,
+                context=job.context,
+                on_stdout=lambda message: job.stdout.append(message.line),
+                timeout=job.timeout,
+            )
+
+            if job.cancel_requested:
+                status = JOB_CANCELLED
+            elif job.execution.error:
+                status = JOB_FAILED
+                job.error = f"{job.execution.error.name}: {job.execution.error.value}"
+            else:
+                status = JOB_SUCCEEDED
+
+        except TimeoutException:
+            status = JOB_CANCELLED if job.cancel_requested else JOB_TIMED_OUT
+            job.error = (
+                None if job.cancel_requested else f"Timed out after {job.timeout}s"
+            )
+            self._stop(job)
+
+        except Exception as e:
+            status = JOB_CANCELLED if job.cancel_requested else JOB_FAILED
+            job.error = None if job.cancel_requested else str(e)
+
+        finally:
+            self._remove_context(job)
+
+        with self._lock:
+            job.status = status
+            job.finished_at = time.time()
+
+    def _stop(self, job: Job):
+        """
+        Stops whatever the job's kernel is running (the client side timeout of run_code doesn't).
+        """
+
+        if job.context is not None:
+            try:
+                self.sandbox.restart_code_context(job.context)
+            except Exception:  # The sandbox may be gone already.
+                pass
+
+    def _remove_context(self, job: Job):
+        if job.context is not None:
+            try:
+                self.sandbox.remove_code_context(job.context)
+            except Exception:  # The sandbox may be gone already.
+                pass
+
+    def get(self, job_id: str) -> Job:
+        try:
+            return self.jobs[job_id]
+        except KeyError:
+            raise ValueError(f"No such job: {job_id}") from None
+
+    def cancel(self, job_id: str) -> Job:
+        job = self.get(job_id)
+
+        with self._lock:
+            if job.status in FINISHED_JOB_STATES:
+                return job
+
+            job.cancel_requested = True
+            if job.status == JOB_QUEUED:
+                self._futures[job_id].cancel()
+                job.status = JOB_CANCELLED
+                job.finished_at = time.time()
+                return job
+
+        # Restarting the kernel interrupts the running code, _run then marks the job cancelled.
+        self._stop(job)
+        return job
+
+    def shutdown(self):
+        """
+        Cancels every unfinished job, without waiting for them.
+        """
+
+        for job_id in list(self.jobs):
+            self.cancel(job_id)
+
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -1,5 +1,6 @@
 import asyncio
 import os
+import time
 from typing import Tuple
 
 from dotenv import load_dotenv
@@ -7,9 +8,15 @@ from e2b_code_interpreter import Sandbox
 from rich.console import Console
 from rich.panel import Panel
 from rich.prompt import Prompt
+from rich.table import Table
 
 from browser_agent import downloading_task_for_browser_agent
+from response_cache import ResponseCache
 from sandbox_eda import SandboxEDA
+from sandbox_pool import WARMUP_CODE, SandboxPool
+from sandbox_sql import prewarm_duckdb
+from session_checkpoint import list_checkpoints, pause_sandbox, read_checkpoint
+from tracing import Tracer
 from pathlib import Path
 
 # Load environment variables from .env file
@@ -17,8 +24,32 @@ load_dotenv()
 
 console = Console()
 
+CHECKPOINT_DIRECTORY = "./.eda_cache/checkpoints"
+# When enabled, outputs of read-only cells (df.describe(), plots, ...) are reused when the same cell runs again on
+# the same data (see execution_cache.py).
+ENABLE_EXECUTION_CACHE = False
+EXECUTION_CACHE_PATH = "./.eda_cache/executions"
+# Model responses of the browser agent and the EDA agent; "record" reuses recorded responses and records new ones,
+# "replay" only reuses recorded ones, "passthrough" always calls the model (responses are then streamed).
+RESPONSE_CACHE = ResponseCache("./.eda_cache/responses", mode="passthrough")
 
-def start_eda(
+
+def connect_to_sandbox(
+    sandbox_id: str, api_key: str, sandbox_domain: str, sandbox_timeout: int
+) -> Sandbox | None:
+    """
+    Connects to a sandbox that is still around (resuming it if it was paused), None if it is gone.
+    """
+
+    try:
+        sandbox = Sandbox.connect(sandbox_id, api_key=api_key, domain=sandbox_domain)
+        sandbox.set_timeout(sandbox_timeout)
+        return sandbox
+    except Exception:
+        return None
+
+
+async def start_eda(
     model_for_eda: str,
     dataset_paths: list[str],
     dataset_file_names: list[str],
@@ -27,33 +58,118 @@ def start_eda(
     sandbox_domain: str,
     sandbox_template: str,
     sandbox_timeout: int,
+    upload_compression: str | None = None,
+    sandbox_pool: SandboxPool | None = None,
+    tracer: Tracer | None = None,
+    resume_from: Path | None = None,
+    pause_sandbox_on_exit: bool = False,
 ):
 
-    with Sandbox(
-        template=sandbox_template,
-        api_key=api_key_for_sandbox_and_model,
-        domain=sandbox_domain,
-        timeout=sandbox_timeout,
-    ) as sandbox:
+    tracer = tracer or Tracer()
+    checkpoint = read_checkpoint(resume_from) if resume_from else None
+
+    def create_sandbox():
+        return Sandbox(
+            template=sandbox_template,
+            api_key=api_key_for_sandbox_and_model,
+            domain=sandbox_domain,
+            timeout=sandbox_timeout,
+        )
 
-        try:
-            sandbox_eda = SandboxEDA(
-                sandbox, model_api_base_url, api_key_for_sandbox_and_model
+    # A resumed session gets its own sandbox back if it is still around (paused, or running after a crash).
+    # Otherwise take a warm sandbox from the pool if there is one, it is killed at the end of the session like
+    # any other.
+    with tracer.span(
+        "sandbox_creation",
+        pooled=sandbox_pool is not None,
+        resumed=checkpoint is not None,
+    ):
+        sandbox = await asyncio.to_thread(
+            lambda: (
+                checkpoint
+                and connect_to_sandbox(
+                    checkpoint["sandbox_id"],
+                    api_key_for_sandbox_and_model,
+                    sandbox_domain,
+                    sandbox_timeout,
+                )
             )
+            or (sandbox_pool.acquire() if sandbox_pool else create_sandbox())
+        )
 
-            console.print(
-                f"[bold cyan]Started Sandbox[/bold cyan] (id: {sandbox.sandbox_id})"
+    if not sandbox_pool:  # Pooled sandboxes started it when they were created.
+        prewarm_duckdb(sandbox)
+
+    sandbox_eda = None
+    keep_sandbox = False
+    try:
+        sandbox_eda = SandboxEDA(
+            sandbox,
+            model_api_base_url,
+            api_key_for_sandbox_and_model,
+            upload_compression=upload_compression,
+            tracer=tracer,
+            checkpoint_directory=CHECKPOINT_DIRECTORY,
+            pause_sandbox_on_exit=pause_sandbox_on_exit,
+            # Kept alive while the session is active, replaced if it dies anyway, with the imports a pooled
+            # sandbox starts with.
+            sandbox_timeout=sandbox_timeout,
+            sandbox_factory=create_sandbox,
+            setup_code=WARMUP_CODE,
+            execution_cache_path=(
+                EXECUTION_CACHE_PATH if ENABLE_EXECUTION_CACHE else None
+            ),
+            response_cache=RESPONSE_CACHE,
+        )
+
+        console.print(
+            f"[bold cyan]Started Sandbox[/bold cyan] (id: {sandbox.sandbox_id})"
+        )
+
+        messages = None
+        if checkpoint:
+            try:
+                messages = await asyncio.to_thread(
+                    sandbox_eda.restore_checkpoint, resume_from, checkpoint
+                )
+            except FileNotFoundError as e:
+                console.print(f"[bold red]{str(e)}[/bold red]\n")
+                if sandbox.sandbox_id == checkpoint["sandbox_id"]:
+                    # The session's own sandbox, leave it as it was (paused if possible) so the session can still
+                    # be resumed once the datasets are back.
+                    keep_sandbox = True
+                    sandbox_eda.sandbox_paused = await asyncio.to_thread(
+                        pause_sandbox, sandbox
+                    )
+                return  # return to main menu
+        else:
+            await asyncio.to_thread(
+                sandbox_eda.upload_files_to_sandbox, dataset_paths, dataset_file_names
             )
+            await asyncio.to_thread(sandbox_eda.run_setup_code)
+
+        await sandbox_eda.async_eda_chat(dataset_file_names, model_for_eda, messages)
 
-            sandbox_eda.upload_files_to_sandbox(dataset_paths, dataset_file_names)
+        console.print(
+            f"\n\n[bold cyan]------ EDA Session Completed for Sandbox (id: {sandbox_eda.sandbox.sandbox_id}) ------[/]"
+        )
 
-            sandbox_eda.eda_chat(dataset_file_names, model_for_eda)
+    finally:
+        if sandbox_eda:
+            sandbox = sandbox_eda.sandbox  # It may have been replaced.
+            if sandbox_eda.lease:
+                sandbox_eda.lease.stop()
 
+        if sandbox_eda and sandbox_eda.sandbox_paused:
             console.print(
-                f"\n\n[bold cyan]------ EDA Session Completed for Sandbox (id: {sandbox.sandbox_id}) ------[/]"
+                f"[bold cyan]----- Paused Sandbox (id: {sandbox.sandbox_id})-----[/]\n"
             )
-
-        finally:
+        elif keep_sandbox:
+            console.print(
+                f"[bold cyan]----- Left Sandbox running until its timeout (id: {sandbox.sandbox_id})-----[/]\n"
+            )
+        else:
+            sandbox.kill()
             console.print(
                 f"[bold cyan]----- Closed Sandbox (id: {sandbox.sandbox_id})-----[/]\n"
             )
@@ -65,6 +181,7 @@ async def choice_download_dataset(
     model_api_base_url: str,
     model_for_browser_agent: str,
     enable_vision_for_browser_agent: bool,
+    tracer: Tracer | None = None,
 ) -> None | Tuple[str, list[str]]:
 
     console.print(
@@ -95,6 +212,8 @@ async def choice_download_dataset(
             model_for_browser_agent,
             model_api_base_url,
             use_vision=enable_vision_for_browser_agent,
+            tracer=tracer,
+            response_cache=RESPONSE_CACHE,
         )
 
         if filenames is None:
@@ -158,6 +277,42 @@ def choice_proceed_with_already_downloaded_datasets() -> None | list[str]:
     return paths
 
 
+def choice_resume_session() -> None | Path:
+    checkpoints = list_checkpoints(CHECKPOINT_DIRECTORY)[:10]
+    if not checkpoints:
+        console.print("[bold red]No saved sessions to resume.[/bold red]\n")
+        return
+
+    table = Table(title="Saved Sessions", border_style="white")
+    table.add_column("#", style="bold green")
+    table.add_column("Session")
+    table.add_column("Datasets")
+    table.add_column("Messages", justify="right")
+    table.add_column("Saved at")
+    table.add_column("Sandbox")
+
+    for number, checkpoint in enumerate(checkpoints, start=1):
+        table.add_row(
+            str(number),
+            checkpoint["session_id"],
+            ", ".join(checkpoint["dataset_paths"]),
+            str(sum(message["role"] == "user" for message in checkpoint["messages"])),
+            time.strftime("%Y-%m-%d %H:%M", time.localtime(checkpoint["updated_at"])),
+            "paused" if checkpoint["sandbox_paused"] else "snapshot",
+        )
+    console.print(table)
+
+    choice = Prompt.ask(
+        "\n[bold yellow]Enter the session to resume (or 'back')[/bold yellow]",
+        choices=[str(number) for number in range(1, len(checkpoints) + 1)] + ["back"],
+    ).strip()
+
+    if choice == "back":
+        return  # return to main menu
+
+    return Path(CHECKPOINT_DIRECTORY) / checkpoints[int(choice) - 1]["session_id"]
+
+
 async def main(
     api_key_for_sandbox_and_model: str,
     model_api_base_url: str,
@@ -167,66 +322,110 @@ async def main(
     sandbox_domain: str,
     sandbox_template: str,
     sandbox_timeout_seconds: int,
+    upload_compression: str | None = None,
+    sandbox_pool_size: int = 0,
+    pause_sandbox_on_exit: bool = False,
 ):
 
-    while True:
+    # Boot sandboxes in the background while the user is still picking datasets.
+    sandbox_pool = None
+    if sandbox_pool_size:
+        sandbox_pool = SandboxPool(
+            lambda: Sandbox(
+                template=sandbox_template,
+                api_key=api_key_for_sandbox_and_model,
+                domain=sandbox_domain,
+                timeout=sandbox_timeout_seconds,
+            ),
+            size=sandbox_pool_size,
+            sandbox_timeout=sandbox_timeout_seconds,
+        ).start()
 
-        # Welcome Banner
-        console.print(
-            Panel(
-                "[bold white]Welcome To Agentic Exploratory Data Analysis[/bold white]\n\n"
-                "[grey]How would you like to proceed:[/grey]\n"
-                "[grey]1.[/grey] Download a dataset first.\n"
-                "[grey]2.[/grey] Proceed with already downloaded dataset.\n"
-                "[grey]3.[/grey] Exit",
-                title="MAIN MENU",
-                border_style="green",
-                width=70,
+    try:
+        while True:
+
+            # Each pass through the menu is a session with its own trace (dataset download, sandbox, chat).
+            tracer = Tracer()
+            resume_from = (
+                None  # The checkpoint of a session to resume, if the user picks one.
             )
-        )
 
-        choice = Prompt.ask(
-            "\n[bold yellow]Enter your choice[/bold yellow]", choices=["1", "2", "3"]
-        ).strip()
+            # Welcome Banner
+            console.print(
+                Panel(
+                    "[bold white]Welcome To Agentic Exploratory Data Analysis[/bold white]\n\n"
+                    "[grey]How would you like to proceed:[/grey]\n"
+                    "[grey]1.[/grey] Download a dataset first.\n"
+                    "[grey]2.[/grey] Proceed with already downloaded dataset.\n"
+                    "[grey]3.[/grey] Resume a saved session.\n"
+                    "[grey]4.[/grey] Exit",
+                    title="MAIN MENU",
+                    border_style="green",
+                    width=70,
+                )
+            )
 
-        if choice == "1":
-            result = await choice_download_dataset(
+            choice = Prompt.ask(
+                "\n[bold yellow]Enter your choice[/bold yellow]",
+                choices=["1", "2", "3", "4"],
+            ).strip()
+
+            if choice == "1":
+                result = await choice_download_dataset(
+                    api_key_for_sandbox_and_model,
+                    model_api_base_url,
+                    model_for_browser_agent,
+                    enable_vision_for_browser_agent,
+                    tracer,
+                )
+                if result:
+                    download_path, filenames = result
+                    DATASET_PATHS = [
+                        str(Path(download_path) / filename) for filename in filenames
+                    ]
+                    DATASET_FILE_NAMES = filenames
+                else:
+                    continue  # User returned to main menu
+
+            elif choice == "2":
+                result = choice_proceed_with_already_downloaded_datasets()
+                if result:
+                    DATASET_PATHS = result
+                    DATASET_FILE_NAMES = [os.path.basename(path) for path in result]
+                else:
+                    continue  # since user click back to main menu.
+
+            elif choice == "3":
+                resume_from = choice_resume_session()
+                if resume_from is None:
+                    continue  # since user click back to main menu.
+
+                DATASET_PATHS = []
+                DATASET_FILE_NAMES = list(read_checkpoint(resume_from)["dataset_paths"])
+
+            elif choice == "4":
+                break
+
+            # Start the EDA session
+            await start_eda(
+                model_for_eda,
+                DATASET_PATHS,
+                DATASET_FILE_NAMES,
                 api_key_for_sandbox_and_model,
                 model_api_base_url,
-                model_for_browser_agent,
-                enable_vision_for_browser_agent,
+                sandbox_domain,
+                sandbox_template,
+                sandbox_timeout_seconds,
+                upload_compression,
+                sandbox_pool,
+                tracer,
+                resume_from,
+                pause_sandbox_on_exit,
             )
-            if result:
-                download_path, filenames = result
-                DATASET_PATHS = [
-                    str(Path(download_path) / filename) for filename in filenames
-                ]
-                DATASET_FILE_NAMES = filenames
-            else:
-                continue  # User returned to main menu
-
-        elif choice == "2":
-            result = choice_proceed_with_already_downloaded_datasets()
-            if result:
-                DATASET_PATHS = result
-                DATASET_FILE_NAMES = [os.path.basename(path) for path in result]
-            else:
-                continue  # since user click back to main menu.
-
-        elif choice == "3":
-            break
-
-        # Start the EDA session
-        start_eda(
-            model_for_eda,
-            DATASET_PATHS,
-            DATASET_FILE_NAMES,
-            api_key_for_sandbox_and_model,
-            model_api_base_url,
-            sandbox_domain,
-            sandbox_template,
-            sandbox_timeout_seconds,
-        )
+
+    finally:
+        if sandbox_pool:
+            sandbox_pool.shutdown()
 
 
 if __name__ == "__main__":
@@ -240,6 +439,11 @@ if __name__ == "__main__":
     )
     NOVITA_MODEL_FOR_EDA = "qwen/qwen3-coder-480b-a35b-instruct"
     NOVITA_SANDBOX_TIMEOUT_SECONDS = 900  # 900 seconds (15 minutes), sandbox instance will be killed automatically after.
+    UPLOAD_COMPRESSION = "gzip"  # Compress datasets on the wire; options [None, 'gzip', 'zstd' (needs the zstandard package)].
+    NOVITA_SANDBOX_POOL_SIZE = (
+        1  # Warm sandboxes kept ready in the background; 0 disables the pool.
+    )
+    PAUSE_SANDBOX_ON_EXIT = False  # Pause the sandbox at the end of a session instead of killing it, if the provider supports it, so it resumes as it was.
 
     asyncio.run(
         main(
@@ -251,5 +455,8 @@ if __name__ == "__main__":
             NOVITA_E2B_DOMAIN,
             NOVITA_E2B_TEMPLATE,
             NOVITA_SANDBOX_TIMEOUT_SECONDS,
+            UPLOAD_COMPRESSION,
+            NOVITA_SANDBOX_POOL_SIZE,
+            PAUSE_SANDBOX_ON_EXIT,
         )
     )
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import re
+from typing import Awaitable, Callable
+
+from openai import AsyncOpenAI
+from openai.types.chat import ChatCompletion
+from pydantic import BaseModel
+
+from disk_lru_store import DiskLRUStore
+
+# record: responses are served from the cache, the model is called on a miss and its response stored.
+# replay: responses are only served from the cache, a miss raises ResponseCacheMiss (nothing is ever paid for).
+# passthrough: the cache isn't used.
+RESPONSE_CACHE_MODES = ("record", "replay", "passthrough")
+
+# Timings in tool outputs (e.g. run_sql's "seconds", a job's "seconds_running") differ from run to run, they are
+# zeroed in the cache keys so a replayed session's requests match the recorded ones.
+VOLATILE_FIELD_PATTERN = re.compile(
+    r'("\w*seconds\w*"\s*:\s*)-?\d+(?:\.\d+)?(?:e-?\d+)?'
+)
+
+
+class ResponseCacheMiss(Exception):
+    """
+    Raised in replay mode for a request that wasn't recorded.
+    """
+
+
+def normalize_request(value):
+    """
+    The request as plain JSON data in a canonical form: models dumped, None fields dropped (the API treats them as
+    absent) and volatile fields zeroed, so equivalent requests get the same key.
+    """
+
+    if isinstance(value, BaseModel):
+        return normalize_request(value.model_dump(mode="json", exclude_none=True))
+
+    if isinstance(value, dict):
+        return {
+            str(key): normalize_request(item)
+            for key, item in value.items()
+            if item is not None
+        }
+
+    if isinstance(value, (list, tuple)):
+        return [normalize_request(item) for item in value]
+
+    if isinstance(value, str):
+        return VOLATILE_FIELD_PATTERN.sub(r"\g<1>0", value)
+
+    return value
+
+
+class ResponseCache:
+    """
+    Model responses kept on disk (a DiskLRUStore bounded in size), keyed on the normalized request: the messages,
+    the tools and the model parameters. Recording a session once lets it (or a regression run asking the same
+    questions) be replayed in seconds without calling the model.
+    """
+
+    def __init__(
+        self,
+        directory: str = "./.eda_cache/responses",
+        max_bytes: int = 500 * 1024 * 1024,
+        mode: str = "record",
+    ):
+        if mode not in RESPONSE_CACHE_MODES:
+            raise ValueError(
+                f"Unknown response cache mode {mode!r}, expected one of {RESPONSE_CACHE_MODES}"
+            )
+
+        self.store = DiskLRUStore(directory, max_bytes)
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "passthrough"
+
+    def key(self, request: dict) -> str:
+        return hashlib.sha256(
+            json.dumps(
+                normalize_request(request),
+                sort_keys=True,
+                separators=(",", ":"),
+                ensure_ascii=False,
+                default=str,
+            ).encode("utf-8")
+        ).hexdigest()
+
+    async def cached_call(
+        self,
+        request: dict,
+        call: Callable[[], Awaitable],
+        dump: Callable[[object], dict],
+        load: Callable[[dict], object],
+    ):
+        """
+        Serves the response to request from the cache, or gets it with call (and stores it) depending on mode.
+
+        Args:
+            request (dict): Everything the response depends on.
+            call: Makes the request.
+            dump: Turns a response into JSON data to store.
+            load: Turns the stored JSON data back into a response.
+
+        Raises:
+            ResponseCacheMiss: In replay mode, if the request wasn't recorded.
+        """
+
+        if not self.enabled:
+            return await call()
+
+        key = self.key(request)
+        data = self.store.get(key)
+        if data is not None:
+            self.hits += 1
+            return load(json.loads(data))
+
+        self.misses += 1
+        if self.mode == "replay":
+            raise ResponseCacheMiss(
+                f"No recorded response for this request (key {key[:12]}), record it first"
+            )
+
+        response = await call()
+        self.store.put(key, json.dumps(dump(response)).encode("utf-8"))
+        return response
+
+    async def create_chat_completion(
+        self, client: AsyncOpenAI, **request
+    ) -> ChatCompletion:
+        """
+        client.chat.completions.create(**request) through the cache. Streamed requests can't be cached, don't
+        pass stream=True.
+        """
+
+        return await self.cached_call(
+            {"api": "chat.completions", **request},
+            lambda: client.chat.completions.create(**request),
+            lambda response: response.model_dump(mode="json"),
+            ChatCompletion.model_validate,
+        )
+
+    def summary(self) -> dict:
+        return {"mode": self.mode, "hits": self.hits, "misses": self.misses}
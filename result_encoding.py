@@ -0,0 +1,151 @@
+import json
+import re
+import sys
+
+from e2b_code_interpreter import Execution, ExecutionError, Logs, Result
+
+from history_manager import estimate_tokens
+
+# Jupyter colours tracebacks with ANSI escape codes, which cost tokens and mean nothing to the model.
+ANSI_ESCAPE_PATTERN = re.compile(r"\x1b\[[0-9;]*[A-Za-z]")
+
+# Structured data (JSON, a DataFrame's data) longer than this once serialized is left out of encoded results.
+STRUCTURED_RESULT_MAX_CHARACTERS = 2_000
+
+
+def encode_result(result: Result):
+    """
+    Picks the single cheapest useful representation of a result: its text/plain repr (which for a DataFrame is the
+    same truncated table its html and markdown variants render), falling back to markdown, latex or html, then to
+    structured data (JSON, or a DataFrame's data) only when there is no text and it is small. A DataFrame's data is
+    the whole frame, it would send the whole dataset to the model.
+    """
+
+    for representation in (result.text, result.markdown, result.latex, result.html):
+        if representation:
+            return representation
+
+    structured = result.json if result.json is not None else result.data
+    if (
+        structured is not None
+        and len(dumps_compact(structured)) <= STRUCTURED_RESULT_MAX_CHARACTERS
+    ):
+        return structured
+
+    # Only rich formats the model can't use (e.g. svg, pdf) or too big structured data, say what there was.
+    return f"<{', '.join(result.formats())} output>"
+
+
+def encode_execution(execution: Execution) -> dict:
+    """
+    Encodes the non image outputs of an execution compactly, leaving out empty fields.
+
+    Returns:
+        dict: {"results": list, "stdout": str, "stderr": str, "error": {"name", "value", "traceback"}}, each
+        key present only if non empty.
+    """
+
+    encoded = {}
+
+    results = [
+        encode_result(result)
+        for result in execution.results
+        if not (result.png or result.jpeg)
+    ]
+    if results:
+        encoded["results"] = results
+
+    stdout = "".join(execution.logs.stdout)
+    if stdout:
+        encoded["stdout"] = stdout
+
+    stderr = "".join(execution.logs.stderr)
+    if stderr:
+        encoded["stderr"] = stderr
+
+    if execution.error:
+        encoded["error"] = {
+            "name": execution.error.name,
+            "value": execution.error.value,
+            "traceback": ANSI_ESCAPE_PATTERN.sub("", execution.error.traceback),
+        }
+
+    return encoded
+
+
+def dumps_compact(encoded: dict) -> str:
+    """
+    Stable, compact text form of an encoded execution for the model (no whitespace between tokens, non ASCII
+    characters kept as is).
+    """
+
+    return json.dumps(encoded, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def legacy_encoding(execution: Execution) -> str:
+    """
+    The format tool results used to be sent in, kept to measure the savings against.
+    """
+
+    return str(
+        {
+            "outputs": [result for result in execution.results if not result.png],
+            "logs": execution.logs,
+            "error": execution.error,
+        }
+    )
+
+
+def load_recorded_execution(line: str) -> Execution:
+    """
+    Rebuilds an Execution from a line written by Execution.to_json() (see SandboxEDA's execution_log_path).
+    """
+
+    data = json.loads(line)
+
+    error = data["error"]
+    if isinstance(error, str):
+        error = json.loads(error)
+
+    return Execution(
+        results=[Result(**result) for result in data["results"]],
+        logs=Logs(**json.loads(data["logs"])),
+        error=ExecutionError(**error) if error else None,
+    )
+
+
+def compare_encodings(recorded_executions_path: str) -> dict:
+    """
+    Compares the estimated token count of the legacy and compact encodings over recorded executions.
+
+    Returns:
+        dict: {"executions": int, "legacy_tokens": int, "compact_tokens": int, "saved_percent": float}
+    """
+
+    legacy_tokens = compact_tokens = executions = 0
+
+    with open(recorded_executions_path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+
+            execution = load_recorded_execution(line)
+            legacy_tokens += estimate_tokens(legacy_encoding(execution))
+            compact_tokens += estimate_tokens(
+                dumps_compact(encode_execution(execution))
+            )
+            executions += 1
+
+    return {
+        "executions": executions,
+        "legacy_tokens": legacy_tokens,
+        "compact_tokens": compact_tokens,
+        "saved_percent": (
+            100 * (1 - compact_tokens / legacy_tokens) if legacy_tokens else 0.0
+        ),
+    }
+
+
+if __name__ == "__main__":
+    # Usage: python result_encoding.py <recorded_executions.jsonl>, e.g. benchmarks/recorded_executions.jsonl
+    print(json.dumps(compare_encodings(sys.argv[1]), indent=2))
@@ -1,20 +1,64 @@
-import base64
-import io
+import asyncio
+import contextlib
+import contextvars
 import json
+import os
+import signal
+import threading
 import time
+from typing import Callable
 
-import matplotlib.pyplot as plt
-from e2b_code_interpreter import Sandbox, FileType
-from openai import OpenAI
-from PIL import Image
+from e2b.exceptions import TimeoutException
+from e2b_code_interpreter import Execution, ExecutionError, FileType, Logs, Sandbox
+from openai import AsyncOpenAI
 from rich.console import Console
+from rich.live import Live
 from rich.panel import Panel
 from rich.prompt import Prompt
 from rich.table import Table
+from rich.text import Text
 import shutil
-from pathlib import Path
-
-from prompts.system_prompt import SYSTEM_PROMPT
+from pathlib import Path, PurePosixPath
+
+from artifact_store import ArtifactStore
+from dataset_preload import dataframe_name, format_preloaded, preload_datasets
+from dataset_profile import format_profile, profile_datasets
+from disk_lru_store import DiskLRUStore
+from execution_cache import READ_ONLY_SQL_PATTERN, ExecutionCache, uncacheable_reason
+from history_manager import HistoryManager, cached_prompt_tokens
+from image_pipeline import ImagePipeline, display_image_grid
+from job_manager import FINISHED_JOB_STATES, JobManager
+from response_cache import ResponseCache
+from prompts.system_prompt import (
+    EXECUTION_CACHE_PROMPT,
+    SESSION_CONTEXT_PROMPT,
+    SYSTEM_PROMPT,
+)
+from result_encoding import dumps_compact, encode_execution
+from sandbox_lease import SandboxLease
+from sandbox_sql import run_sql, sql_views
+from session_checkpoint import (
+    FILES_DIRECTORY_NAME,
+    KERNEL_STATE_FILE_NAME,
+    is_derived_file,
+    missing_kernel_variables,
+    pause_sandbox,
+    restore_files,
+    restore_kernel,
+    snapshot_kernel,
+    write_checkpoint,
+)
+from sandbox_sync import resolve_sync_destination, sync_incrementally
+from sandbox_upload import SANDBOX_HOME_DIR, upload_files_concurrently
+from tracing import Tracer, display_trace_summary
+from upload_cache import (
+    FingerprintIndex,
+    copy_within_sandbox,
+    plan_uploads,
+    read_sandbox_manifest,
+    sandbox_file_stats,
+    write_sandbox_manifest,
+)
 
 console = Console()
 
@@ -53,6 +97,102 @@ AVAILABLE_FUNCTION_CALL_SCHEMAS = [
             },
         },
     },
+    {
+        "type": "function",
+        "function": {
+            "name": "run_sql",
+            "description": "Runs a SQL query with DuckDB directly over the dataset files (without loading them in the python kernel) and returns the result rows and query time. Prefer it for filters, joins and aggregations over large datasets.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "query": {
+                        "type": "string",
+                        "description": "The DuckDB SQL query. Datasets can be queried by their view name (listed in the session context) or by path, e.g. SELECT * FROM '/home/user/data.csv'.",
+                    },
+                    "max_rows": {
+                        "type": "integer",
+                        "description": "Maximum number of result rows to return. Defaults to 100.",
+                    },
+                },
+                "required": ["query"],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "submit_job",
+            "description": "Starts python code as a background job in a separate, fresh python kernel (no variables or preloaded datasets from run_python_code) and returns its job id right away. Use it for long running work (e.g. model fitting) so you can keep working meanwhile. Variables don't outlive the job, save results to files in /home/user to use them afterwards.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "python_code": {
+                        "type": "string",
+                        "description": "The Python code to run.",
+                    },
+                    "description": {
+                        "type": "string",
+                        "description": "Short description of what the job does.",
+                    },
+                    "timeout_seconds": {
+                        "type": "integer",
+                        "description": "Seconds after which the job is stopped. Defaults to 1800.",
+                    },
+                },
+                "required": ["python_code"],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "job_status",
+            "description": "Returns the status (queued, running, succeeded, failed, timed_out or cancelled), running time and latest output of a background job, or of all jobs.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "job_id": {
+                        "type": "string",
+                        "description": "The job id, omit it for all jobs.",
+                    }
+                },
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "job_result",
+            "description": "Returns the outputs of a finished background job, the same way run_python_code does, or its status if it hasn't finished.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "job_id": {
+                        "type": "string",
+                        "description": "The job id.",
+                    }
+                },
+                "required": ["job_id"],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "cancel_job",
+            "description": "Stops a queued or running background job.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "job_id": {
+                        "type": "string",
+                        "description": "The job id.",
+                    }
+                },
+                "required": ["job_id"],
+            },
+        },
+    },
     {
         "type": "function",
         "function": {
@@ -69,6 +209,10 @@ AVAILABLE_FUNCTION_CALL_SCHEMAS = [
                         "type": "string",
                         "description": "Relative path where the file or directory will be placed inside the user's sync folder. For example, '/hello.txt' goes directly in the sync folder, while '/run1/hello.txt' will be placed in a 'run1' subfolder within the sync folder.",
                     },
+                    "delete_missing": {
+                        "type": "boolean",
+                        "description": "When syncing a directory, also delete files in the sync folder copy that no longer exist in the sandbox directory. Defaults to false.",
+                    },
                 },
                 "required": ["sandbox_path", "path_on_user_sync_folder"],
             },
@@ -91,26 +235,83 @@ AVAILABLE_FUNCTION_CALL_SCHEMAS = [
             },
         },
     },
+    {
+        "type": "function",
+        "function": {
+            "name": "read_artifact",
+            "description": "Reads a range of a large tool output that was stored as an artifact (the output only showed its start and end). Give either a line range or a byte range, not both.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "artifact_id": {
+                        "type": "string",
+                        "description": "The artifact id given in the truncated output.",
+                    },
+                    "start_line": {
+                        "type": "integer",
+                        "description": "First line to read (1-based, inclusive).",
+                    },
+                    "end_line": {
+                        "type": "integer",
+                        "description": "Last line to read (1-based, inclusive).",
+                    },
+                    "start_byte": {
+                        "type": "integer",
+                        "description": "First byte to read (0-based, inclusive).",
+                    },
+                    "end_byte": {
+                        "type": "integer",
+                        "description": "Byte to stop reading at (0-based, exclusive).",
+                    },
+                },
+                "required": ["artifact_id"],
+            },
+        },
+    },
 ]
 
-
-def display_sandbox_code_output(code_result: dict):
+# Tool calls that use the same resource are run one after the other, in the order the agent made them
+# (e.g. code cells share the kernel). Tool calls not listed here can always run concurrently.
+TOOL_CALL_RESOURCES = {
+    "run_python_code": "kernel",
+    "sync_with_user": "sync_folder",
+    "delete_from_user_sync_folder": "sync_folder",
+}
+
+# Images to display once a tool call run in a worker thread finishes: matplotlib's GUI backends only work on the
+# main thread, so the worker queues them here and handle_tool_call_async displays them on the event loop's thread.
+_deferred_image_displays = contextvars.ContextVar(
+    "deferred_image_displays", default=None
+)
+
+
+def display_sandbox_code_output(
+    code_result: dict,
+    show_logs: bool = True,
+    thumbnail_size: tuple[int, int] | None = (800, 800),
+    display_images: bool = True,
+):
     """
     Beautifully display the output from sandbox code execution.
 
     Args:
+        show_logs (bool): Whether to show stdout and stderr, False when they were already shown live.
+        display_images (bool): Whether to show the images with matplotlib, False when headless (they are saved
+            either way).
+        thumbnail_size (tuple[int, int] | None): Size images are shrunk to fit for display, None for full size.
         code_result (dict): Sandbox execution results with structure:
             {
-                "image_outputs": list[base64 images],
+                "image_outputs": list[decoded images],
                 "other_outputs": {
-                    "outputs": list[str],
-                    "logs": list[str],
-                    "error": list[str]
-                }
+                    "results": list[str | dict | list],
+                    "stdout": str,
+                    "stderr": str,
+                    "error": {"name": str, "value": str, "traceback": str}
+                }  # Only the non empty keys are present (see result_encoding.encode_execution).
             }
     """
 
-    if code_result["image_outputs"]:
+    if code_result["image_outputs"] and display_images:
         console.print(
             Panel(
                 "[bold cyan]Image Outputs Displayed Below (if possible otherwise check temp-*.png files):[/bold cyan]",
@@ -118,30 +319,49 @@ def display_sandbox_code_output(code_result: dict):
                 border_style="green",
             )
         )
-        display_images_if_possible(code_result["image_outputs"])
+        deferred_image_displays = _deferred_image_displays.get()
+        if deferred_image_displays is None:
+            display_images_if_possible(code_result["image_outputs"], thumbnail_size)
+        else:
+            deferred_image_displays.append(
+                (code_result["image_outputs"], thumbnail_size)
+            )
+
+    other_outputs = code_result["other_outputs"]
 
     output_table = Table(show_header=True, header_style="bold magenta")
     output_table.add_column("Code Execution Output")
 
-    output_table.add_row(str(code_result["other_outputs"]))
+    for result in other_outputs.get("results", []):
+        output_table.add_row(
+            Text(result if isinstance(result, str) else dumps_compact(result))
+        )
+    for log_name in ("stdout", "stderr") if show_logs else ():
+        if other_outputs.get(log_name):
+            output_table.add_row(Text(f"{log_name}:\n{other_outputs[log_name]}"))
 
     console.print(output_table)
 
-    if code_result["other_outputs"]["error"]:
+    if other_outputs.get("error"):
+        error = other_outputs["error"]
         console.print(
             Panel(
-                f"[bold red]Error:[/bold red] {code_result['other_outputs']['error']}",
+                Text.assemble(
+                    ("Error: ", "bold red"),
+                    f"{error['name']}: {error['value']}\n{error['traceback']}",
+                ),
                 title="Execution Error",
                 border_style="red",
             )
         )
 
 
-def display_sandbox_command_output(command_result: dict):
+def display_sandbox_command_output(command_result: dict, show_logs: bool = True):
     """
     Beautifully display the output from sandbox command execution.
 
     Args:
+        show_logs (bool): Whether to show the command's output, False when it was already shown live.
         command_result (dict): Sandbox command results with structure:
             {
                 "output": str,
@@ -149,7 +369,10 @@ def display_sandbox_command_output(command_result: dict):
             }
     """
 
-    if command_result["output"]:
+    if command_result["output"] and not show_logs:
+        console.print(f"[dim]Exit code {command_result['output']['exit_code']}[/dim]")
+
+    elif command_result["output"]:
         output_table = Table(show_header=True, header_style="bold magenta")
         output_table.add_column("Command Execution Output")
         output_table.add_row(str(command_result["output"]))
@@ -165,22 +388,111 @@ def display_sandbox_command_output(command_result: dict):
         )
 
 
-def display_images_if_possible(image_outputs):
+def display_sql_result(sql_result: dict):
+    """
+    Displays the result of a SQL query as a table.
+
+    Args:
+        sql_result (dict): The result returned by sandbox_sql.run_sql.
+    """
+
+    if "error" in sql_result:
+        console.print(
+            Panel(
+                f"[bold red]Error:[/bold red] {sql_result['error']}",
+                title="SQL Error",
+                border_style="red",
+            )
+        )
+        return
+
+    sql_table = Table(show_header=True, header_style="bold magenta")
+    for column in sql_result["columns"]:
+        sql_table.add_column(str(column))
+    for row in sql_result["rows"]:
+        sql_table.add_row(*(str(value) for value in row))
+
+    console.print(sql_table)
+    console.print(
+        f"[dim]{len(sql_result['rows'])} row(s){' (truncated)' if sql_result['truncated'] else ''}, "
+        f"query {sql_result['seconds']:.3f}s, round trip {sql_result['round_trip_seconds']:.3f}s[/dim]"
+    )
+
+
+def display_upload_reports(upload_reports: list[dict]):
+    """
+    Displays the per file upload throughput.
+
+    Args:
+        upload_reports (list[dict]): The reports returned by sandbox_upload.upload_files_concurrently.
+    """
+
+    upload_table = Table(show_header=True, header_style="bold magenta")
+    upload_table.add_column("File")
+    upload_table.add_column("Status")
+    upload_table.add_column("Size (MB)", justify="right")
+    upload_table.add_column("Sent (MB)", justify="right")
+    upload_table.add_column("Seconds", justify="right")
+    upload_table.add_column("MB/s", justify="right")
+
+    for report in upload_reports:
+        upload_table.add_row(
+            report["file_name_in_sandbox"],
+            report.get("status", "uploaded"),
+            f"{report['size_bytes'] / 1_000_000:.1f}",
+            f"{report['bytes_sent'] / 1_000_000:.1f}",
+            f"{report['seconds']:.2f}",
+            f"{report['throughput_mb_per_second']:.1f}",
+        )
+
+    console.print(upload_table)
+
+
+def display_usage_summary(usage_summary: dict):
     """
-    Displays the images on stdout or matplotlib figure viewer if possible.
+    Displays the model usage of a session, including how much of the prompt was served from the provider's
+    prompt cache.
 
     Args:
-        image_outputs (list): The base64 encoded images.
+        usage_summary (dict): The summary returned by HistoryManager.usage_summary.
+    """
+
+    if not usage_summary["requests"]:
+        return
+
+    usage_table = Table(show_header=True, header_style="bold magenta")
+    usage_table.add_column("Requests", justify="right")
+    usage_table.add_column("Prompt tokens", justify="right")
+    usage_table.add_column("Cached tokens", justify="right")
+    usage_table.add_column("Cache hit %", justify="right")
+    usage_table.add_column("Completion tokens", justify="right")
+
+    usage_table.add_row(
+        str(usage_summary["requests"]),
+        str(usage_summary["prompt_tokens"]),
+        str(usage_summary["cached_tokens"]),
+        f"{usage_summary['cache_hit_percent']:.1f}",
+        str(usage_summary["completion_tokens"]),
+    )
+
+    console.print(usage_table)
+
+
+def display_images_if_possible(
+    image_outputs: list[bytes], thumbnail_size: tuple[int, int] | None = (800, 800)
+):
     """
+    Displays the images on a single matplotlib figure if possible.
 
-    for i, b64image in enumerate(image_outputs):
-        image_data = base64.b64decode(b64image)
-        image = Image.open(io.BytesIO(image_data))
+    Args:
+        image_outputs (list[bytes]): The decoded images.
+        thumbnail_size (tuple[int, int] | None): Size the images are shrunk to fit for display, None for full size.
+    """
 
-        plt.figure()  # create a new figure for each image
-        plt.imshow(image)  # display the image
-        plt.axis("off")  # turn off axis
-        plt.show(block=False)  # continue running the program while the plot is open
+    try:
+        display_image_grid(image_outputs, thumbnail_size)
+    except Exception as e:  # e.g. no display available, the images are still saved.
+        console.print(f"[yellow]Could not display the images: {e}[/yellow]")
 
 
 class SandboxEDA:
@@ -191,6 +503,44 @@ class SandboxEDA:
         model_api_base_url: str,
         model_api_key: str,
         max_consecutive_function_calls_allowed: int = 30,
+        max_parallel_uploads: int = 4,
+        upload_compression: str | None = None,
+        upload_chunk_size_bytes: int = 64 * 1024 * 1024,
+        fingerprint_index_path: str = "./.eda_cache/fingerprints.json",
+        sync_folder: str = "sync_folder",
+        stream_responses: bool = True,
+        history_token_budget: int = 60_000,
+        artifact_store_path: str = "./.eda_cache/artifacts",
+        execution_log_path: str | None = None,
+        profile_datasets_on_upload: bool = True,
+        profile_cache_path: str = "./.eda_cache/profiles",
+        preload_datasets_on_upload: bool = True,
+        preload_resident_limit_bytes: int = 1024 * 1024 * 1024,
+        sql_max_rows: int = 1_000,
+        sql_memory_limit: str | None = None,
+        sql_timeout: float = 300,
+        max_parallel_jobs: int = 2,
+        job_timeout: float = 1800,
+        stream_execution_output: bool = True,
+        image_output_path: str = "./temp_image_output",
+        image_output_max_bytes: int = 200 * 1024 * 1024,
+        image_thumbnail_size: tuple[int, int] | None = (800, 800),
+        code_timeout: float = 600,
+        command_timeout: float = 600,
+        tracer: Tracer | None = None,
+        on_event: Callable[[dict], None] | None = None,
+        live_display: bool = True,
+        display_images: bool = True,
+        checkpoint_directory: str | None = "./.eda_cache/checkpoints",
+        checkpoint_interval_seconds: float = 300,
+        checkpoint_max_variable_bytes: int = 512 * 1024 * 1024,
+        pause_sandbox_on_exit: bool = False,
+        sandbox_timeout: int | None = None,
+        sandbox_factory: Callable[[], Sandbox] | None = None,
+        setup_code: str | None = None,
+        execution_cache_path: str | None = None,
+        execution_cache_max_bytes: int = 200 * 1024 * 1024,
+        response_cache: ResponseCache | None = None,
     ):
         self.sandbox = sandbox
         self.model_api_base_url = model_api_base_url
@@ -198,6 +548,158 @@ class SandboxEDA:
         self.max_consecutive_function_calls_allowed = (
             max_consecutive_function_calls_allowed
         )
+        self.max_parallel_uploads = max_parallel_uploads
+        self.upload_compression = upload_compression  # None, "gzip" or "zstd"
+        self.upload_chunk_size_bytes = upload_chunk_size_bytes
+        self.fingerprint_index = FingerprintIndex(fingerprint_index_path)
+        self.sync_folder = sync_folder
+
+        # Model responses go through response_cache, if set, to record or replay them (see response_cache.py).
+        # Cached responses aren't streamed.
+        self.response_cache = response_cache
+        self.stream_responses = stream_responses and not (
+            response_cache and response_cache.enabled
+        )
+
+        # Timed spans of the session (model calls, tool calls, uploads, ...), exported as a JSONL trace.
+        self.tracer = tracer or Tracer()
+
+        # Receives what happens during a turn as it happens (see emit), e.g. to stream it to a web client. Streamed
+        # responses are rendered live in the terminal unless live_display is False (rich allows a single live
+        # display per process, so hosts running several sessions at once turn it off).
+        self.on_event = on_event
+        self.live_display = live_display
+
+        # Older tool outputs are compacted when the conversation outgrows the token budget.
+        self.history_manager = HistoryManager(
+            token_budget=history_token_budget,
+            tool_schemas=AVAILABLE_FUNCTION_CALL_SCHEMAS,
+        )
+
+        # Oversized tool outputs are stored here and only previewed to the model.
+        self.artifact_store = ArtifactStore(artifact_store_path)
+
+        # When set, every code execution is appended to this JSONL file.
+        self.execution_log_path = execution_log_path
+
+        # Time to first token and total time of every streamed model response.
+        self.response_latencies: list[dict] = []
+
+        # Content hash of every dataset uploaded this session, keyed by its name in the sandbox.
+        self.dataset_hashes: dict[str, str] = {}
+
+        # The name every uploaded dataset goes by in the kernel and in SQL queries, keyed by its name in the sandbox.
+        self.dataframe_names: dict[str, str] = {}
+
+        # Profiles of the uploaded datasets (see dataset_profile.py), given to the model in the session context.
+        self.profile_datasets_on_upload = profile_datasets_on_upload
+        self.profile_store = DiskLRUStore(profile_cache_path, 20 * 1024 * 1024)
+        self.dataset_profiles: dict[str, dict] = {}
+
+        # Datasets loaded in the kernel under well-known names (see dataset_preload.py), keyed by their name in the
+        # sandbox. Datasets bigger than preload_resident_limit_bytes are memory mapped instead of kept in memory.
+        self.preload_datasets_on_upload = preload_datasets_on_upload
+        self.preload_resident_limit_bytes = preload_resident_limit_bytes
+        self.preloaded_datasets: dict[str, dict] = {}
+
+        # run_sql never returns more than sql_max_rows rows, whatever the agent asks for.
+        self.sql_max_rows = sql_max_rows
+        self.sql_memory_limit = (
+            sql_memory_limit  # e.g. "4GB", None for DuckDB's default
+        )
+        self.sql_timeout = sql_timeout
+
+        # Images from code executions are saved in the background to image_output_path, keeping at most
+        # image_output_max_bytes of the latest ones, and displayed shrunk to image_thumbnail_size unless
+        # display_images is False (headless hosts such as the server and batch runs, where pyplot has no display).
+        self.image_output_path = image_output_path
+        self.image_pipeline = ImagePipeline(
+            image_output_path, max_bytes=image_output_max_bytes
+        )
+        self.image_thumbnail_size = image_thumbnail_size
+        self.display_images = display_images
+
+        # Output of code and commands is shown live as it is produced, and runs longer than code_timeout /
+        # command_timeout seconds are interrupted.
+        self.stream_execution_output = stream_execution_output
+        self.code_timeout = code_timeout
+        self.command_timeout = command_timeout
+
+        # What is running right now, so it can be interrupted (on timeout or Ctrl-C): whether a cell is running
+        # in the kernel (the pid is looked up on the first cell), and the handles of running commands.
+        self.kernel_pid: int | None = None
+        self.cell_running = False
+        self.running_commands = set()
+        self.running_commands_lock = threading.Lock()
+
+        # Background jobs (submit_job), each in its own kernel so they don't block the main one.
+        self.job_manager = JobManager(
+            sandbox, max_parallel_jobs=max_parallel_jobs, default_timeout=job_timeout
+        )
+        # Tool message content of each finished job's result, keyed by job id, so polling it again doesn't save and
+        # emit its images again.
+        self.job_results: dict[str, list | str] = {}
+
+        # Local path of every uploaded dataset, keyed by its name in the sandbox, so a resumed session can upload
+        # them again.
+        self.dataset_paths: dict[str, str] = {}
+
+        # The session is checkpointed to {checkpoint_directory}/{session id} (None disables it): the conversation
+        # after every turn, the derived files and kernel variables at most every checkpoint_interval_seconds and
+        # at the end. Variables bigger than checkpoint_max_variable_bytes once pickled aren't kept. With
+        # pause_sandbox_on_exit the sandbox is paused at the end instead of killed, where the provider supports it.
+        self.checkpoint_path = (
+            Path(checkpoint_directory) / self.tracer.session_id
+            if checkpoint_directory
+            else None
+        )
+        self.checkpoint_interval_seconds = checkpoint_interval_seconds
+        self.checkpoint_max_variable_bytes = checkpoint_max_variable_bytes
+        self.pause_sandbox_on_exit = pause_sandbox_on_exit
+        self.last_sandbox_snapshot_at: float | None = None
+        self.kernel_snapshot: dict | None = None
+        self.sandbox_paused = False
+
+        # With a sandbox_timeout the sandbox's timeout is extended while the session is active (see SandboxLease),
+        # and with a sandbox_factory a sandbox that died anyway is replaced by a new one set up like it (see
+        # replace_sandbox). setup_code (e.g. imports) is run in the kernel of every sandbox the session uses.
+        self.lease = (
+            SandboxLease(sandbox, sandbox_timeout).start() if sandbox_timeout else None
+        )
+        self.sandbox_factory = sandbox_factory
+        self.setup_code = setup_code
+        self.max_parallel_jobs = max_parallel_jobs
+        self.job_timeout = job_timeout
+        self.sandbox_replacement_lock = threading.Lock()
+        self.sandbox_replacement_note: str | None = None
+
+        # One lock per resource tool calls share (see TOOL_CALL_RESOURCES), kept across turns: a call cancelled with
+        # its turn keeps its resource until its worker thread finishes, so the next turn's calls wait for it.
+        self.resource_locks = {
+            resource: asyncio.Lock() for resource in set(TOOL_CALL_RESOURCES.values())
+        }
+
+        # When set, the outputs of read-only cells (see execution_cache.py) are kept in execution_cache_path, at
+        # most execution_cache_max_bytes of the latest ones, and served from there when the same cell runs again
+        # after the same steps on the same datasets.
+        self.execution_cache = (
+            ExecutionCache(execution_cache_path, execution_cache_max_bytes)
+            if execution_cache_path
+            else None
+        )
+
+    def emit(self, event_type: str, **data):
+        """
+        Sends {"type": event_type, **data} to on_event, if set. Events are emitted from the event loop and from the
+        threads tool calls run in, so on_event must be thread safe.
+
+        Event types: tool_started {name, arguments, tool_call_id}, output {stream, text},
+        images {images: list[base64 PNG]}, tool_finished {name, tool_call_id, content | error},
+        assistant_delta {text}, assistant_message {content, final}.
+        """
+
+        if self.on_event:
+            self.on_event({"type": event_type, **data})
 
     def upload_files_to_sandbox(
         self, file_paths: list[str], file_names_in_sandbox: list[str]
@@ -209,151 +711,558 @@ class SandboxEDA:
             file_paths (list[str]): File paths of the files to upload (eg ["./Download/data.csv", "./Download/data2.csv"]).
             file_names_in_sandbox (list[str]): The names the files will take in the sandbox (eg ["data.csv", "data2.csv"]).
 
+        Returns:
+            list[dict]: Per file upload reports (status, size, bytes sent, seconds and throughput).
+
         Note:
             The files will be uploaded to the sandbox's /home/user directory (e.g ./home/user/data.csv, ./home/user/data2.csv).
+            Files are uploaded in parallel, large files in resumable chunks, optionally compressed on the wire.
+            Files whose content the sandbox already has (per its upload manifest) are skipped, and identical files
+            are uploaded once then copied inside the sandbox.
         """
 
+        with self.tracer.span("upload_files_to_sandbox", files=len(file_paths)) as span:
+            upload_reports = self._upload_files_to_sandbox(
+                file_paths, file_names_in_sandbox
+            )
+            span.set(
+                bytes=sum(report["size_bytes"] for report in upload_reports),
+                bytes_sent=sum(report["bytes_sent"] for report in upload_reports),
+            )
+
+        return upload_reports
+
+    def _upload_files_to_sandbox(
+        self, file_paths: list[str], file_names_in_sandbox: list[str]
+    ) -> list[dict]:
         console.print(
             f"[yellow]Uploading files(s) at {file_paths} to Sandbox[/yellow] (id: {self.sandbox.sandbox_id})"
         )
 
+        file_hashes = [self.fingerprint_index.sha256(path) for path in file_paths]
+        self.fingerprint_index.save()
+
+        sandbox_manifest = read_sandbox_manifest(self.sandbox)
+        uploads, copies, cached = plan_uploads(
+            file_paths, file_names_in_sandbox, file_hashes, sandbox_manifest
+        )
+
+        upload_reports = upload_files_concurrently(
+            self.sandbox,
+            [file_path for file_path, _ in uploads],
+            [file_name_in_sandbox for _, file_name_in_sandbox in uploads],
+            max_parallel_uploads=self.max_parallel_uploads,
+            compression=self.upload_compression,
+            chunk_size_bytes=self.upload_chunk_size_bytes,
+        )
+        for report in upload_reports:
+            report["status"] = "uploaded"
+
+        copy_within_sandbox(self.sandbox, copies)
+
+        # Cached and copied files cost no upload, report them alongside the uploaded ones.
+        copied_names = {destination for _, destination in copies}
         for file_path, file_name_in_sandbox in zip(file_paths, file_names_in_sandbox):
-            with open(file_path, "rb") as file:
-                self.sandbox.files.write(file_name_in_sandbox, file)
+            if file_name_in_sandbox in copied_names or file_name_in_sandbox in cached:
+                upload_reports.append(
+                    {
+                        "file_path": file_path,
+                        "file_name_in_sandbox": file_name_in_sandbox,
+                        "status": (
+                            "copied"
+                            if file_name_in_sandbox in copied_names
+                            else "cached"
+                        ),
+                        "size_bytes": os.path.getsize(file_path),
+                        "bytes_sent": 0,
+                        "seconds": 0.0,
+                        "throughput_mb_per_second": 0.0,
+                    }
+                )
+
+        # Recorded as the files are now, so a later change in the sandbox (even to the same size) is noticed.
+        file_stats = sandbox_file_stats(self.sandbox, file_names_in_sandbox)
+        for file_path, file_name_in_sandbox, file_hash in zip(
+            file_paths, file_names_in_sandbox, file_hashes
+        ):
+            if file_name_in_sandbox in file_stats:
+                sandbox_manifest[file_name_in_sandbox] = {
+                    "sha256": file_hash,
+                    **file_stats[file_name_in_sandbox],
+                }
+            else:
+                sandbox_manifest.pop(file_name_in_sandbox, None)
+            self.dataset_hashes[file_name_in_sandbox] = file_hash
+            self.dataset_paths[file_name_in_sandbox] = os.path.abspath(file_path)
+
+            # A re-uploaded dataset keeps its name, new ones get a name not used by any other dataset.
+            if file_name_in_sandbox not in self.dataframe_names:
+                self.dataframe_names[file_name_in_sandbox] = dataframe_name(
+                    file_name_in_sandbox, set(self.dataframe_names.values())
+                )
+        write_sandbox_manifest(self.sandbox, sandbox_manifest)
+
+        display_upload_reports(upload_reports)
 
         console.print(
             f"[bold cyan]Files(s) {file_paths} uploaded to Sandbox[/bold cyan] (id: {self.sandbox.sandbox_id})"
         )
 
-    def run_python_code(self, python_code: str) -> dict:
-        """
-        Runs the python code on the sandbox, and if there are any images save them locally.
-
-        Args:
-            python_code (str): The python code to run.
+        # Preloaded first, so the datasets are profiled from the kernel's copy instead of being parsed twice.
+        if self.preload_datasets_on_upload:
+            self.preload_uploaded_datasets(file_paths, file_names_in_sandbox)
 
-        Returns:
-            dict: Containing the base64 image outputs and other outputs (stdout, logs, error, etc).
-        """
-        execution = self.sandbox.run_code(python_code, language="python")
+        if self.profile_datasets_on_upload:
+            self.profile_uploaded_datasets(file_names_in_sandbox)
 
-        image_outputs = [result.png for result in execution.results if result.png]
+        return upload_reports
 
-        # Iterate through the base64 encoded images and save them to a file with name format: temp-{timestamp}.png to ./temp_image_output dir
-        for b64_image in image_outputs:
-            timestamp = int(time.time_ns())
-            image_filename = Path(f"./temp_image_output/temp-{timestamp}.png")
+    def profile_uploaded_datasets(self, file_names_in_sandbox: list[str]):
+        """
+        Profiles uploaded datasets once, so the agent starts with their shape, dtypes, null counts and basic
+        stats instead of spending its first tool calls rediscovering them. Profiles are cached locally by
+        content hash, so a dataset seen before (in any session) isn't profiled again.
 
-            # Will create the temp_image_output directory if it doesn't exist already.
-            image_filename.parent.mkdir(parents=True, exist_ok=True)
+        Args:
+            file_names_in_sandbox (list[str]): The names of the uploaded datasets in the sandbox.
+        """
 
-            with open(image_filename, "wb") as f:
-                f.write(base64.b64decode(b64_image))
+        started_at = time.perf_counter()
+        try:
+            with self.tracer.span("profile_datasets"):
+                profiles = profile_datasets(
+                    self.sandbox,
+                    {name: self.dataset_hashes[name] for name in file_names_in_sandbox},
+                    self.profile_store,
+                    {
+                        name: self.preloaded_datasets[name]["name"]
+                        for name in file_names_in_sandbox
+                        if self.preloaded_datasets.get(name, {}).get("status")
+                        in ("dataframe", "memory_mapped")
+                    },
+                )
+        except Exception as e:
+            # The agent can still explore the datasets itself.
+            console.print(f"[yellow]Could not profile the datasets: {e}[/yellow]")
+            return
 
-        return {
-            "image_outputs": image_outputs,
-            "other_outputs": {
-                "outputs": [result for result in execution.results if not result.png],
-                "logs": execution.logs,
-                "error": execution.error,
-            },
-        }
+        self.dataset_profiles.update(profiles)
+        console.print(
+            f"[dim]Profiled {len(profiles)} dataset(s) in {time.perf_counter() - started_at:.2f}s[/dim]"
+        )
 
-    def run_on_command_line(self, command: str) -> dict:
+    def preload_uploaded_datasets(
+        self, file_paths: list[str], file_names_in_sandbox: list[str]
+    ):
         """
-        Runs the command on the sandbox.
+        Loads uploaded datasets into the kernel once, under names the agent is told about, so its code doesn't
+        parse the same CSV again on every turn.
 
         Args:
-            command (str): The command to run.
-
-        Returns:
-            dict: Containing the output of the command and the execution error if any.
+            file_paths (list[str]): Local paths of the uploaded datasets.
+            file_names_in_sandbox (list[str]): Their names in the sandbox.
         """
 
+        started_at = time.perf_counter()
         try:
-            result = self.sandbox.commands.run(command)
-            return {
-                "output": {
-                    "stdout": result.stdout,
-                    "stderr": result.stderr,
-                    "exit_code": result.exit_code,
-                    "error": result.error,
-                },
-                "execution error": None,
-            }
-
+            with self.tracer.span("preload_datasets"):
+                preloaded = preload_datasets(
+                    self.sandbox,
+                    {name: self.dataset_hashes[name] for name in file_names_in_sandbox},
+                    {
+                        name: os.path.getsize(file_path)
+                        for file_path, name in zip(file_paths, file_names_in_sandbox)
+                    },
+                    {
+                        name: self.dataframe_names[name]
+                        for name in file_names_in_sandbox
+                    },
+                    self.preload_resident_limit_bytes,
+                )
         except Exception as e:
-            return {"output": None, "execution error": str(e)}
+            # The agent can still load the datasets itself.
+            console.print(f"[yellow]Could not preload the datasets: {e}[/yellow]")
+            return
 
-    def sync_with_user(self, sandbox_path, path_on_user_sync_folder):
+        self.preloaded_datasets.update(preloaded)
+        console.print(
+            f"[dim]Preloaded {', '.join(entry['name'] for entry in preloaded.values())} "
+            f"in {time.perf_counter() - started_at:.2f}s[/dim]"
+        )
+
+    def run_python_code(self, python_code: str) -> dict:
         """
-        Downloads a file or directory from the sandbox to the user's sync folder.
+        Runs the python code on the sandbox, and if there are any images save them locally.
 
         Args:
-            sandbox_path (str): The path of the file or directory to sync in the sandbox.
-            path_on_user_sync_folder (str): The relative destination path of the file or directory in the user's sync folder.
+            python_code (str): The python code to run.
 
         Returns:
-            str: "Sync Successful" if the file or directory was synced successfully, otherwise an error message.
+            dict: Containing the (decoded) image outputs and other outputs (results, stdout, stderr, error), the
+            other outputs compactly encoded with only their non empty fields.
+
+        Note:
+            Output is shown live while the code runs. If it runs for longer than code_timeout, the kernel is
+            interrupted (keeping its state) and a TimeoutError is returned with the output produced so far.
         """
 
+        cache_key = None
+        if self.execution_cache:
+            if uncacheable_reason(python_code) is None:
+                cache_key = self.execution_cache.key(python_code, self.dataset_hashes)
+                with self.tracer.span("execution_cache.get") as span:
+                    execution = self.execution_cache.get(cache_key)
+                    span.set(hit=execution is not None)
+
+                if execution is not None:
+                    console.print("[dim]Outputs served from the execution cache[/dim]")
+                    # Shown (and emitted) as if the cell had run.
+                    for stream in ("stdout", "stderr"):
+                        on_output = self._on_output([], stream=stream)
+                        for line in getattr(execution.logs, stream):
+                            on_output(line)
+                    return self.code_result(execution)
+            else:
+                self.execution_cache.advance(python_code)
+
+        if self.kernel_pid is None:
+            self.kernel_pid = self.find_kernel_pid()
+
+        logs = Logs(stdout=[], stderr=[])
+
+        self.cell_running = True
         try:
-            path_info = self.sandbox.files.get_info(sandbox_path)
-
-            if path_info.type == FileType.DIR:
-                # If its a directory loop through the contents and download them.
-                dir_contents = self.sandbox.files.list(sandbox_path)
-                for content in dir_contents:
-                    path_to_content_in_sync_folder = Path(
-                        path_on_user_sync_folder
-                    ).joinpath(content.name)
-                    self.sync_with_user(content.path, path_to_content_in_sync_folder)
+            execution = self.sandbox.run_code(
+                python_code,
+                language="python",
+                on_stdout=self._on_output(logs.stdout),
+                on_stderr=self._on_output(logs.stderr, stream="stderr"),
+                timeout=self.code_timeout,
+            )
 
-            elif path_info.type == FileType.FILE:
-                # Ensure the file is always inside ./sync_folder.
-                sandbox_path_obj = Path(path_on_user_sync_folder)
+        except TimeoutException:
+            if self.sandbox_is_dead():
+                raise  # Not a slow cell, handle_tool_call replaces the sandbox.
+
+            self.interrupt_kernel()
+            execution = Execution(
+                logs=logs,
+                error=ExecutionError(
+                    name="TimeoutError",
+                    value=f"Execution took longer than {self.code_timeout}s and was interrupted (the kernel's state is kept), "
+                    "run long tasks with submit_job instead",
+                    traceback="",
+                ),
+            )
 
-                # Make the path relative by stripping any root or drive component
-                relative_path = sandbox_path_obj.relative_to(
-                    sandbox_path_obj.anchor or "."
-                )
+        finally:
+            self.cell_running = False
 
-                # Final path inside sync_folder
-                file_path = Path("sync_folder") / relative_path
+        # Errors aren't cached, they may not happen again (e.g. out of memory).
+        if cache_key and not execution.error:
+            self.execution_cache.put(cache_key, execution)
 
-                # Will create any directory in the path that doesn't exist already.
-                file_path.parent.mkdir(parents=True, exist_ok=True)
+        return self.code_result(execution)
 
-                # Download the file to sync folder.
-                file_content = self.sandbox.files.read(sandbox_path, "bytes")
-                with open(file_path, "wb") as f:
-                    f.write(file_content)
+    def _on_output(self, lines: list[str], stream: str = "stdout"):
+        """
+        Callback for output streamed from the sandbox: collects it in lines, shows it live and emits it.
+        """
 
-            return "Sync Successful"
+        style = "red" if stream == "stderr" else "dim"
 
-        except Exception as e:
-            return str(e)
+        def on_output(output):
+            # Code output comes as OutputMessage, command output as str.
+            line = getattr(output, "line", output)
+            lines.append(line)
+            self.emit("output", stream=stream, text=line)
 
-    def delete_from_user_sync_folder(self, path_on_user_sync_folder):
-        """
-        Deletes a file or directory from the user sync folder.
+            if self.stream_execution_output:
+                console.print(Text(line, style=style), end="")
 
-        Args:
-            path_on_user_sync_folder (str): The path of the file or directory to delete in the user sync folder.
+        return on_output
 
-        Returns:
-            str: "Deletion Successful" if the file or directory was deleted successfully, otherwise an error message.
+    def find_kernel_pid(self) -> int:
+        """
+        The pid of the kernel run_python_code runs in, 0 if it couldn't be found (then it can't be interrupted).
         """
-        # Ensure the file is always inside ./sync_folder.
-        sandbox_path_obj = Path(path_on_user_sync_folder)
-
-        # Make the path relative by stripping any root or drive component
-        relative_path = sandbox_path_obj.relative_to(sandbox_path_obj.anchor or ".")
 
-        # Final path inside sync_folder
-        delete_path = Path("sync_folder") / relative_path
+        try:
+            execution = self.sandbox.run_code(
+                "import os\nprint(os.getpid())", language="python"
+            )
+            return int("".join(execution.logs.stdout))
+
+        except Exception:
+            return 0
+
+    def interrupt_kernel(self):
+        """
+        Interrupts the running cell (a KeyboardInterrupt in the kernel, as Jupyter's interrupt button does) without
+        losing the kernel's state.
+        """
+
+        if self.kernel_pid:
+            try:
+                self.sandbox.commands.run(f"kill -INT {self.kernel_pid}")
+            except (
+                Exception
+            ):  # The cell may have just finished (or the sandbox is gone).
+                pass
+
+    def interrupt_running_calls(self):
+        """
+        Stops the code and commands currently running in the sandbox, background jobs are left running.
+        """
+
+        if self.cell_running:
+            self.interrupt_kernel()
+
+        with self.running_commands_lock:
+            running_commands = list(self.running_commands)
+
+        for command in running_commands:
+            try:
+                command.kill()
+            except Exception:  # It may have just finished.
+                pass
+
+    def code_result(self, execution) -> dict:
+        """
+        Saves the images of an execution locally, logs it if execution_log_path is set, and encodes the rest.
+
+        Returns:
+            dict: {"image_outputs": list[decoded images], "other_outputs": dict} (see run_python_code).
+        """
+
+        # Decoded once, then saved in the background (as temp-{timestamp}.png in image_output_path) and displayed
+        # from the same bytes.
+        b64_images = [result.png for result in execution.results if result.png]
+        image_outputs = self.image_pipeline.decode(b64_images)
+        self.image_pipeline.save(image_outputs)
+        if b64_images:
+            self.emit("images", images=b64_images)
+
+        if self.execution_log_path:
+            # Recorded executions can be replayed to compare result encodings (see result_encoding.py).
+            with open(self.execution_log_path, "a", encoding="utf-8") as f:
+                f.write(execution.to_json() + "\n")
+
+        return {
+            "image_outputs": image_outputs,
+            "other_outputs": encode_execution(execution),
+        }
+
+    def run_sql(self, query: str, max_rows: int = 100) -> dict:
+        """
+        Runs a SQL query with DuckDB in the sandbox, over views of the uploaded datasets.
+
+        Args:
+            query (str): The SQL query.
+            max_rows (int): Maximum number of rows to return (capped at sql_max_rows).
+
+        Returns:
+            dict: {"columns", "rows", "truncated", "seconds", "round_trip_seconds"} or {"error", ...} (see
+            sandbox_sql.run_sql).
+        """
+
+        if self.execution_cache and not READ_ONLY_SQL_PATTERN.match(query):
+            self.execution_cache.advance(f"sql: {query}")  # e.g. COPY ... TO a file.
+
+        try:
+            return run_sql(
+                self.sandbox,
+                query,
+                self.sql_views(),
+                max_rows=max(1, min(max_rows, self.sql_max_rows)),
+                memory_limit=self.sql_memory_limit,
+                timeout=self.sql_timeout,
+            )
+
+        except Exception as e:
+            if self.sandbox_is_dead():
+                raise  # handle_tool_call replaces the sandbox.
+            return {"error": str(e)}
+
+    def sql_views(self) -> dict[str, str]:
+        return sql_views(self.dataframe_names)
+
+    def run_on_command_line(self, command: str) -> dict:
+        """
+        Runs the command on the sandbox.
+
+        Args:
+            command (str): The command to run.
+
+        Returns:
+            dict: Containing the output of the command and the execution error if any.
+
+        Note:
+            Output is shown live while the command runs, it is killed if it runs for longer than command_timeout.
+        """
+
+        if self.execution_cache:
+            self.execution_cache.advance(f"command: {command}")
+
+        try:
+            handle = self.sandbox.commands.run(
+                command, background=True, timeout=self.command_timeout
+            )
+
+            with self.running_commands_lock:
+                self.running_commands.add(handle)
+            try:
+                result = handle.wait(
+                    on_stdout=self._on_output([]),
+                    on_stderr=self._on_output([], stream="stderr"),
+                )
+            finally:
+                with self.running_commands_lock:
+                    self.running_commands.discard(handle)
+
+            return {
+                "output": {
+                    "stdout": result.stdout,
+                    "stderr": result.stderr,
+                    "exit_code": result.exit_code,
+                    "error": result.error,
+                },
+                "execution error": None,
+            }
+
+        except Exception as e:
+            if self.sandbox_is_dead():
+                raise  # handle_tool_call replaces the sandbox.
+            return {"output": None, "execution error": str(e)}
+
+    def sync_with_user(
+        self,
+        sandbox_path,
+        path_on_user_sync_folder,
+        delete_missing=False,
+        incremental=True,
+    ):
+        """
+        Downloads a file or directory from the sandbox to the user's sync folder.
+
+        Args:
+            sandbox_path (str): The path of the file or directory to sync in the sandbox.
+            path_on_user_sync_folder (str): The relative destination path of the file or directory in the user's sync folder.
+            delete_missing (bool): Delete files in the destination that no longer exist in the sandbox directory.
+            incremental (bool): Only transfer new or changed files (several at once as a single archive), falling
+                back to downloading everything entry by entry if that fails.
+
+        Returns:
+            str: "Sync Successful" if the file or directory was synced successfully, otherwise an error message.
+        """
 
         try:
+            # Ensure the file or directory is always inside the sync folder.
+            destination_path = resolve_sync_destination(
+                self.sync_folder, path_on_user_sync_folder
+            )
+
+            if incremental:
+                try:
+                    sync_report = sync_incrementally(
+                        self.sandbox,
+                        sandbox_path,
+                        destination_path,
+                        self.fingerprint_index,
+                        delete_missing=delete_missing,
+                    )
+                except Exception:
+                    # e.g. python3 or tar is not available in the sandbox, sync entry by entry instead.
+                    return self.sync_with_user(
+                        sandbox_path,
+                        path_on_user_sync_folder,
+                        delete_missing=delete_missing,
+                        incremental=False,
+                    )
+
+                console.print(
+                    f"[dim]Synced {sync_report['files_transferred']} new or changed file(s) "
+                    f"({sync_report['bytes_transferred'] / 1_000_000:.2f} MB), "
+                    f"skipped {sync_report['files_unchanged']} unchanged file(s) "
+                    f"({sync_report['bytes_saved'] / 1_000_000:.2f} MB saved), "
+                    f"deleted {sync_report['files_deleted']} file(s)[/dim]"
+                )
+                return "Sync Successful"
+
+            path_info = self.sandbox.files.get_info(sandbox_path)
+
+            if path_info.type == FileType.DIR:
+                # If its a directory loop through the contents and download them.
+                dir_contents = self.sandbox.files.list(sandbox_path)
+                for content in dir_contents:
+                    path_to_content_in_sync_folder = Path(
+                        path_on_user_sync_folder
+                    ).joinpath(content.name)
+                    sync_result = self.sync_with_user(
+                        content.path, path_to_content_in_sync_folder, incremental=False
+                    )
+                    if sync_result != "Sync Successful":
+                        return sync_result
+
+                if delete_missing:
+                    self._delete_files_missing_from_sandbox(
+                        sandbox_path, destination_path
+                    )
+
+            elif path_info.type == FileType.FILE:
+                # Will create any directory in the path that doesn't exist already.
+                destination_path.parent.mkdir(parents=True, exist_ok=True)
+
+                # Download the file to sync folder.
+                file_content = self.sandbox.files.read(sandbox_path, "bytes")
+                with open(destination_path, "wb") as f:
+                    f.write(file_content)
+
+            return "Sync Successful"
+
+        except Exception as e:
+            return str(e)
+
+    def _delete_files_missing_from_sandbox(self, sandbox_path: str, destination: Path):
+        """
+        Deletes the local files under destination that don't exist under the sandbox directory (sync_with_user's
+        delete_missing, when it syncs entry by entry).
+        """
+
+        sandbox_files, pending = set(), [(sandbox_path, PurePosixPath())]
+        while pending:
+            directory, relative_directory = pending.pop()
+            for entry in self.sandbox.files.list(directory):
+                relative_path = relative_directory / entry.name
+                if entry.type == FileType.DIR:
+                    pending.append((entry.path, relative_path))
+                else:
+                    sandbox_files.add(relative_path.as_posix())
+
+        for local_path in list(destination.rglob("*")):
+            if (
+                local_path.is_file()
+                and local_path.relative_to(destination).as_posix() not in sandbox_files
+            ):
+                local_path.unlink()
+
+    def delete_from_user_sync_folder(self, path_on_user_sync_folder):
+        """
+        Deletes a file or directory from the user sync folder.
+
+        Args:
+            path_on_user_sync_folder (str): The path of the file or directory to delete in the user sync folder.
+
+        Returns:
+            str: "Deletion Successful" if the file or directory was deleted successfully, otherwise an error message.
+        """
+
+        try:
+            # Ensure the file or directory is always inside the sync folder.
+            delete_path = resolve_sync_destination(
+                self.sync_folder, path_on_user_sync_folder
+            )
+
             if not delete_path.exists():
                 raise Exception(
                     f"File or Directory does not exist at {path_on_user_sync_folder} in sync folder."
@@ -373,10 +1282,1106 @@ class SandboxEDA:
     def list_files_in_sandbox_main_dir(self) -> list[str]:
         return [i.name for i in self.sandbox.files.list("/home/user")]
 
-    def eda_chat(
+    def code_result_message(
+        self, code_result: dict, name: str, tool_call_id: str
+    ) -> dict:
+        """
+        The tool message for the result of running python code (see code_result).
+        """
+
+        other_outputs = self.artifact_store.spill_if_large(
+            dumps_compact(code_result["other_outputs"]), name
+        )
+
+        return {
+            "tool_call_id": tool_call_id,
+            "role": "tool",
+            "name": name,
+            # If there are any image outputs (e.g data visualization), as it is not yet possible to return images
+            # from a tool call just inform the Agent that the image has been shown to the user.
+            "content": [
+                {
+                    "type": "text",
+                    "text": (
+                        f"THE IMAGES HAS ALREADY BEEN SHOW TO THE USER ON THE TERMINAL AND SAVED TO TEMP FILES eg temp-{{timestamp}}.png on the user's computer in {self.image_output_path} dir, THE OTHER OUTPUTS ARE BELOW\n{other_outputs}"
+                        if code_result["image_outputs"]
+                        else other_outputs
+                    ),
+                }
+            ],
+        }
+
+    def handle_tool_call(self, name: str, args: dict, tool_call_id: str) -> dict:
+        """
+        Runs a tool call requested by the agent and displays it to the user.
+
+        Args:
+            name (str): The name of the function to call.
+            args (dict): The parsed arguments of the call.
+            tool_call_id (str): The id of the tool call, echoed back in the tool message.
+
+        Returns:
+            dict: The tool message with the result, to append to the conversation.
+        """
+
+        self.emit("tool_started", name=name, arguments=args, tool_call_id=tool_call_id)
+        sandbox = self.sandbox
+
+        try:
+            with self.tracer.span(f"tool.{name}"):
+                tool_message = self._handle_tool_call(name, args, tool_call_id)
+
+        except Exception as e:
+            if sandbox is not self.sandbox or self.sandbox_is_dead():
+                # The sandbox died under the call, carry on in a new one.
+                tool_message = {
+                    "tool_call_id": tool_call_id,
+                    "role": "tool",
+                    "name": name,
+                    "content": f"{self.replace_sandbox(sandbox)} This call didn't complete, run it again if it's still needed.",
+                }
+                self.emit(
+                    "tool_finished",
+                    name=name,
+                    tool_call_id=tool_call_id,
+                    content=tool_message["content"],
+                )
+                return tool_message
+
+            self.emit(
+                "tool_finished",
+                name=name,
+                tool_call_id=tool_call_id,
+                error=f"{type(e).__name__}: {e}",
+            )
+            raise
+
+        self.emit(
+            "tool_finished",
+            name=name,
+            tool_call_id=tool_call_id,
+            content=tool_message["content"],
+        )
+        return tool_message
+
+    def _handle_tool_call(self, name: str, args: dict, tool_call_id: str) -> dict:
+
+        if name == "run_python_code":
+            console.print(
+                Panel(
+                    args["python_code"],
+                    title="Agent Executing Python Code",
+                    border_style="blue",
+                )
+            )
+
+            code_result = self.run_python_code(args["python_code"])
+            display_sandbox_code_output(
+                code_result,
+                show_logs=not self.stream_execution_output,
+                thumbnail_size=self.image_thumbnail_size,
+                display_images=self.display_images,
+            )
+
+            return self.code_result_message(code_result, name, tool_call_id)
+
+        elif name == "submit_job":
+            console.print(
+                Panel(
+                    args["python_code"],
+                    title=f"Agent Submitting Background Job: {args.get('description', '')}",
+                    border_style="blue",
+                )
+            )
+
+            if self.execution_cache:
+                # The job may write files later cells read.
+                self.execution_cache.advance(f"job: {args['python_code']}")
+
+            job = self.job_manager.submit(
+                args["python_code"],
+                description=args.get("description", ""),
+                timeout=args.get("timeout_seconds"),
+            )
+
+            return {
+                "tool_call_id": tool_call_id,
+                "role": "tool",  # Indicates this message is from tool use
+                "name": name,
+                "content": dumps_compact(job.summary()),
+            }
+
+        elif name in ("job_status", "cancel_job"):
+            try:
+                if name == "cancel_job":
+                    jobs = [self.job_manager.cancel(args["job_id"])]
+                elif args.get("job_id"):
+                    jobs = [self.job_manager.get(args["job_id"])]
+                else:
+                    jobs = list(self.job_manager.jobs.values())
+                content = dumps_compact([job.summary() for job in jobs])
+
+            except ValueError as e:
+                content = str(e)
+
+            console.print(
+                Panel(
+                    content,
+                    title=(
+                        "Cancelling Background Job"
+                        if name == "cancel_job"
+                        else "Background Jobs"
+                    ),
+                    border_style="white",
+                )
+            )
+
+            return {
+                "tool_call_id": tool_call_id,
+                "role": "tool",  # Indicates this message is from tool use
+                "name": name,
+                "content": content,
+            }
+
+        elif name == "job_result":
+            try:
+                job = self.job_manager.get(args["job_id"])
+            except ValueError as e:
+                job, content = None, str(e)
+
+            if job and job.job_id in self.job_results:
+                console.print(
+                    Panel(
+                        f"[bold yellow]Outputs of background job {job.job_id} ({job.status}) were already shown[/bold yellow]",
+                        title="Background Jobs",
+                        border_style="white",
+                    )
+                )
+
+                return {
+                    "tool_call_id": tool_call_id,
+                    "role": "tool",
+                    "name": name,
+                    "content": self.job_results[job.job_id],
+                }
+
+            if job and job.status in FINISHED_JOB_STATES and job.execution:
+                console.print(
+                    Panel(
+                        f"[bold yellow]Outputs of background job {job.job_id} ({job.status})[/bold yellow]",
+                        title="Background Jobs",
+                        border_style="white",
+                    )
+                )
+
+                code_result = self.code_result(job.execution)
+                display_sandbox_code_output(
+                    code_result,
+                    thumbnail_size=self.image_thumbnail_size,
+                    display_images=self.display_images,
+                )
+
+                message = self.code_result_message(code_result, name, tool_call_id)
+                self.job_results[job.job_id] = message["content"]
+
+                return message
+
+            if job:
+                content = dumps_compact(job.summary())
+
+            return {
+                "tool_call_id": tool_call_id,
+                "role": "tool",  # Indicates this message is from tool use
+                "name": name,
+                "content": content,
+            }
+
+        elif name == "run_on_command_line":
+            console.print(
+                Panel(
+                    args["command"],
+                    title="Agent Executing Command On Terminal",
+                    border_style="blue",
+                )
+            )
+
+            command_result = self.run_on_command_line(args["command"])
+            display_sandbox_command_output(
+                command_result, show_logs=not self.stream_execution_output
+            )
+
+            return {
+                "tool_call_id": tool_call_id,
+                "role": "tool",  # Indicates this message is from tool use
+                "name": name,
+                "content": self.artifact_store.spill_if_large(
+                    str(command_result), name
+                ),
+            }
+
+        elif name == "run_sql":
+            console.print(
+                Panel(
+                    args["query"],
+                    title="Agent Running SQL Query",
+                    border_style="blue",
+                )
+            )
+
+            sql_result = self.run_sql(args["query"], args.get("max_rows", 100))
+            display_sql_result(sql_result)
+
+            return {
+                "tool_call_id": tool_call_id,
+                "role": "tool",  # Indicates this message is from tool use
+                "name": name,
+                "content": self.artifact_store.spill_if_large(
+                    dumps_compact(sql_result), name
+                ),
+            }
+
+        elif name == "sync_with_user":
+            console.print(
+                Panel(
+                    f"[bold yellow]Agent Started Syncing {args['sandbox_path']} To User's Sync Folder ({args['path_on_user_sync_folder']})[/bold yellow]",
+                    title="File Syncing",
+                    border_style="white",
+                )
+            )
+
+            sync_result = self.sync_with_user(
+                args["sandbox_path"],
+                args["path_on_user_sync_folder"],
+                delete_missing=args.get("delete_missing", False),
+            )
+
+            if sync_result == "Sync Successful":
+                console.print(
+                    Panel(
+                        f"[bold green]Agent Successfully Synced File(s) To User's Sync Folder ({args['path_on_user_sync_folder']})[/bold green]",
+                        title="File Syncing",
+                        border_style="white",
+                    )
+                )
+            else:
+                console.print(
+                    Panel(
+                        f"[bold red]Agent Failed To Sync File(s) To User's Sync Folder: {sync_result}[/bold red]",
+                        title="File Syncing",
+                        border_style="white",
+                    )
+                )
+
+            return {
+                "tool_call_id": tool_call_id,
+                "role": "tool",  # Indicates this message is from tool use
+                "name": name,
+                "content": sync_result,
+            }
+
+        elif name == "delete_from_user_sync_folder":
+            console.print(
+                Panel(
+                    f"[bold yellow]Agent Deleting File(s) From User's Sync Folder ({args['path_on_user_sync_folder']})[/bold yellow]",
+                    title="File Syncing",
+                    border_style="white",
+                )
+            )
+
+            delete_result = self.delete_from_user_sync_folder(
+                args["path_on_user_sync_folder"]
+            )
+
+            if delete_result == "Deletion Successful":
+                console.print(
+                    Panel(
+                        f"[bold green]Agent Successfully Deleted File(s) From User's Sync Folder ({args['path_on_user_sync_folder']})[/bold green]",
+                        title="File Syncing",
+                        border_style="white",
+                    )
+                )
+            else:
+                console.print(
+                    Panel(
+                        f"[bold red]Agent Failed To Delete File(s) From User's Sync Folder: {delete_result}[/bold red]",
+                        title="File Syncing",
+                        border_style="white",
+                    )
+                )
+
+            return {
+                "tool_call_id": tool_call_id,
+                "role": "tool",  # Indicates this message is from tool use
+                "name": name,
+                "content": delete_result,
+            }
+
+        elif name == "read_artifact":
+            console.print(
+                Panel(
+                    f"[bold yellow]Agent Reading Artifact {args['artifact_id']}[/bold yellow]",
+                    title="Artifact",
+                    border_style="white",
+                )
+            )
+
+            return {
+                "tool_call_id": tool_call_id,
+                "role": "tool",  # Indicates this message is from tool use
+                "name": name,
+                "content": self.artifact_store.read(
+                    args["artifact_id"],
+                    start_line=args.get("start_line"),
+                    end_line=args.get("end_line"),
+                    start_byte=args.get("start_byte"),
+                    end_byte=args.get("end_byte"),
+                ),
+            }
+
+        else:
+            raise ValueError(f"Unknown Function Call: {name}")
+
+    async def handle_tool_call_async(
+        self,
+        name: str,
+        args: dict,
+        tool_call_id: str,
+    ) -> dict:
+        """
+        Runs a tool call off the event loop. Tool calls that share a resource (see TOOL_CALL_RESOURCES) wait for
+        each other, in the order they were requested, everything else runs concurrently.
+        """
+
+        # Set in this task's own context, which the worker thread gets a copy of (sharing the list).
+        deferred_image_displays = []
+        _deferred_image_displays.set(deferred_image_displays)
+
+        resource = TOOL_CALL_RESOURCES.get(name)
+        if resource is None:
+            tool_message = await asyncio.to_thread(
+                self.handle_tool_call, name, args, tool_call_id
+            )
+        else:
+            resource_lock = self.resource_locks[resource]
+            await resource_lock.acquire()
+            worker = asyncio.ensure_future(
+                asyncio.to_thread(self.handle_tool_call, name, args, tool_call_id)
+            )
+
+            # Released when the thread is done rather than when this task is: cancelling the task doesn't stop the
+            # thread, and the next call using the resource must wait for it.
+            def release(worker: asyncio.Future):
+                resource_lock.release()
+                if not worker.cancelled():
+                    worker.exception()  # Retrieved, a cancelled call's failure is already reported by handle_tool_call.
+
+            worker.add_done_callback(release)
+            tool_message = await asyncio.shield(worker)
+
+        for image_outputs, thumbnail_size in deferred_image_displays:
+            display_images_if_possible(image_outputs, thumbnail_size)
+
+        return tool_message
+
+    def initial_messages(self, downloaded_dataset_names: list[str]) -> list:
+        """
+        The messages every EDA conversation starts with: the static system prompt, which is identical for every
+        session so it can be served from the provider's prompt cache, followed by this session's context.
+        """
+
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {
+                "role": "system",
+                "content": SESSION_CONTEXT_PROMPT.format(
+                    downloaded_dataset_names=str(downloaded_dataset_names),
+                    list_sandbox_files=str(self.list_files_in_sandbox_main_dir()),
+                    dataset_profiles="\n\n".join(
+                        format_profile(name, profile)
+                        for name, profile in self.dataset_profiles.items()
+                    )
+                    or "None",
+                    preloaded_datasets=format_preloaded(self.preloaded_datasets)
+                    or "None",
+                    sql_views=", ".join(
+                        f"{view} ({path})" for view, path in self.sql_views().items()
+                    )
+                    or "None",
+                    max_consecutive_function_calls_allowed=self.max_consecutive_function_calls_allowed,
+                )
+                + (EXECUTION_CACHE_PROMPT if self.execution_cache else ""),
+            },
+        ]
+
+    def checkpoint(
+        self,
+        messages: list,
+        model_for_eda: str,
+        snapshot_sandbox: bool = True,
+        pause: bool = False,
+    ):
+        """
+        Saves the session so it can be resumed (see restore_checkpoint): the conversation and the datasets, and
+        with snapshot_sandbox the files made in the sandbox (only new or changed ones are transferred) and the
+        kernel's variables. With pause the sandbox is then paused, if the provider supports it.
+        """
+
+        if self.checkpoint_path is None:
+            return
+
+        with self.tracer.span("checkpoint", snapshot_sandbox=snapshot_sandbox) as span:
+            if snapshot_sandbox:
+                dataset_names = set(self.dataset_paths)
+                files_report = sync_incrementally(
+                    self.sandbox,
+                    SANDBOX_HOME_DIR,
+                    self.checkpoint_path / FILES_DIRECTORY_NAME,
+                    self.fingerprint_index,
+                    delete_missing=True,
+                    exclude=lambda path: not is_derived_file(path, dataset_names),
+                    # Not even hashed: the datasets, the staging area, the columnar copies and caches.
+                    skip_paths=sorted(dataset_names),
+                    skip_hidden=True,
+                )
+
+                # Memory mapped datasets would be read whole to be pickled, they're mapped again on resume, and so
+                # are preloaded DataFrames the session didn't change.
+                self.kernel_snapshot = snapshot_kernel(
+                    self.sandbox,
+                    self.checkpoint_path / KERNEL_STATE_FILE_NAME,
+                    [
+                        entry["name"]
+                        for entry in self.preloaded_datasets.values()
+                        if entry["status"] == "memory_mapped"
+                    ],
+                    self.checkpoint_max_variable_bytes,
+                    [
+                        entry["name"]
+                        for entry in self.preloaded_datasets.values()
+                        if entry["status"] == "dataframe"
+                    ],
+                    timeout=self.code_timeout,
+                )
+                self.kernel_snapshot["taken_at"] = time.time()
+                self.last_sandbox_snapshot_at = time.monotonic()
+
+                span.set(
+                    files_transferred=files_report["files_transferred"],
+                    bytes_transferred=files_report["bytes_transferred"],
+                    kernel_state_bytes=self.kernel_snapshot["bytes"],
+                )
+
+            if pause:
+                self.sandbox_paused = pause_sandbox(self.sandbox)
+
+            write_checkpoint(
+                self.checkpoint_path,
+                {
+                    "session_id": self.checkpoint_path.name,
+                    "sandbox_id": self.sandbox.sandbox_id,
+                    "sandbox_paused": self.sandbox_paused,
+                    "model_for_eda": model_for_eda,
+                    "dataset_paths": self.dataset_paths,
+                    "dataset_hashes": self.dataset_hashes,
+                    "dataframe_names": self.dataframe_names,
+                    "dataset_profiles": self.dataset_profiles,
+                    "preloaded_datasets": self.preloaded_datasets,
+                    "kernel_snapshot": self.kernel_snapshot,
+                    "messages": messages,
+                },
+            )
+
+    def checkpoint_after_turn(
+        self, messages: list, model_for_eda: str, final: bool = False
+    ):
+        """
+        Checkpoints the conversation, and the sandbox too if it wasn't snapshotted in the last
+        checkpoint_interval_seconds (or this is the final checkpoint, which also pauses the sandbox if
+        pause_sandbox_on_exit). A checkpoint that fails is reported, the session goes on without it.
+        """
+
+        snapshot_sandbox = (
+            final
+            or self.last_sandbox_snapshot_at is None
+            or time.monotonic() - self.last_sandbox_snapshot_at
+            >= self.checkpoint_interval_seconds
+        )
+
+        try:
+            self.checkpoint(
+                messages,
+                model_for_eda,
+                snapshot_sandbox=snapshot_sandbox,
+                pause=final and self.pause_sandbox_on_exit,
+            )
+        except Exception as e:
+            console.print(f"[yellow]Could not checkpoint the session: {e}[/yellow]")
+
+    def run_setup_code(self):
+        """
+        Runs setup_code, if any, in the sandbox's kernel.
+        """
+
+        if not self.setup_code:
+            return
+
+        execution = self.sandbox.run_code(
+            self.setup_code, language="python", timeout=self.code_timeout
+        )
+        if execution.error:
+            raise RuntimeError(
+                f"Setup code failed: {execution.error.name}: {execution.error.value}"
+            )
+
+    def sandbox_is_dead(self) -> bool:
+        """
+        After a sandbox call failed: whether it's because the sandbox is no longer running, and can be replaced.
+        Always False without a lease and a sandbox_factory, the failure is then handled like any other.
+        """
+
+        return (
+            self.lease is not None
+            and self.sandbox_factory is not None
+            and not self.lease.check()
+        )
+
+    def replace_sandbox(self, dead_sandbox: Sandbox) -> str:
+        """
+        Replaces a sandbox that died with a new one from sandbox_factory, set up like the session's (see
+        restore_sandbox_state). Tool calls that saw the same sandbox die get it replaced once.
+
+        Returns:
+            str: What happened and what was restored, to tell the model.
+        """
+
+        with self.sandbox_replacement_lock:
+            if self.sandbox is not dead_sandbox:
+                return self.sandbox_replacement_note  # Already replaced.
+
+            console.print(
+                f"[bold yellow]Sandbox (id: {dead_sandbox.sandbox_id}) is no longer running, replacing it[/bold yellow]"
+            )
+
+            with self.tracer.span("sandbox_replacement"):
+                self.sandbox = self.sandbox_factory()
+                if self.lease:
+                    self.lease.replace(self.sandbox)
+
+                # Jobs and the kernel died with the sandbox.
+                self.job_manager.shutdown()
+                self.job_manager = JobManager(
+                    self.sandbox,
+                    max_parallel_jobs=self.max_parallel_jobs,
+                    default_timeout=self.job_timeout,
+                )
+                self.job_results.clear()
+                self.kernel_pid = None
+                self.preloaded_datasets.clear()
+
+                try:
+                    dead_sandbox.kill()
+                except Exception:  # Most likely gone already.
+                    pass
+
+                self.sandbox_replacement_note = (
+                    f"The sandbox stopped running and was replaced by a new one (id: {self.sandbox.sandbox_id}). "
+                    + self.restore_sandbox_state()
+                )
+
+            console.print(f"[bold cyan]{self.sandbox_replacement_note}[/bold cyan]")
+            return self.sandbox_replacement_note
+
+    def ensure_sandbox_alive(self, messages: list):
+        """
+        Replaces the sandbox if it died since it was last used (e.g. it expired while the session sat idle),
+        telling the model in messages.
+        """
+
+        if self.lease and self.sandbox_factory and not self.lease.is_alive():
+            messages.append(
+                {"role": "system", "content": self.replace_sandbox(self.sandbox)}
+            )
+
+    def restore_sandbox_state(self, restore_session_files: bool = True) -> str:
+        """
+        Sets up the sandbox like the session's (e.g. a new one): the datasets are uploaded again from their local
+        paths (skipped if the sandbox still has them) and preloaded, setup_code is run, then the files made during
+        the session (if restore_session_files) and the kernel's variables are restored from the last checkpoint.
+
+        Returns:
+            str: What was restored, to tell the model.
+
+        Raises:
+            FileNotFoundError: If a dataset is no longer at its local path.
+        """
+
+        missing_paths = [
+            path for path in self.dataset_paths.values() if not os.path.isfile(path)
+        ]
+        if missing_paths:
+            raise FileNotFoundError(
+                f"Dataset(s) {missing_paths} are needed to restore the session but no longer exist"
+            )
+
+        if self.execution_cache:
+            self.execution_cache.reset()
+
+        with self.tracer.span("restore_sandbox_state") as span:
+            self.upload_files_to_sandbox(
+                list(self.dataset_paths.values()), list(self.dataset_paths)
+            )
+            self.run_setup_code()
+
+            files_restored = (
+                restore_files(self.sandbox, self.checkpoint_path / FILES_DIRECTORY_NAME)
+                if restore_session_files and self.checkpoint_path
+                else 0
+            )
+
+            kernel_report = {"restored": [], "failed": {}}
+            if (
+                self.kernel_snapshot
+                and self.checkpoint_path
+                and (self.checkpoint_path / KERNEL_STATE_FILE_NAME).is_file()
+            ):
+                kernel_report = restore_kernel(
+                    self.sandbox,
+                    self.checkpoint_path / KERNEL_STATE_FILE_NAME,
+                    timeout=self.code_timeout,
+                )
+
+            span.set(
+                files_restored=files_restored,
+                variables_restored=len(kernel_report["restored"]),
+            )
+
+        # A new sandbox nothing was restored in holds only the datasets and what setup_code made, like at the start
+        # of a session, so the cells cached then are valid again.
+        if (
+            self.execution_cache
+            and restore_session_files
+            and not files_restored
+            and not kernel_report["restored"]
+        ):
+            self.execution_cache.reset(fresh_kernel=True)
+
+        not_restored = {
+            **(self.kernel_snapshot or {}).get("skipped", {}),
+            **kernel_report["failed"],
+        }
+        snapshot_time = (
+            time.strftime("%H:%M:%S", time.localtime(self.kernel_snapshot["taken_at"]))
+            if self.kernel_snapshot
+            else None
+        )
+        return (
+            f"The datasets are uploaded and preloaded again, {files_restored} file(s) made during the session "
+            f"were restored, and these kernel variables were restored as they were at {snapshot_time}: "
+            f"{', '.join(kernel_report['restored']) or 'None'}. "
+            f"Not restored: {json.dumps(not_restored) if not_restored else 'None'}. Anything made after "
+            "that snapshot, and background jobs, are gone and have to be redone if needed."
+        )
+
+    def restore_checkpoint(self, checkpoint_path: Path, checkpoint: dict) -> list:
+        """
+        Restores a checkpointed session in this SandboxEDA's sandbox, further checkpoints go to the same place.
+
+        If the sandbox is the checkpointed one (resumed after a pause, or still running after a crash) and its
+        kernel still has the session's variables, there is nothing to restore. Otherwise the datasets are uploaded
+        (skipped if the sandbox still has them) and preloaded again, then the files made during the session and
+        the kernel's variables are restored from the last snapshot. The model is told what was restored.
+
+        Returns:
+            list: The conversation, to carry on with.
+
+        Raises:
+            FileNotFoundError: If a dataset is no longer at its local path and the sandbox has to be restored.
+        """
+
+        self.checkpoint_path = checkpoint_path
+        self.kernel_snapshot = checkpoint["kernel_snapshot"]
+        self.dataset_paths.update(checkpoint["dataset_paths"])
+        self.dataset_hashes.update(checkpoint["dataset_hashes"])
+        self.dataframe_names.update(checkpoint["dataframe_names"])
+        self.dataset_profiles.update(checkpoint["dataset_profiles"])
+
+        same_sandbox = self.sandbox.sandbox_id == checkpoint["sandbox_id"]
+        kernel_names = [
+            entry["name"]
+            for entry in checkpoint["preloaded_datasets"].values()
+            if not entry["status"].startswith("error")
+        ] + (self.kernel_snapshot or {}).get("saved", [])
+
+        with self.tracer.span("restore_checkpoint", same_sandbox=same_sandbox):
+            if same_sandbox and not missing_kernel_variables(
+                self.sandbox, kernel_names
+            ):
+                self.preloaded_datasets.update(checkpoint["preloaded_datasets"])
+                if self.execution_cache:
+                    self.execution_cache.reset()
+                resume_note = "The session was resumed in the same sandbox, its files and the kernel's variables are as they were."
+
+            else:
+                resume_note = (
+                    f"The session was resumed in {'the same sandbox after its kernel restarted' if same_sandbox else 'a new sandbox'}. "
+                    + self.restore_sandbox_state(restore_session_files=not same_sandbox)
+                )
+
+        console.print(f"[bold cyan]{resume_note}[/bold cyan]")
+
+        messages = checkpoint["messages"]
+        # The session context describes the sandbox as it is now.
+        messages[1] = self.initial_messages(list(self.dataset_paths))[1]
+        messages.append({"role": "system", "content": resume_note})
+        return messages
+
+    def _start_tool_call(
+        self,
+        tool_call: dict,
+        turn_context: contextvars.Context,
+    ) -> asyncio.Task:
+        name, tool_call_id = tool_call["function"]["name"], tool_call["id"]
+
+        try:
+            # A call without parameters may come without any arguments.
+            args = json.loads(tool_call["function"]["arguments"] or "{}")
+            if not isinstance(args, dict):
+                raise ValueError(f"expected a JSON object, got {type(args).__name__}")
+
+        except ValueError as e:  # Including json.JSONDecodeError.
+            error = f"Invalid tool call arguments: {e}"
+            console.print(f"[bold red]{name}: {error}[/bold red]")
+            self.emit(
+                "tool_finished", name=name, tool_call_id=tool_call_id, error=error
+            )
+
+            # Answered like any failed tool call, so the model can correct it.
+            async def invalid_arguments() -> dict:
+                return {
+                    "tool_call_id": tool_call_id,
+                    "role": "tool",
+                    "name": name,
+                    "content": error,
+                }
+
+            return asyncio.create_task(invalid_arguments())
+
+        # Run in the turn's context (rather than the model call's) so the tool call's span nests under the turn.
+        return asyncio.create_task(
+            self.handle_tool_call_async(name, args, tool_call_id),
+            context=turn_context.copy(),
+        )
+
+    async def _stream_model_response(
+        self,
+        client: AsyncOpenAI,
+        messages: list,
+        model_for_eda: str,
+        turn_context: contextvars.Context,
+    ) -> tuple[str | None, list[dict], list[asyncio.Task]]:
+        """
+        Streams a model response, rendering its text as it arrives and starting each tool call as soon as its
+        arguments are complete (while the rest of the response is still streaming).
+
+        Returns:
+            Tuple of (response text, tool calls as message dicts, the started tool call tasks in call order).
+        """
+
+        started_at = time.perf_counter()
+        first_token_at = None
+
+        content = ""
+        tool_calls: dict[int, dict] = {}
+        tool_call_tasks: dict[int, asyncio.Task] = {}
+
+        stream = await client.chat.completions.create(
+            model=model_for_eda,
+            messages=messages,
+            tools=AVAILABLE_FUNCTION_CALL_SCHEMAS,
+            frequency_penalty=0,  # This penalty can slightly affect tool use; keep at 0.
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        usage = None
+
+        with (
+            Live(console=console, refresh_per_second=12)
+            if self.live_display
+            else contextlib.nullcontext()
+        ) as live:
+            async for chunk in stream:
+                # Usage comes in a final chunk without choices.
+                usage = chunk.usage or usage
+                if not chunk.choices:
+                    continue
+
+                delta = chunk.choices[0].delta
+                if first_token_at is None and (delta.content or delta.tool_calls):
+                    first_token_at = time.perf_counter()
+
+                if delta.content:
+                    content += delta.content
+                    self.emit("assistant_delta", text=delta.content)
+                    if live:
+                        live.update(
+                            Text(">>> Assistant Response: ", style="bold green")
+                            + Text(content, style="green")
+                        )
+
+                for tool_call_delta in delta.tool_calls or []:
+                    tool_call = tool_calls.setdefault(
+                        tool_call_delta.index,
+                        {
+                            "id": "",
+                            "type": "function",
+                            "function": {"name": "", "arguments": ""},
+                        },
+                    )
+                    tool_call["id"] += tool_call_delta.id or ""
+                    if tool_call_delta.function:
+                        tool_call["function"]["name"] += (
+                            tool_call_delta.function.name or ""
+                        )
+                        tool_call["function"]["arguments"] += (
+                            tool_call_delta.function.arguments or ""
+                        )
+
+                    # Arguments are a JSON object, so they are complete once they parse.
+                    if tool_call_delta.index not in tool_call_tasks and tool_call[
+                        "function"
+                    ]["arguments"].endswith("}"):
+                        try:
+                            json.loads(tool_call["function"]["arguments"])
+                        except json.JSONDecodeError:
+                            continue
+
+                        tool_call_tasks[tool_call_delta.index] = self._start_tool_call(
+                            tool_call, turn_context
+                        )
+
+        # Start whatever didn't parse early (e.g. arguments with trailing whitespace).
+        for index, tool_call in tool_calls.items():
+            if index not in tool_call_tasks:
+                tool_call_tasks[index] = self._start_tool_call(tool_call, turn_context)
+
+        finished_at = time.perf_counter()
+        latency = {
+            "time_to_first_token_seconds": (first_token_at or finished_at) - started_at,
+            "total_seconds": finished_at - started_at,
+        }
+        self.response_latencies.append(latency)
+        self.history_manager.record_usage(messages, usage)
+        console.print(
+            f"[dim]Time to first token {latency['time_to_first_token_seconds']:.2f}s, "
+            f"full response {latency['total_seconds']:.2f}s"
+            + (
+                f", prompt tokens {usage.prompt_tokens} ({cached_prompt_tokens(usage)} cached)"
+                if usage
+                else ""
+            )
+            + "[/dim]"
+        )
+
+        return (
+            content or None,
+            [tool_calls[index] for index in sorted(tool_calls)],
+            [tool_call_tasks[index] for index in sorted(tool_calls)],
+        )
+
+    async def run_agent_turn(
+        self, client: AsyncOpenAI, messages: list, model_for_eda: str
+    ) -> str:
+        """
+        Lets the agent respond to the latest user message, running the tool calls it makes along the way.
+        Independent tool calls from the same model response run concurrently, their results are appended to
+        messages in the order the calls were made.
+
+        Args:
+            client (AsyncOpenAI): The model API client.
+            messages (list): The conversation so far, updated in place.
+            model_for_eda (str): The underlying model to use.
+
+        Returns:
+            str: The agent's final response.
+
+        Note:
+            If the turn is cancelled (e.g. Ctrl-C in async_eda_chat), the running code and commands are
+            interrupted and every tool call already requested gets a "cancelled" result, so the conversation can
+            go on.
+        """
+
+        try:
+            with (
+                self.tracer.span("agent_turn", model=model_for_eda),
+                self.lease.in_use() if self.lease else contextlib.nullcontext(),
+            ):
+                await asyncio.to_thread(self.ensure_sandbox_alive, messages)
+                return await self._run_agent_turn(client, messages, model_for_eda)
+
+        except asyncio.CancelledError:
+            # Tool calls run in threads that outlive their cancelled tasks, stop what they are running.
+            await asyncio.to_thread(self.interrupt_running_calls)
+            raise
+
+    async def _run_agent_turn(
+        self, client: AsyncOpenAI, messages: list, model_for_eda: str
+    ) -> str:
+        # Handle potential consecutive tool calls with a safety limit to avoid infinite loops
+        for i in range(self.max_consecutive_function_calls_allowed + 1):
+
+            if i == self.max_consecutive_function_calls_allowed:
+                raise Exception(
+                    f"Consecutive tool calls from the Agent must not exceed {self.max_consecutive_function_calls_allowed}."
+                )
+
+            tokens_saved = self.history_manager.compact(messages)
+            if tokens_saved:
+                console.print(
+                    f"[dim]Compacted older tool outputs, saving ~{tokens_saved} prompt tokens[/dim]"
+                )
+
+            requests_before = len(self.history_manager.usage_per_request)
+            turn_context = contextvars.copy_context()
+            with self.tracer.span(
+                "model_call", model=model_for_eda, stream=self.stream_responses
+            ) as span:
+                if self.stream_responses:
+                    content, tool_calls, tool_call_tasks = (
+                        await self._stream_model_response(
+                            client,
+                            messages,
+                            model_for_eda,
+                            turn_context,
+                        )
+                    )
+
+                else:
+                    request = dict(
+                        model=model_for_eda,
+                        messages=messages,
+                        tools=AVAILABLE_FUNCTION_CALL_SCHEMAS,
+                        frequency_penalty=0,  # This penalty can slightly affect tool use; keep at 0.
+                    )
+                    if self.response_cache:
+                        hits_before = self.response_cache.hits
+                        response = await self.response_cache.create_chat_completion(
+                            client, **request
+                        )
+                        span.set(
+                            response_cache_hit=self.response_cache.hits > hits_before
+                        )
+                    else:
+                        response = await client.chat.completions.create(**request)
+
+                    self.history_manager.record_usage(messages, response.usage)
+                    if response.usage:
+                        console.print(
+                            f"[dim]Prompt tokens {response.usage.prompt_tokens} "
+                            f"({cached_prompt_tokens(response.usage)} cached)[/dim]"
+                        )
+
+                    response_message = response.choices[0].message
+                    content = response_message.content
+                    tool_calls = [
+                        tool_call.model_dump()
+                        for tool_call in response_message.tool_calls or []
+                    ]
+                    tool_call_tasks = [
+                        self._start_tool_call(tool_call, turn_context)
+                        for tool_call in tool_calls
+                    ]
+
+                # Token counts, if the API reported them.
+                if len(self.history_manager.usage_per_request) > requests_before:
+                    span.set(**self.history_manager.usage_per_request[-1])
+                span.set(tool_calls=len(tool_calls))
+
+            if content:
+                self.emit("assistant_message", content=content, final=not tool_calls)
+
+            if not tool_calls:
+                # No tool calls, add the assistant response to the messages and hand it back.
+                messages.append({"role": "assistant", "content": content})
+
+                if not self.stream_responses or not self.live_display:
+                    console.print(f"[bold green]>>> Assistant Response: {content} [/]")
+
+                return content
+
+            # Add assistant message that triggered tool calls
+            messages.append(
+                {"role": "assistant", "content": content, "tool_calls": tool_calls}
+            )
+
+            try:
+                results = await asyncio.gather(*tool_call_tasks, return_exceptions=True)
+
+            except asyncio.CancelledError:
+                # Every tool call needs a result for the conversation to stay valid.
+                messages.extend(
+                    (
+                        task.result()
+                        if task.done() and not task.cancelled() and not task.exception()
+                        else {
+                            "tool_call_id": tool_call["id"],
+                            "role": "tool",
+                            "name": tool_call["function"]["name"],
+                            "content": "Cancelled by the user before it finished.",
+                        }
+                    )
+                    for tool_call, task in zip(tool_calls, tool_call_tasks)
+                )
+                raise
+
+            # A failed tool call gets an error message as its result, so the other calls' results are kept and every
+            # tool call still has one.
+            for tool_call, result in zip(tool_calls, results):
+                if isinstance(result, BaseException):
+                    error = f"{type(result).__name__}: {result}"
+                    console.print(f"[bold red]Tool call failed: {error}[/bold red]")
+                    result = {
+                        "tool_call_id": tool_call["id"],
+                        "role": "tool",
+                        "name": tool_call["function"]["name"],
+                        "content": f"The tool call failed: {error}",
+                    }
+                messages.append(result)
+
+    async def run_cancellable_agent_turn(
+        self, client: AsyncOpenAI, messages: list, model_for_eda: str
+    ):
+        """
+        Runs an agent turn that Ctrl-C cancels (interrupting the running code or command) without ending the
+        session. Outside of the turn Ctrl-C behaves as usual.
+        """
+
+        loop = asyncio.get_running_loop()
+        turn = asyncio.create_task(self.run_agent_turn(client, messages, model_for_eda))
+
+        try:
+            loop.add_signal_handler(signal.SIGINT, turn.cancel)
+        except (NotImplementedError, RuntimeError):  # Windows, or not the main thread.
+            return await turn
+
+        try:
+            await turn
+
+        except asyncio.CancelledError:
+            if (
+                asyncio.current_task().cancelling()
+            ):  # This task was cancelled, not the turn.
+                raise
+
+            console.print("[bold yellow]Cancelled, the session goes on.[/bold yellow]")
+
+        finally:
+            loop.remove_signal_handler(signal.SIGINT)
+
+    async def async_eda_chat(
         self,
         downloaded_dataset_names: list[str],
         model_for_eda: str,
+        messages: list | None = None,
     ):
         """
         Interactive EDA session with AI agent capable of code execution and terminal commands
@@ -384,6 +2389,8 @@ class SandboxEDA:
         Args:
             downloaded_dataset_names (list[str]): The names of the downloaded datasets.
             model_for_eda (str, optional): The underlying model to use.
+            messages (list | None): The conversation to carry on with (e.g. from restore_checkpoint), defaults to
+                a new one.
         """
 
         console.print(
@@ -394,201 +2401,71 @@ class SandboxEDA:
             )
         )
 
-        client = OpenAI(
+        client = AsyncOpenAI(
             base_url=self.model_api_base_url,
             api_key=self.model_api_key,
         )
 
         # Initialize conversation with system prompt
-        messages = [
-            {
-                "role": "system",
-                "content": SYSTEM_PROMPT.format(
-                    downloaded_dataset_names=str(downloaded_dataset_names),
-                    list_sandbox_files=str(self.list_files_in_sandbox_main_dir()),
-                    available_function_calls_schema=str(
-                        AVAILABLE_FUNCTION_CALL_SCHEMAS
-                    ),
-                    max_consecutive_function_calls_allowed=self.max_consecutive_function_calls_allowed,
-                ),
-            }
-        ]
+        if messages is None:
+            messages = self.initial_messages(downloaded_dataset_names)
 
         # Main chat loop
+        pending_checkpoint = None
         while True:
-            user_input = Prompt.ask("\n[bold yellow]>>> User Message[/bold yellow]")
+            user_input = await asyncio.to_thread(
+                Prompt.ask, "\n[bold yellow]>>> User Message[/bold yellow]"
+            )
+
+            # The last turn's checkpoint runs while the user types, so it's usually done by now. It has to finish
+            # before the conversation or the sandbox change again.
+            if pending_checkpoint:
+                await pending_checkpoint
             if user_input.lower().strip() == "quit()":
                 break
 
             messages.append({"role": "user", "content": user_input})
 
-            # Handle potential consecutive tool calls with a safety limit to avoid infinite loops
-            for i in range(self.max_consecutive_function_calls_allowed + 1):
+            await self.run_cancellable_agent_turn(client, messages, model_for_eda)
 
-                if i == self.max_consecutive_function_calls_allowed:
-                    raise Exception(
-                        f"Consecutive tool calls from the Agent must not exceed {self.max_consecutive_function_calls_allowed}."
-                    )
+            pending_checkpoint = asyncio.create_task(
+                asyncio.to_thread(self.checkpoint_after_turn, messages, model_for_eda)
+            )
+
+        self.job_manager.shutdown()
+        self.image_pipeline.shutdown()
+        if self.lease:
+            self.lease.stop()
+        await asyncio.to_thread(
+            self.checkpoint_after_turn, messages, model_for_eda, final=True
+        )
+        if self.checkpoint_path:
+            console.print(
+                f"[dim]Session checkpointed as {self.checkpoint_path.name}, resume it from the main menu.[/dim]"
+            )
+        display_usage_summary(self.history_manager.usage_summary())
+        if self.response_cache and self.response_cache.enabled:
+            console.print(
+                f"[dim]Response cache ({self.response_cache.mode}): {self.response_cache.hits} hit(s), "
+                f"{self.response_cache.misses} miss(es)[/dim]"
+            )
+        if self.execution_cache:
+            console.print(
+                f"[dim]Execution cache: {self.execution_cache.hits} hit(s), "
+                f"{self.execution_cache.misses} miss(es)[/dim]"
+            )
+        display_trace_summary(self.tracer)
 
-                response = client.chat.completions.create(
-                    model=model_for_eda,
-                    messages=messages,
-                    tools=AVAILABLE_FUNCTION_CALL_SCHEMAS,
-                    frequency_penalty=0,  # This penalty can slightly affect tool use; keep at 0.
-                )
-
-                response_message = response.choices[0].message
-                tool_calls = response_message.tool_calls
-
-                if tool_calls:
-
-                    messages.append(
-                        response_message
-                    )  # Add assistant message that triggered tool calls
-
-                    # Execute each requested tool call
-                    for tool_call in tool_calls:
-                        name = tool_call.function.name
-                        args = json.loads(tool_call.function.arguments)
-
-                        if name == "run_python_code":
-                            console.print(
-                                Panel(
-                                    args["python_code"],
-                                    title="Agent Executing Python Code",
-                                    border_style="blue",
-                                )
-                            )
-
-                            code_result = self.run_python_code(args["python_code"])
-                            messages.append(
-                                {
-                                    "tool_call_id": tool_call.id,
-                                    "role": "tool",
-                                    "name": name,
-                                    # If there are any image outputs (e.g data visualization), as it is not yet possible to return images
-                                    # from a tool call just inform the Agent that the image has been shown to the user.
-                                    "content": [
-                                        {
-                                            "type": "text",
-                                            "text": (
-                                                f"THE IMAGES HAS ALREADY BEEN SHOW TO THE USER ON THE TERMINAL AND SAVED TO TEMP FILES eg temp-{{timestamp}}.png on the user's computer in ./temp_image_output dir, THE OTHER OUTPUTS ARE BELOW\n{code_result['other_outputs']}"
-                                                if code_result["image_outputs"]
-                                                else f"{code_result['other_outputs']}"
-                                            ),
-                                        }
-                                    ],
-                                }
-                            )
-
-                            display_sandbox_code_output(code_result)
-
-                        elif name == "run_on_command_line":
-                            console.print(
-                                Panel(
-                                    args["command"],
-                                    title="Agent Executing Command On Terminal",
-                                    border_style="blue",
-                                )
-                            )
-
-                            command_result = self.run_on_command_line(args["command"])
-                            messages.append(
-                                {
-                                    "tool_call_id": tool_call.id,
-                                    "role": "tool",  # Indicates this message is from tool use
-                                    "name": name,
-                                    "content": str(command_result),
-                                }
-                            )
-
-                            display_sandbox_command_output(command_result)
-
-                        elif name == "sync_with_user":
-                            console.print(
-                                Panel(
-                                    f"[bold yellow]Agent Started Syncing {args['sandbox_path']} To User's Sync Folder ({args['path_on_user_sync_folder']})[/bold yellow]",
-                                    title="File Syncing",
-                                    border_style="white",
-                                )
-                            )
-
-                            sync_result = self.sync_with_user(
-                                args["sandbox_path"], args["path_on_user_sync_folder"]
-                            )
-                            messages.append(
-                                {
-                                    "tool_call_id": tool_call.id,
-                                    "role": "tool",  # Indicates this message is from tool use
-                                    "name": name,
-                                    "content": sync_result,
-                                }
-                            )
-
-                            if sync_result == "Sync Successful":
-                                console.print(
-                                    Panel(
-                                        f"[bold green]Agent Successfully Synced File(s) To User's Sync Folder ({args['path_on_user_sync_folder']})[/bold green]",
-                                        title="File Syncing",
-                                        border_style="white",
-                                    )
-                                )
-                            else:
-                                console.print(
-                                    Panel(
-                                        f"[bold red]Agent Failed To Sync File(s) To User's Sync Folder: {sync_result}[/bold red]",
-                                        title="File Syncing",
-                                        border_style="white",
-                                    )
-                                )
-
-                        elif name == "delete_from_user_sync_folder":
-                            console.print(
-                                Panel(
-                                    f"[bold yellow]Agent Deleting File(s) From User's Sync Folder ({args['path_on_user_sync_folder']})[/bold yellow]",
-                                    title="File Syncing",
-                                    border_style="white",
-                                )
-                            )
-
-                            delete_result = self.delete_from_user_sync_folder(
-                                args["path_on_user_sync_folder"]
-                            )
-                            messages.append(
-                                {
-                                    "tool_call_id": tool_call.id,
-                                    "role": "tool",  # Indicates this message is from tool use
-                                    "name": name,
-                                    "content": delete_result,
-                                }
-                            )
-
-                            if delete_result == "Deletion Successful":
-                                console.print(
-                                    Panel(
-                                        f"[bold green]Agent Successfully Deleted File(s) From User's Sync Folder ({args['path_on_user_sync_folder']})[/bold green]",
-                                        title="File Syncing",
-                                        border_style="white",
-                                    )
-                                )
-                            else:
-                                console.print(
-                                    Panel(
-                                        f"[bold red]Agent Failed To Delete File(s) From User's Sync Folder: {delete_result}[/bold red]",
-                                        title="File Syncing",
-                                        border_style="white",
-                                    )
-                                )
-
-                        else:
-                            raise ValueError(f"Unknown Function Call: {name}")
+    def eda_chat(
+        self,
+        downloaded_dataset_names: list[str],
+        model_for_eda: str,
+        messages: list | None = None,
+    ):
+        """
+        Blocking version of async_eda_chat, for callers without an event loop.
+        """
 
-                else:
-                    # No tool calls just display assistant response after adding it to the messages.
-                    messages.append(
-                        {"role": "assistant", "content": response_message.content}
-                    )
-                    console.print(
-                        f"[bold green]>>> Assistant Response: {response_message.content} [/]"
-                    )
-                    break
+        asyncio.run(
+            self.async_eda_chat(downloaded_dataset_names, model_for_eda, messages)
+        )
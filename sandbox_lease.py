@@ -0,0 +1,125 @@
+import contextlib
+import threading
+import time
+
+from e2b_code_interpreter import Sandbox
+from rich.console import Console
+
+console = Console()
+
+
+class SandboxLease:
+    """
+    Keeps a session's sandbox alive: its timeout is extended in the background while the session is active, and
+    a sandbox that died anyway (killed, crashed, or expired after the session sat idle) is noticed.
+
+    The session is active while a call holds the lease (see in_use) and for max_idle_seconds after the last one,
+    after that the sandbox is left to expire so an abandoned session doesn't keep it running.
+    """
+
+    def __init__(
+        self,
+        sandbox: Sandbox,
+        sandbox_timeout: int = 900,
+        renew_every_seconds: float | None = None,
+        max_idle_seconds: float = 1800,
+    ):
+        """
+        Args:
+            sandbox (Sandbox): The sandbox to keep alive.
+            sandbox_timeout (int): The timeout (seconds) the sandbox gets at every renewal.
+            renew_every_seconds (float | None): Time between renewals, a third of sandbox_timeout by default.
+            max_idle_seconds (float): Renewals stop after this long without the lease being used.
+        """
+
+        self.sandbox = sandbox
+        self.sandbox_timeout = sandbox_timeout
+        self.renew_every_seconds = renew_every_seconds or sandbox_timeout / 3
+        self.max_idle_seconds = max_idle_seconds
+
+        self.alive = True
+        self.last_used_at = time.monotonic()
+        self.last_renewed_at = time.monotonic()
+        self.calls_in_use = 0
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.renew_thread = threading.Thread(target=self._renew_loop, daemon=True)
+
+    def start(self) -> "SandboxLease":
+        self.renew_thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+
+    @contextlib.contextmanager
+    def in_use(self):
+        """
+        Marks the session active for the duration of the block (e.g. an agent turn), however long it takes.
+        """
+
+        with self.lock:
+            self.calls_in_use += 1
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.calls_in_use -= 1
+                self.last_used_at = time.monotonic()
+
+    @property
+    def idle(self) -> bool:
+        with self.lock:
+            return (
+                not self.calls_in_use
+                and time.monotonic() - self.last_used_at > self.max_idle_seconds
+            )
+
+    def check(self) -> bool:
+        """
+        Asks the sandbox API whether the sandbox is still running.
+
+        Returns:
+            bool: False if it isn't (or can't be reached), it is then considered dead until replace is called.
+        """
+
+        try:
+            self.alive = self.sandbox.is_running()
+        except Exception:
+            self.alive = False
+        return self.alive
+
+    def is_alive(self) -> bool:
+        """
+        Whether the sandbox is alive, checked with the API only if it may have expired since the last renewal
+        (the background renewals notice a dead sandbox otherwise).
+        """
+
+        if self.alive and time.monotonic() - self.last_renewed_at < self.sandbox_timeout:
+            return True
+        return self.check()
+
+    def replace(self, sandbox: Sandbox):
+        """
+        Leases the sandbox that replaces a dead one.
+        """
+
+        self.sandbox = sandbox
+        self.alive = True
+        self.last_renewed_at = time.monotonic()
+
+    def renew(self):
+        try:
+            self.sandbox.set_timeout(self.sandbox_timeout)
+            self.last_renewed_at = time.monotonic()
+        except Exception:
+            # Either a hiccup (the next renewal retries) or the sandbox is gone.
+            if not self.check():
+                console.print(
+                    f"[yellow]Sandbox {self.sandbox.sandbox_id} is no longer running[/yellow]"
+                )
+
+    def _renew_loop(self):
+        while not self.stopped.wait(self.renew_every_seconds):
+            if self.alive and not self.idle:
+                self.renew()
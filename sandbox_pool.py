@@ -0,0 +1,179 @@
+import threading
+import time
+from typing import Callable
+
+from e2b_code_interpreter import Sandbox
+from rich.console import Console
+
+from sandbox_sql import prewarm_duckdb
+
+console = Console()
+
+# Run in every pooled sandbox's kernel so the first analysis cell doesn't pay for these imports.
+WARMUP_CODE = """
+import pandas as pd
+import numpy as np
+import matplotlib
+import matplotlib.pyplot as plt
+"""
+
+
+class SandboxPool:
+    """
+    Keeps a number of warm sandboxes (booted, with the usual data analysis packages already imported in the
+    kernel) ready in the background, so an EDA session can start without waiting for a sandbox.
+
+    Sandboxes are handed out by acquire() and belong to the session from then on (it kills them when done),
+    the pool refills itself in the background. Sandboxes left idle for close to sandbox_timeout are killed and
+    replaced before they expire.
+    """
+
+    def __init__(
+        self,
+        sandbox_factory: Callable[[], Sandbox],
+        size: int = 1,
+        sandbox_timeout: int = 900,
+        idle_margin_seconds: int = 60,
+        warmup_code: str = WARMUP_CODE,
+    ):
+        """
+        Args:
+            sandbox_factory (Callable[[], Sandbox]): Creates a new sandbox (e.g. Sandbox(template=..., timeout=...)).
+            size (int): Number of warm sandboxes to keep ready.
+            sandbox_timeout (int): The timeout (seconds) sandboxes are created with, also restored on acquire.
+            idle_margin_seconds (int): Idle sandboxes are replaced this many seconds before they would time out.
+            warmup_code (str): Python code run in every new sandbox's kernel.
+        """
+
+        self.sandbox_factory = sandbox_factory
+        self.size = size
+        self.sandbox_timeout = sandbox_timeout
+        self.idle_margin_seconds = idle_margin_seconds
+        self.warmup_code = warmup_code
+
+        self.idle_sandboxes: list[tuple[Sandbox, float]] = []  # (sandbox, created at)
+        self.sandboxes_being_created = 0
+        self.condition = threading.Condition()
+        self.stopped = False
+        self.refill_thread = threading.Thread(target=self._refill_loop, daemon=True)
+
+    def start(self) -> "SandboxPool":
+        self.refill_thread.start()
+        return self
+
+    def _create_warm_sandbox(self) -> tuple[Sandbox, float]:
+        """
+        Returns:
+            Tuple of (sandbox, created at): its timeout runs from its creation, not from the end of the warmup.
+        """
+
+        sandbox = self.sandbox_factory()
+        created_at = time.monotonic()
+
+        try:
+            sandbox.run_code(self.warmup_code, language="python")
+        except Exception:
+            sandbox.kill()
+            raise
+
+        prewarm_duckdb(sandbox)
+        return sandbox, created_at
+
+    def _kill_expiring_sandboxes(self):
+        """
+        Must be called with the condition held.
+        """
+
+        deadline = time.monotonic() - (self.sandbox_timeout - self.idle_margin_seconds)
+
+        for sandbox, created_at in list(self.idle_sandboxes):
+            if created_at <= deadline:
+                self.idle_sandboxes.remove((sandbox, created_at))
+                threading.Thread(target=sandbox.kill, daemon=True).start()
+
+    def _refill_loop(self):
+        while True:
+            with self.condition:
+                self._kill_expiring_sandboxes()
+
+                while (
+                    not self.stopped
+                    and len(self.idle_sandboxes) + self.sandboxes_being_created
+                    >= self.size
+                ):
+                    # Wake up periodically to replace sandboxes that are about to expire.
+                    self.condition.wait(timeout=5)
+                    self._kill_expiring_sandboxes()
+
+                if self.stopped:
+                    return
+
+                self.sandboxes_being_created += 1
+
+            try:
+                sandbox, created_at = self._create_warm_sandbox()
+            except Exception as e:
+                console.print(
+                    f"[dim red]Sandbox pool failed to create a sandbox: {e}[/dim red]"
+                )
+                sandbox = None
+
+            with self.condition:
+                self.sandboxes_being_created -= 1
+
+                if sandbox is not None and self.stopped:
+                    threading.Thread(target=sandbox.kill, daemon=True).start()
+                elif sandbox is not None:
+                    self.idle_sandboxes.append((sandbox, created_at))
+
+                self.condition.notify_all()
+
+            if sandbox is None:
+                # Back off before retrying, e.g. when the sandbox API is unreachable.
+                time.sleep(5)
+
+    def acquire(self, wait_timeout: float = 120) -> Sandbox:
+        """
+        Hands out a warm sandbox, waiting for one that is being created if the pool is empty or creating one
+        directly if none is on the way.
+
+        Args:
+            wait_timeout (float): Maximum seconds to wait for a sandbox that is being created.
+
+        Returns:
+            Sandbox: A sandbox whose timeout has been reset to sandbox_timeout.
+        """
+
+        with self.condition:
+            self._kill_expiring_sandboxes()
+
+            if not self.idle_sandboxes and self.sandboxes_being_created:
+                self.condition.wait_for(
+                    lambda: self.idle_sandboxes, timeout=wait_timeout
+                )
+
+            sandbox = self.idle_sandboxes.pop(0)[0] if self.idle_sandboxes else None
+            self.condition.notify_all()  # Let the refill thread replace it.
+
+        if sandbox is None:
+            return self._create_warm_sandbox()[0]
+
+        # Give the session the full timeout regardless of how long the sandbox sat in the pool.
+        sandbox.set_timeout(self.sandbox_timeout)
+        return sandbox
+
+    def shutdown(self):
+        """
+        Stops refilling and kills every idle sandbox.
+        """
+
+        with self.condition:
+            self.stopped = True
+            idle_sandboxes, self.idle_sandboxes = self.idle_sandboxes, []
+            self.condition.notify_all()
+
+        for sandbox, _ in idle_sandboxes:
+            try:
+                sandbox.kill()
+            except Exception:
+                pass  # Already expired or unreachable, nothing left to clean up.
@@ -0,0 +1,133 @@
+import json
+import shlex
+import time
+from pathlib import Path
+
+from e2b_code_interpreter import Sandbox
+
+from sandbox_upload import sandbox_absolute_path
+
+# File types DuckDB can scan directly.
+SQL_QUERYABLE_EXTENSIONS = {".csv", ".tsv", ".parquet", ".json", ".jsonl"}
+
+# Installs DuckDB if the sandbox doesn't have it yet. Run in the background when a sandbox is created (see
+# prewarm_duckdb), so the first query rarely has to wait for the install SANDBOX_SQL_SCRIPT otherwise does itself.
+PREWARM_DUCKDB_COMMAND = (
+    "python3 -c 'import duckdb' 2>/dev/null || python3 -m pip install --quiet duckdb"
+)
+
+# Runs a query with DuckDB in its own process (so a heavy aggregation never takes the kernel, or its memory, down
+# with it), over views of the datasets, and prints {"columns", "rows", "truncated", "seconds"} or {"error"} as JSON.
+# DuckDB streams over the files and spills to disk past its memory limit, and only max_rows + 1 rows of the
+# result are ever fetched.
+SANDBOX_SQL_SCRIPT = r"""
+import json, subprocess, sys, time
+
+try:
+    import duckdb
+except ImportError:
+    subprocess.run([sys.executable, "-m", "pip", "install", "--quiet", "duckdb"], check=True)
+    import duckdb
+
+spec = json.loads(sys.argv[1])
+connection = duckdb.connect()
+connection.execute("SET temp_directory = '/tmp/duckdb_spill'")
+connection.execute("SET preserve_insertion_order = false")
+if spec["memory_limit"]:
+    connection.execute(f"SET memory_limit = '{spec['memory_limit']}'")
+
+for name, path in spec["views"].items():
+    connection.execute(f"CREATE VIEW \"{name}\" AS SELECT * FROM '{path.replace(chr(39), chr(39) * 2)}'")
+
+started_at = time.perf_counter()
+try:
+    cursor = connection.execute(spec["query"])
+    columns = [column[0] for column in cursor.description] if cursor.description else []
+    rows = cursor.fetchmany(spec["max_rows"] + 1) if columns else []
+except duckdb.Error as e:
+    print(json.dumps({"error": f"{type(e).__name__}: {e}"}))
+    sys.exit()
+
+print(json.dumps(
+    {
+        "columns": columns,
+        "rows": rows[: spec["max_rows"]],
+        "truncated": len(rows) > spec["max_rows"],
+        "seconds": round(time.perf_counter() - started_at, 3),
+    },
+    default=str,
+))
+"""
+
+
+def prewarm_duckdb(sandbox: Sandbox):
+    """
+    Starts installing DuckDB in the background, best effort: if it fails (e.g. no network) run_sql installs it on
+    the first query, or reports why it can't.
+    """
+
+    try:
+        sandbox.commands.run(PREWARM_DUCKDB_COMMAND, background=True)
+    except Exception:
+        pass
+
+
+def sql_views(dataframe_names: dict[str, str]) -> dict[str, str]:
+    """
+    The views a query can use: every queryable dataset, under the same name it is preloaded as in the kernel.
+
+    Args:
+        dataframe_names (dict[str, str]): {file_name_in_sandbox: name}.
+
+    Returns:
+        dict[str, str]: {view_name: absolute path in the sandbox}
+    """
+
+    return {
+        name: sandbox_absolute_path(file_name_in_sandbox)
+        for file_name_in_sandbox, name in dataframe_names.items()
+        if Path(file_name_in_sandbox).suffix.lower() in SQL_QUERYABLE_EXTENSIONS
+    }
+
+
+def run_sql(
+    sandbox: Sandbox,
+    query: str,
+    views: dict[str, str],
+    max_rows: int = 100,
+    memory_limit: str | None = None,
+    timeout: float = 300,
+) -> dict:
+    """
+    Runs a SQL query with DuckDB inside the sandbox.
+
+    Args:
+        sandbox (Sandbox): The sandbox to run the query in.
+        query (str): The query, it can use the views or read any file directly (e.g. FROM '/home/user/data.csv').
+        views (dict[str, str]): {view_name: absolute path of the file it reads}.
+        max_rows (int): At most this many result rows are returned.
+        memory_limit (str | None): DuckDB's memory limit (e.g. "4GB"), it spills to disk beyond it. None for
+            DuckDB's default (80% of the sandbox's memory).
+        timeout (float): Seconds the query may run for.
+
+    Returns:
+        dict: {"columns": list[str], "rows": list[list], "truncated": bool, "seconds": float (query time),
+        "round_trip_seconds": float} or {"error": str, "round_trip_seconds": float}
+    """
+
+    spec = {
+        "query": query,
+        "views": views,
+        "max_rows": max_rows,
+        "memory_limit": memory_limit,
+    }
+
+    started_at = time.perf_counter()
+    result = sandbox.commands.run(
+        f"python3 -c {shlex.quote(SANDBOX_SQL_SCRIPT)} {shlex.quote(json.dumps(spec))}",
+        timeout=timeout,
+    )
+
+    sql_result = json.loads(result.stdout.strip().splitlines()[-1])
+    sql_result["round_trip_seconds"] = round(time.perf_counter() - started_at, 3)
+    return sql_result
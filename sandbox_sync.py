@@ -0,0 +1,362 @@
+import io
+import json
+import shlex
+import shutil
+import tarfile
+import uuid
+from pathlib import Path, PurePosixPath
+from typing import Callable
+
+from e2b_code_interpreter import Sandbox
+
+from sandbox_upload import resolve_transfer_compression, sandbox_absolute_path
+from upload_cache import FingerprintIndex
+
+try:
+    import zstandard
+except ImportError:  # zstd archives are optional, gzip is always available.
+    zstandard = None
+
+
+# Prints the size, mtime and sha256 of every regular file under a sandbox path as JSON. Hashes are cached in the
+# sandbox keyed by (size, mtime) so repeated syncs only re-hash files that changed. sys.argv[2] (JSON) lists
+# relative paths to skip and whether to skip hidden entries at the top level, they are never read or hashed.
+SANDBOX_MANIFEST_SCRIPT = r"""
+import hashlib, json, os, sys
+
+root = sys.argv[1]
+skip = json.loads(sys.argv[2])
+skip_paths, skip_hidden = set(skip["paths"]), skip["hidden"]
+if not os.path.exists(root):
+    sys.exit(f"No such file or directory: {root}")
+
+cache_path = "/tmp/eda-sync-hash-cache.json"
+
+try:
+    with open(cache_path) as f:
+        cache = json.load(f)
+except Exception:
+    cache = {}
+
+def describe(path):
+    st = os.stat(path)
+    cached = cache.get(path)
+    if not (cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns):
+        sha256 = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                sha256.update(block)
+        cache[path] = cached = [st.st_size, st.st_mtime_ns, sha256.hexdigest()]
+    return cached
+
+entries = {}
+if os.path.isfile(root):
+    entries[""] = describe(root)
+else:
+    for dirpath, dirnames, filenames in os.walk(root):
+        if skip_hidden and dirpath == root:
+            dirnames[:] = [name for name in dirnames if not name.startswith(".")]
+            filenames = [name for name in filenames if not name.startswith(".")]
+
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            relative_path = os.path.relpath(path, root)
+            if relative_path not in skip_paths and os.path.isfile(path) and not os.path.islink(path):
+                entries[relative_path] = describe(path)
+
+with open(cache_path, "w") as f:
+    json.dump(cache, f)
+
+print(json.dumps({"is_file": os.path.isfile(root), "entries": entries}))
+"""
+
+
+def resolve_sync_destination(sync_folder: str, path_on_user_sync_folder: str) -> Path:
+    """
+    Resolves a path given by the agent to a path that is always inside the sync folder.
+
+    Raises:
+        ValueError: If the path tries to escape the sync folder (e.g. '../../.bashrc').
+    """
+
+    path_obj = Path(path_on_user_sync_folder)
+
+    # Make the path relative by stripping any root or drive component
+    relative_path = path_obj.relative_to(path_obj.anchor or ".")
+
+    if ".." in relative_path.parts:
+        raise ValueError(
+            f"Unsafe path {path_on_user_sync_folder}: it must stay inside the sync folder."
+        )
+
+    return Path(sync_folder) / relative_path
+
+
+class _IterableReader(io.RawIOBase):
+    """
+    Exposes an iterator of byte chunks (e.g. a streamed sandbox file) as a readable file object.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.leftover = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.leftover:
+            try:
+                self.leftover = bytes(next(self.chunks))
+            except StopIteration:
+                return 0
+
+        size = min(len(buffer), len(self.leftover))
+        buffer[:size], self.leftover = self.leftover[:size], self.leftover[size:]
+        return size
+
+
+def _archive_command(
+    sandbox_dir: str, archive_path: str, compression: str, member_list_path: str | None
+) -> str:
+    sandbox_dir, archive_path = shlex.quote(sandbox_dir), shlex.quote(archive_path)
+
+    # Either the whole directory or only the files listed (one per line) in member_list_path.
+    members = f"-T {shlex.quote(member_list_path)}" if member_list_path else "."
+
+    if compression == "zstd":
+        return f"tar -C {sandbox_dir} -cf - {members} | zstd -q -T0 -o {archive_path}"
+
+    return f"tar -C {sandbox_dir} -czf {archive_path} {members}"
+
+
+def _extract_safely(archive: tarfile.TarFile, destination: Path) -> tuple[int, int]:
+    """
+    Extracts the regular files and directories of a streamed archive into destination. Members with absolute
+    paths, '..' components, links or device files are skipped so nothing can be written outside destination.
+
+    Returns:
+        Tuple of (files extracted, bytes extracted).
+    """
+
+    files_extracted = bytes_extracted = 0
+
+    for member in archive:
+        member_path = PurePosixPath(member.name)
+        if member_path.is_absolute() or ".." in member_path.parts:
+            continue
+
+        target_path = destination.joinpath(*member_path.parts)
+
+        if member.isdir():
+            target_path.mkdir(parents=True, exist_ok=True)
+
+        elif member.isfile():
+            target_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(target_path, "wb") as f:
+                shutil.copyfileobj(archive.extractfile(member), f)
+
+            files_extracted += 1
+            bytes_extracted += member.size
+
+    return files_extracted, bytes_extracted
+
+
+def sync_directory_as_archive(
+    sandbox: Sandbox,
+    sandbox_dir: str,
+    destination: Path,
+    compression: str | None = "zstd",
+    member_paths: list[str] | None = None,
+) -> dict:
+    """
+    Syncs a sandbox directory in a single transfer: the sandbox packs it into a tar archive that is downloaded
+    once and unpacked into destination while it streams in.
+
+    Args:
+        sandbox (Sandbox): The sandbox to sync from.
+        sandbox_dir (str): The directory to sync in the sandbox.
+        destination (Path): The local directory to unpack into (already resolved inside the sync folder).
+        compression (str | None): "zstd" (falls back to gzip if unavailable) or "gzip".
+        member_paths (list[str] | None): Only archive these paths (relative to sandbox_dir), defaults to everything.
+
+    Returns:
+        dict: {"files": int, "bytes": int (uncompressed), "archive_bytes": int (sent over the wire)}
+    """
+
+    compression = resolve_transfer_compression(sandbox, compression) or "gzip"
+    archive_path = f"/tmp/eda-sync-{uuid.uuid4().hex}.tar"
+    member_list_path = None
+
+    try:
+        if member_paths is not None:
+            member_list_path = f"{archive_path}.members"
+            sandbox.files.write(member_list_path, "\n".join(member_paths))
+
+        sandbox.commands.run(
+            _archive_command(sandbox_dir, archive_path, compression, member_list_path)
+        )
+        archive_bytes = sandbox.files.get_info(archive_path).size
+
+        stream = _IterableReader(sandbox.files.read(archive_path, "stream"))
+
+        if compression == "zstd":
+            decompressed = zstandard.ZstdDecompressor().stream_reader(stream)
+            with tarfile.open(fileobj=decompressed, mode="r|") as archive:
+                files, size = _extract_safely(archive, destination)
+        else:
+            with tarfile.open(fileobj=stream, mode="r|gz") as archive:
+                files, size = _extract_safely(archive, destination)
+
+    finally:
+        sandbox.commands.run(
+            f"rm -f {shlex.quote(archive_path)} {shlex.quote(archive_path)}.members"
+        )
+
+    return {"files": files, "bytes": size, "archive_bytes": archive_bytes}
+
+
+def read_sandbox_sync_manifest(
+    sandbox: Sandbox,
+    sandbox_path: str,
+    skip_paths: list[str] | None = None,
+    skip_hidden: bool = False,
+) -> tuple[bool, dict]:
+    """
+    Computes the manifest of a sandbox file or directory inside the sandbox.
+
+    Args:
+        skip_paths (list[str] | None): Relative paths left out without being read (e.g. uploaded datasets).
+        skip_hidden (bool): Leave out the hidden files and directories at the top level (e.g. upload staging).
+
+    Returns:
+        Tuple of (is_file, {relative_path: [size, mtime_ns, sha256]}), a file's only entry has the path "".
+    """
+
+    skip = json.dumps({"paths": skip_paths or [], "hidden": skip_hidden})
+    result = sandbox.commands.run(
+        f"python3 -c {shlex.quote(SANDBOX_MANIFEST_SCRIPT)} {shlex.quote(sandbox_absolute_path(sandbox_path))} "
+        f"{shlex.quote(skip)}"
+    )
+    manifest = json.loads(result.stdout)
+    return manifest["is_file"], manifest["entries"]
+
+
+def sync_incrementally(
+    sandbox: Sandbox,
+    sandbox_path: str,
+    destination: Path,
+    fingerprint_index: FingerprintIndex,
+    delete_missing: bool = False,
+    exclude: Callable[[str], bool] | None = None,
+    skip_paths: list[str] | None = None,
+    skip_hidden: bool = False,
+) -> dict:
+    """
+    Syncs a sandbox file or directory to destination, transferring only the files that are new or changed
+    compared to what is already there. Several changed files are transferred together as one archive.
+
+    Args:
+        sandbox (Sandbox): The sandbox to sync from.
+        sandbox_path (str): The file or directory to sync in the sandbox.
+        destination (Path): The local path to sync to (already resolved inside the sync folder).
+        fingerprint_index (FingerprintIndex): Caches the hashes of the local files between syncs.
+        delete_missing (bool): Delete local files under destination that no longer exist in the sandbox.
+        exclude (Callable[[str], bool] | None): Leaves out the files whose relative path it returns True for, on
+            both sides.
+        skip_paths (list[str] | None), skip_hidden (bool): Leave files out of the sandbox's side before they are
+            hashed (see read_sandbox_sync_manifest), for big files exclude would drop anyway.
+
+    Returns:
+        dict: {
+            "files_transferred": int, "bytes_transferred": int,
+            "files_unchanged": int, "bytes_saved": int,
+            "files_deleted": int,
+        }
+    """
+
+    is_file, sandbox_entries = read_sandbox_sync_manifest(
+        sandbox, sandbox_path, skip_paths, skip_hidden
+    )
+
+    if is_file:
+        local_files = {"": destination} if destination.is_file() else {}
+    else:
+        local_files = {
+            path.relative_to(destination).as_posix(): path
+            for path in (destination.rglob("*") if destination.is_dir() else [])
+            if path.is_file() and not path.is_symlink()
+        }
+
+    if exclude:
+        sandbox_entries = {
+            path: entry for path, entry in sandbox_entries.items() if not exclude(path)
+        }
+        local_files = {
+            path: local_path
+            for path, local_path in local_files.items()
+            if not exclude(path)
+        }
+
+    changed_paths, bytes_saved = [], 0
+    for relative_path, (size, _, sha256) in sandbox_entries.items():
+        local_path = local_files.get(relative_path)
+
+        if (
+            local_path is not None
+            and fingerprint_index.sha256(str(local_path)) == sha256
+        ):
+            bytes_saved += size
+        else:
+            changed_paths.append(relative_path)
+
+    if is_file and changed_paths:
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        with open(destination, "wb") as f:
+            f.write(sandbox.files.read(sandbox_absolute_path(sandbox_path), "bytes"))
+
+    elif len(changed_paths) == 1:
+        # A single changed file isn't worth the archive round trips.
+        target_path = destination.joinpath(*PurePosixPath(changed_paths[0]).parts)
+        target_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(target_path, "wb") as f:
+            f.write(
+                sandbox.files.read(
+                    f"{sandbox_absolute_path(sandbox_path)}/{changed_paths[0]}", "bytes"
+                )
+            )
+
+    elif changed_paths:
+        destination.mkdir(parents=True, exist_ok=True)
+        sync_directory_as_archive(
+            sandbox,
+            sandbox_absolute_path(sandbox_path),
+            destination,
+            member_paths=changed_paths,
+        )
+
+    files_deleted = 0
+    if delete_missing and not is_file:
+        for relative_path, local_path in local_files.items():
+            if relative_path not in sandbox_entries:
+                local_path.unlink()
+                files_deleted += 1
+
+    # Hash the freshly written files now, so the next sync finds them in the index.
+    for relative_path in changed_paths:
+        local_path = (
+            destination
+            if is_file
+            else destination.joinpath(*PurePosixPath(relative_path).parts)
+        )
+        if local_path.is_file():
+            fingerprint_index.sha256(str(local_path))
+    fingerprint_index.save()
+
+    return {
+        "files_transferred": len(changed_paths),
+        "bytes_transferred": sum(sandbox_entries[path][0] for path in changed_paths),
+        "files_unchanged": len(sandbox_entries) - len(changed_paths),
+        "bytes_saved": bytes_saved,
+        "files_deleted": files_deleted,
+    }
@@ -0,0 +1,308 @@
+import gzip
+import hashlib
+import os
+import posixpath
+import shlex
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from e2b_code_interpreter import Sandbox
+
+try:
+    import zstandard
+except ImportError:  # zstd compression is optional, gzip is always available.
+    zstandard = None
+
+SANDBOX_HOME_DIR = "/home/user"
+
+# Chunks of large (or compressed) uploads are staged here before being joined into the final file.
+UPLOAD_STAGING_DIR = "/home/user/.uploads"
+
+SUPPORTED_TRANSFER_COMPRESSIONS = (None, "gzip", "zstd")
+
+
+def sandbox_absolute_path(file_name_in_sandbox: str) -> str:
+    """
+    Resolves a sandbox file name relative to the sandbox's /home/user directory (absolute paths are kept as is).
+    """
+    return posixpath.join(SANDBOX_HOME_DIR, file_name_in_sandbox)
+
+
+def compress_chunk(data: bytes, compression: str | None) -> bytes:
+    """
+    Compresses a chunk for the wire. Compression is deterministic (no timestamps in the gzip header), so the same
+    chunk always produces the same bytes which is what allows interrupted uploads to be resumed.
+
+    Note:
+        Each chunk is compressed independently. Concatenated gzip members and zstd frames decompress to the
+        concatenation of their contents, so the sandbox can join the parts and decompress them in one pass.
+    """
+
+    if compression is None:
+        return data
+
+    if compression == "gzip":
+        # Level 1 is several times faster than the default and still shrinks CSVs substantially.
+        return gzip.compress(data, compresslevel=1, mtime=0)
+
+    if compression == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(data)
+
+    raise ValueError(f"Unsupported transfer compression: {compression}")
+
+
+def resolve_transfer_compression(
+    sandbox: Sandbox, compression: str | None
+) -> str | None:
+    """
+    Falls back to gzip when zstd is requested but either the local zstandard package or the sandbox's zstd
+    binary is missing.
+    """
+
+    if compression not in SUPPORTED_TRANSFER_COMPRESSIONS:
+        raise ValueError(
+            f"Unsupported transfer compression '{compression}', expected one of {SUPPORTED_TRANSFER_COMPRESSIONS}"
+        )
+
+    if compression != "zstd":
+        return compression
+
+    if zstandard is None:
+        return "gzip"
+
+    try:
+        sandbox.commands.run("command -v zstd")
+    except Exception:  # Non-zero exit code, i.e. zstd is not installed in the sandbox.
+        return "gzip"
+
+    return "zstd"
+
+
+def _with_retries(fn, max_retries: int):
+    """
+    Calls fn, retrying with exponential backoff (1s, 2s, 4s, ...) when it raises.
+    """
+
+    for attempt in range(max_retries + 1):
+        try:
+            return fn()
+        except Exception:
+            if attempt == max_retries:
+                raise
+            time.sleep(2**attempt)
+
+
+def _list_existing_parts(sandbox: Sandbox, parts_dir: str) -> set[str]:
+    """
+    Returns the name of every part already uploaded to parts_dir, from a previous (interrupted) upload.
+    """
+
+    result = sandbox.commands.run(
+        f"mkdir -p {shlex.quote(parts_dir)} && find {shlex.quote(parts_dir)} -maxdepth 1 -name 'part-*' -printf '%f\\n'"
+    )
+
+    return set(result.stdout.split())
+
+
+def _part_name(index: int, payload: bytes) -> str:
+    # The hash of the content in the name means a part left over from an interrupted upload of another version of
+    # the file (the staging directory is per file name) is never taken for this one's.
+    return f"part-{index:06d}-{hashlib.blake2b(payload, digest_size=16).hexdigest()}"
+
+
+def _upload_chunk(
+    sandbox: Sandbox,
+    file_path: str,
+    index: int,
+    offset: int,
+    length: int,
+    parts_dir: str,
+    existing_parts: set[str],
+    compression: str | None,
+    max_retries: int,
+) -> tuple[int, float, str]:
+    """
+    Reads, compresses and uploads one chunk of a file.
+
+    Returns:
+        Tuple of (bytes sent over the wire, time the chunk started at, name of the part).
+    """
+
+    started_at = time.perf_counter()
+
+    with open(file_path, "rb") as file:
+        file.seek(offset)
+        payload = compress_chunk(file.read(length), compression)
+
+    part_name = _part_name(index, payload)
+    if part_name in existing_parts:
+        # Already uploaded by a previous attempt; chunks compress deterministically so the same chunk gets the
+        # same name.
+        return 0, started_at, part_name
+
+    _with_retries(
+        lambda: sandbox.files.write(posixpath.join(parts_dir, part_name), payload),
+        max_retries,
+    )
+    return len(payload), started_at, part_name
+
+
+def _upload_whole_file(
+    sandbox: Sandbox, file_path: str, destination: str, max_retries: int
+) -> tuple[int, float]:
+    """
+    Streams a small uncompressed file straight to its destination.
+    """
+
+    started_at = time.perf_counter()
+
+    def write():
+        with open(file_path, "rb") as file:
+            sandbox.files.write(destination, file)
+
+    _with_retries(write, max_retries)
+    return os.path.getsize(file_path), started_at
+
+
+def _join_parts_command(
+    parts_dir: str, part_names: list[str], destination: str, compression: str | None
+) -> str:
+    decompress = {None: "cat", "gzip": "gzip -dc", "zstd": "zstd -dcq"}[compression]
+    # Only this upload's parts, in order: the staging directory may also hold stale parts of another version.
+    parts = " ".join(shlex.quote(part_name) for part_name in part_names)
+    parts_dir, destination = shlex.quote(parts_dir), shlex.quote(destination)
+
+    return (
+        f'mkdir -p "$(dirname {destination})" && '
+        f"(cd {parts_dir} && cat {parts}) | {decompress} > {destination} && rm -rf {parts_dir}"
+    )
+
+
+def upload_files_concurrently(
+    sandbox: Sandbox,
+    file_paths: list[str],
+    file_names_in_sandbox: list[str],
+    max_parallel_uploads: int = 4,
+    compression: str | None = None,
+    chunk_size_bytes: int = 64 * 1024 * 1024,
+    max_retries: int = 3,
+    min_compressed_size_bytes: int = 4 * 1024 * 1024,
+) -> list[dict]:
+    """
+    Uploads files to the sandbox with bounded parallelism.
+
+    Files larger than chunk_size_bytes, or compressed, are split into chunks. The chunks are uploaded in parallel
+    to a staging directory and then joined (and decompressed) inside the sandbox. Parts of the same content that
+    are already in the staging directory from an interrupted upload are skipped, so re-running an upload resumes
+    it. Files smaller than min_compressed_size_bytes are sent whole and uncompressed, since for them the staging
+    round trips cost more than compression saves.
+
+    Args:
+        sandbox (Sandbox): The sandbox to upload to.
+        file_paths (list[str]): Local paths of the files to upload.
+        file_names_in_sandbox (list[str]): The names the files will take in the sandbox (relative to /home/user).
+        max_parallel_uploads (int): Maximum number of chunks uploading at the same time.
+        compression (str | None): None, "gzip" or "zstd" (falls back to gzip if zstd is unavailable).
+        chunk_size_bytes (int): Size of the uncompressed chunks large files are split into.
+        max_retries (int): How many times a failed chunk upload is retried.
+        min_compressed_size_bytes (int): Files smaller than this are never compressed.
+
+    Returns:
+        list[dict]: One report per file with structure:
+            {
+                "file_path": str,
+                "file_name_in_sandbox": str,
+                "size_bytes": int,
+                "bytes_sent": int,
+                "seconds": float,
+                "throughput_mb_per_second": float,
+            }
+    """
+
+    compression = resolve_transfer_compression(sandbox, compression)
+
+    reports = []
+    with ThreadPoolExecutor(max_workers=max_parallel_uploads) as executor:
+
+        # Queue every chunk of every file first so that the pool is kept busy across file boundaries.
+        pending_uploads = []
+        for file_path, file_name_in_sandbox in zip(file_paths, file_names_in_sandbox):
+            destination = sandbox_absolute_path(file_name_in_sandbox)
+            size = os.path.getsize(file_path)
+
+            if size <= chunk_size_bytes and (
+                compression is None or size < min_compressed_size_bytes
+            ):
+                futures = [
+                    executor.submit(
+                        _upload_whole_file, sandbox, file_path, destination, max_retries
+                    )
+                ]
+                parts_dir = None
+
+            else:
+                parts_dir = posixpath.join(
+                    UPLOAD_STAGING_DIR, file_name_in_sandbox.strip("/") + ".parts"
+                )
+                existing_parts = _list_existing_parts(sandbox, parts_dir)
+
+                futures = [
+                    executor.submit(
+                        _upload_chunk,
+                        sandbox,
+                        file_path,
+                        index,
+                        offset,
+                        chunk_size_bytes,
+                        parts_dir,
+                        existing_parts,
+                        compression,
+                        max_retries,
+                    )
+                    for index, offset in enumerate(
+                        range(0, max(size, 1), chunk_size_bytes)
+                    )
+                ]
+
+            pending_uploads.append(
+                (file_path, file_name_in_sandbox, destination, size, parts_dir, futures)
+            )
+
+        for (
+            file_path,
+            file_name_in_sandbox,
+            destination,
+            size,
+            parts_dir,
+            futures,
+        ) in pending_uploads:
+            results = [future.result() for future in futures]
+
+            if parts_dir is not None:
+                _with_retries(
+                    lambda: sandbox.commands.run(
+                        _join_parts_command(
+                            parts_dir,
+                            [part_name for _, _, part_name in results],
+                            destination,
+                            compression,
+                        )
+                    ),
+                    max_retries,
+                )
+
+            seconds = time.perf_counter() - min(result[1] for result in results)
+            reports.append(
+                {
+                    "file_path": file_path,
+                    "file_name_in_sandbox": file_name_in_sandbox,
+                    "size_bytes": size,
+                    "bytes_sent": sum(result[0] for result in results),
+                    "seconds": seconds,
+                    "throughput_mb_per_second": (
+                        size / seconds / 1_000_000 if seconds else 0.0
+                    ),
+                }
+            )
+
+    return reports
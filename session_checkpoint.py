@@ -0,0 +1,273 @@
+import json
+import shlex
+import tarfile
+import time
+from pathlib import Path
+
+from e2b_code_interpreter import Sandbox
+
+from sandbox_upload import SANDBOX_HOME_DIR, upload_files_concurrently
+
+# Where the kernel snapshot is staged in the sandbox on its way to (or from) the checkpoint.
+SANDBOX_KERNEL_STATE_PATH = "/tmp/eda-kernel-state.pkl.gz"
+SANDBOX_FILES_ARCHIVE_PATH = "/tmp/eda-checkpoint-files.tar.gz"
+
+CHECKPOINT_FILE_NAME = "checkpoint.json"
+KERNEL_STATE_FILE_NAME = "kernel_state.pkl.gz"
+FILES_DIRECTORY_NAME = "files"
+
+# Run in the kernel after _EDA_SNAPSHOT_PATH, _EDA_SNAPSHOT_SKIP (list of names), _EDA_SNAPSHOT_SKIP_UNCHANGED (list of
+# preloaded DataFrame names, left out unless their fingerprint changed, see dataset_preload.py) and
+# _EDA_SNAPSHOT_MAX_VARIABLE_BYTES are set: pickles every user variable (cloudpickle when available, so functions and lambdas defined in the session
+# are kept too) into one gzip file and prints {"saved": [name, ...], "skipped": {name: reason}} as JSON.
+# Each variable is pickled on its own, so one that can't be pickled or is too big doesn't lose the others.
+KERNEL_SNAPSHOT_CODE = r"""
+def _eda_snapshot_kernel(path, skip, skip_unchanged, max_variable_bytes):
+    import gzip, json, pickle, types
+
+    try:
+        import cloudpickle as dumper
+    except ImportError:
+        dumper = pickle
+
+    saved, skipped = {}, {}
+    for name, value in list(globals().items()):
+        if name.startswith("_") or name in skip or isinstance(value, types.ModuleType):
+            continue
+
+        if name in skip_unchanged:
+            fingerprint = globals().get("_EDA_PRELOADED_FINGERPRINTS", {}).get(name)
+            if fingerprint is not None and _eda_dataframe_fingerprint(value) == fingerprint:
+                continue
+
+        try:
+            data = dumper.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            skipped[name] = f"can't be pickled ({type(e).__name__})"
+            continue
+
+        if len(data) > max_variable_bytes:
+            skipped[name] = f"too big ({len(data) / 1_000_000:.0f} MB pickled)"
+            continue
+        saved[name] = data
+
+    with gzip.open(path, "wb", compresslevel=1) as f:
+        pickle.dump(saved, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    return json.dumps({"saved": sorted(saved), "skipped": skipped})
+
+
+print(_eda_snapshot_kernel(_EDA_SNAPSHOT_PATH, set(_EDA_SNAPSHOT_SKIP), set(_EDA_SNAPSHOT_SKIP_UNCHANGED), _EDA_SNAPSHOT_MAX_VARIABLE_BYTES))
+"""
+
+# Run in the kernel after _EDA_SNAPSHOT_PATH is set: loads the variables of a snapshot back into the kernel's
+# globals and prints {"restored": [name, ...], "failed": {name: reason}} as JSON.
+KERNEL_RESTORE_CODE = r"""
+def _eda_restore_kernel(path):
+    import gzip, json, pickle
+
+    with gzip.open(path, "rb") as f:
+        saved = pickle.load(f)
+
+    restored, failed = [], {}
+    for name, data in saved.items():
+        try:
+            globals()[name] = pickle.loads(data)
+            restored.append(name)
+        except Exception as e:  # e.g. a package the value needs isn't installed in this sandbox.
+            failed[name] = f"{type(e).__name__}: {e}"
+
+    return json.dumps({"restored": sorted(restored), "failed": failed})
+
+
+print(_eda_restore_kernel(_EDA_SNAPSHOT_PATH))
+"""
+
+# Names IPython puts in the kernel's globals, they aren't the session's state.
+KERNEL_BUILTIN_NAMES = ["In", "Out", "get_ipython", "exit", "quit", "open"]
+
+
+def is_derived_file(relative_path: str, dataset_names: set[str]) -> bool:
+    """
+    Whether a file under the sandbox's /home/user was made during the session, as opposed to an uploaded dataset
+    (re-uploaded from its local path on resume) or a hidden file such as the upload staging area, the columnar
+    copies of the datasets (rebuilt when they're preloaded) and the kernel's own caches.
+    """
+
+    return relative_path not in dataset_names and not relative_path.split("/", 1)[
+        0
+    ].startswith(".")
+
+
+def _run_json_code(sandbox: Sandbox, code: str, timeout: float) -> dict | list:
+    execution = sandbox.run_code(code, language="python", timeout=timeout)
+
+    if execution.error:
+        raise RuntimeError(f"{execution.error.name}: {execution.error.value}")
+
+    return json.loads("".join(execution.logs.stdout).strip().splitlines()[-1])
+
+
+def missing_kernel_variables(sandbox: Sandbox, names: list[str]) -> list[str]:
+    """
+    The names that aren't defined in the sandbox's kernel, e.g. all of them after it restarted.
+    """
+
+    return _run_json_code(
+        sandbox,
+        f"import json as _eda_json\nprint(_eda_json.dumps(sorted(set({names!r}) - set(globals()))))",
+        60,
+    )
+
+
+def snapshot_kernel(
+    sandbox: Sandbox,
+    local_path: Path,
+    skip_names: list[str],
+    max_variable_bytes: int,
+    preloaded_names: list[str] | None = None,
+    timeout: float = 600,
+) -> dict:
+    """
+    Pickles the variables of the sandbox's kernel and downloads them to local_path.
+
+    Args:
+        sandbox (Sandbox): The sandbox whose (default) kernel is snapshotted.
+        local_path (Path): Where the snapshot is written locally.
+        skip_names (list[str]): Variables left out, e.g. datasets that are cheaper to load again than to pickle.
+        max_variable_bytes (int): Variables bigger than this once pickled are left out.
+        preloaded_names (list[str] | None): Preloaded DataFrames, left out unless the session changed them.
+        timeout (float): Seconds the pickling may take.
+
+    Returns:
+        dict: {"saved": [name, ...], "skipped": {name: reason}, "bytes": int (size of the snapshot)}
+    """
+
+    report = _run_json_code(
+        sandbox,
+        f"_EDA_SNAPSHOT_PATH = {SANDBOX_KERNEL_STATE_PATH!r}\n"
+        f"_EDA_SNAPSHOT_SKIP = {KERNEL_BUILTIN_NAMES + skip_names!r}\n"
+        f"_EDA_SNAPSHOT_SKIP_UNCHANGED = {preloaded_names or []!r}\n"
+        f"_EDA_SNAPSHOT_MAX_VARIABLE_BYTES = {max_variable_bytes}\n"
+        + KERNEL_SNAPSHOT_CODE,
+        timeout,
+    )
+
+    try:
+        local_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = local_path.with_suffix(".tmp")
+        with open(temp_path, "wb") as f:
+            for chunk in sandbox.files.read(SANDBOX_KERNEL_STATE_PATH, "stream"):
+                f.write(chunk)
+        temp_path.replace(local_path)
+
+    finally:
+        sandbox.commands.run(f"rm -f {shlex.quote(SANDBOX_KERNEL_STATE_PATH)}")
+
+    report["bytes"] = local_path.stat().st_size
+    return report
+
+
+def restore_kernel(sandbox: Sandbox, local_path: Path, timeout: float = 600) -> dict:
+    """
+    Uploads a kernel snapshot (see snapshot_kernel) and loads its variables into the sandbox's kernel.
+
+    Returns:
+        dict: {"restored": [name, ...], "failed": {name: reason}}
+    """
+
+    # Already gzipped, so not compressed again on the wire.
+    upload_files_concurrently(sandbox, [str(local_path)], [SANDBOX_KERNEL_STATE_PATH])
+
+    try:
+        return _run_json_code(
+            sandbox,
+            f"_EDA_SNAPSHOT_PATH = {SANDBOX_KERNEL_STATE_PATH!r}\n"
+            + KERNEL_RESTORE_CODE,
+            timeout,
+        )
+
+    finally:
+        sandbox.commands.run(f"rm -f {shlex.quote(SANDBOX_KERNEL_STATE_PATH)}")
+
+
+def restore_files(sandbox: Sandbox, files_directory: Path) -> int:
+    """
+    Puts the derived files of a checkpoint back in the sandbox's /home/user, as a single archive.
+
+    Returns:
+        int: The number of files restored.
+    """
+
+    files = [path for path in files_directory.rglob("*") if path.is_file()]
+    if not files:
+        return 0
+
+    archive_path = files_directory.parent / "files.tar.gz"
+    with tarfile.open(archive_path, "w:gz", compresslevel=1) as archive:
+        for path in files:
+            archive.add(path, arcname=path.relative_to(files_directory).as_posix())
+
+    try:
+        upload_files_concurrently(
+            sandbox, [str(archive_path)], [SANDBOX_FILES_ARCHIVE_PATH]
+        )
+        sandbox.commands.run(
+            f"tar -C {shlex.quote(SANDBOX_HOME_DIR)} -xzf {shlex.quote(SANDBOX_FILES_ARCHIVE_PATH)} "
+            f"&& rm -f {shlex.quote(SANDBOX_FILES_ARCHIVE_PATH)}"
+        )
+
+    finally:
+        archive_path.unlink()
+
+    return len(files)
+
+
+def pause_sandbox(sandbox: Sandbox) -> bool:
+    """
+    Pauses the sandbox (memory and filesystem) so it can be resumed as it was with Sandbox.connect.
+
+    Returns:
+        bool: False if the sandbox can't be paused (older SDK or a provider that doesn't support it).
+    """
+
+    pause = getattr(sandbox, "pause", None) or getattr(sandbox, "beta_pause", None)
+    if pause is None:
+        return False
+
+    try:
+        pause()
+        return True
+    except Exception:
+        return False
+
+
+def write_checkpoint(checkpoint_path: Path, checkpoint: dict):
+    checkpoint_path.mkdir(parents=True, exist_ok=True)
+    checkpoint["updated_at"] = time.time()
+
+    # Write then rename so an interrupted checkpoint never leaves a truncated one behind.
+    temp_path = checkpoint_path / f"{CHECKPOINT_FILE_NAME}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    temp_path.replace(checkpoint_path / CHECKPOINT_FILE_NAME)
+
+
+def read_checkpoint(checkpoint_path: Path) -> dict:
+    with open(checkpoint_path / CHECKPOINT_FILE_NAME, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def list_checkpoints(checkpoint_directory: str) -> list[dict]:
+    """
+    The checkpoints saved under checkpoint_directory, latest first.
+    """
+
+    checkpoints = []
+    for path in Path(checkpoint_directory).glob(f"*/{CHECKPOINT_FILE_NAME}"):
+        try:
+            checkpoints.append(read_checkpoint(path.parent))
+        except (OSError, json.JSONDecodeError):  # e.g. written by an older version.
+            continue
+
+    return sorted(checkpoints, key=lambda checkpoint: -checkpoint["updated_at"])
@@ -0,0 +1,157 @@
+import threading
+import time
+
+import pytest
+from e2b_code_interpreter import Execution, Logs
+
+from fake_sandbox import FakeSandbox
+from sandbox_pool import SandboxPool
+
+
+def wait_until(condition, timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out waiting for the condition")
+        time.sleep(0.01)
+
+
+class FakeSandboxFactory:
+    """
+    Creates FakeSandboxes, keeping every sandbox it made.
+    """
+
+    def __init__(self, **sandbox_kwargs):
+        self.sandbox_kwargs = sandbox_kwargs
+        self.sandboxes: list[FakeSandbox] = []
+        self.lock = threading.Lock()
+
+    def __call__(self) -> FakeSandbox:
+        sandbox = FakeSandbox(**self.sandbox_kwargs)
+        with self.lock:
+            self.sandboxes.append(sandbox)
+        return sandbox
+
+
+@pytest.fixture
+def factory():
+    return FakeSandboxFactory(timeout=900)
+
+
+@pytest.fixture
+def make_pool(factory):
+    pools = []
+
+    def make_pool(**kwargs) -> SandboxPool:
+        pool = SandboxPool(factory, warmup_code="import pandas as pd", **kwargs)
+        pools.append(pool)
+        return pool
+
+    yield make_pool
+
+    for pool in pools:
+        pool.shutdown()
+
+
+def idle_count(pool: SandboxPool) -> int:
+    with pool.condition:
+        return len(pool.idle_sandboxes)
+
+
+def test_start_fills_the_pool_with_warm_sandboxes(factory, make_pool):
+    pool = make_pool(size=2).start()
+
+    wait_until(lambda: idle_count(pool) == 2)
+
+    assert len(factory.sandboxes) == 2
+    for sandbox in factory.sandboxes:
+        assert sandbox.code_history == ["import pandas as pd"]
+
+
+def test_acquire_hands_out_a_warm_sandbox_and_refills(factory, make_pool):
+    pool = make_pool(size=1, sandbox_timeout=600).start()
+    wait_until(lambda: idle_count(pool) == 1)
+    warm_sandbox = factory.sandboxes[0]
+    warm_sandbox.timeout = 10  # As if it had been sitting in the pool.
+
+    sandbox = pool.acquire()
+
+    assert sandbox is warm_sandbox
+    assert sandbox.timeout == 600
+    assert not sandbox.killed
+
+    wait_until(lambda: idle_count(pool) == 1)
+    assert len(factory.sandboxes) == 2
+    assert pool.idle_sandboxes[0][0] is not sandbox
+
+
+def test_acquire_creates_a_sandbox_when_none_is_on_the_way(factory, make_pool):
+    pool = make_pool(size=1)  # Not started, so nothing is being created.
+
+    sandbox = pool.acquire()
+
+    assert sandbox is factory.sandboxes[0]
+    assert sandbox.code_history == ["import pandas as pd"]
+
+
+def test_expiring_sandboxes_are_killed_and_replaced(factory, make_pool):
+    pool = make_pool(size=1, sandbox_timeout=300, idle_margin_seconds=60).start()
+    wait_until(lambda: idle_count(pool) == 1)
+
+    # Created longer ago than sandbox_timeout - idle_margin_seconds.
+    with pool.condition:
+        expiring_sandbox, created_at = pool.idle_sandboxes[0]
+        pool.idle_sandboxes[0] = (expiring_sandbox, created_at - 241)
+
+    sandbox = pool.acquire()
+
+    assert sandbox is not expiring_sandbox
+    wait_until(lambda: expiring_sandbox.killed)
+    assert not sandbox.killed
+
+
+def test_sandbox_age_counts_from_creation_not_warmup():
+    def slow_warmup(code):
+        time.sleep(0.3)
+        return Execution(logs=Logs(stdout=[], stderr=[]))
+
+    pool = SandboxPool(
+        FakeSandboxFactory(code_handler=slow_warmup), warmup_code="import pandas as pd"
+    )
+    started_at = time.monotonic()
+    pool.start()
+
+    try:
+        wait_until(lambda: idle_count(pool) == 1)
+        with pool.condition:
+            _, created_at = pool.idle_sandboxes[0]
+    finally:
+        pool.shutdown()
+
+    # Before the warmup, which took 0.3s, started.
+    assert created_at - started_at < 0.3
+
+
+def test_failed_warmup_kills_the_sandbox():
+    def failing_code_handler(code):
+        raise RuntimeError("kernel not ready")
+
+    factory = FakeSandboxFactory(code_handler=failing_code_handler)
+    pool = SandboxPool(factory, warmup_code="import pandas as pd")
+
+    with pytest.raises(RuntimeError, match="kernel not ready"):
+        pool.acquire()
+
+    assert factory.sandboxes[0].killed
+
+
+def test_shutdown_kills_idle_sandboxes_and_stops_refilling(factory, make_pool):
+    pool = make_pool(size=2).start()
+    wait_until(lambda: idle_count(pool) == 2)
+
+    pool.shutdown()
+
+    pool.refill_thread.join(timeout=5)
+    assert not pool.refill_thread.is_alive()
+    assert idle_count(pool) == 0
+    assert all(sandbox.killed for sandbox in factory.sandboxes)
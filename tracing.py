@@ -0,0 +1,176 @@
+import contextvars
+import json
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+from rich.console import Console
+from rich.table import Table
+
+console = Console()
+
+# Token counts recorded on spans, totalled per span name in the summary.
+TOKEN_ATTRIBUTES = ("prompt_tokens", "cached_tokens", "completion_tokens")
+
+# The innermost open span of the current thread / asyncio task, new spans are nested under it. asyncio tasks and
+# asyncio.to_thread copy the context, so spans opened in them nest under the span that started them.
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    def __init__(self, name: str, parent_id: str | None, attributes: dict):
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.started_at = time.time()
+        self.duration_seconds: float | None = None
+        self.error: str | None = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> dict:
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_seconds": self.duration_seconds,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class Tracer:
+    """
+    Records timed spans (model calls, tool calls, uploads, syncs, ...) for a session. Every span is appended to
+    the session's JSONL trace as soon as it ends, so a trace survives a crashed session.
+    """
+
+    def __init__(self, trace_directory: str | None = "./.eda_cache/traces"):
+        """
+        Args:
+            trace_directory (str | None): Where the session's trace ({session_id}.jsonl) is written, None to only
+                keep the spans in memory.
+        """
+
+        self.session_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        self.trace_path = (
+            Path(trace_directory) / f"{self.session_id}.jsonl"
+            if trace_directory
+            else None
+        )
+        self.spans: list[Span] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """
+        Times the enclosed block as a span, nested under the current span if there is one. Yields the Span,
+        whose attributes can be set while the block runs (e.g. token counts once a response arrives).
+        """
+
+        parent = _current_span.get()
+        span = Span(name, parent.span_id if parent else None, attributes)
+        token = _current_span.set(span)
+        started = time.perf_counter()
+
+        try:
+            yield span
+
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+
+        finally:
+            span.duration_seconds = time.perf_counter() - started
+            _current_span.reset(token)
+            self._record(span)
+
+    def _record(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+            if self.trace_path:
+                self.trace_path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.trace_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(span.to_dict(), default=str) + "\n")
+
+    def summary(self) -> list[dict]:
+        """
+        Per span name: count, total / mean / max seconds, errors and token totals, slowest total first.
+        """
+
+        by_name: dict[str, dict] = {}
+        with self._lock:
+            spans = list(self.spans)
+
+        for span in spans:
+            entry = by_name.setdefault(
+                span.name,
+                {
+                    "name": span.name,
+                    "count": 0,
+                    "total_seconds": 0.0,
+                    "max_seconds": 0.0,
+                    "errors": 0,
+                    **{attribute: 0 for attribute in TOKEN_ATTRIBUTES},
+                },
+            )
+            entry["count"] += 1
+            entry["total_seconds"] += span.duration_seconds
+            entry["max_seconds"] = max(entry["max_seconds"], span.duration_seconds)
+            entry["errors"] += span.error is not None
+            for attribute in TOKEN_ATTRIBUTES:
+                entry[attribute] += span.attributes.get(attribute) or 0
+
+        for entry in by_name.values():
+            entry["mean_seconds"] = entry["total_seconds"] / entry["count"]
+
+        return sorted(
+            by_name.values(), key=lambda entry: entry["total_seconds"], reverse=True
+        )
+
+
+def display_trace_summary(tracer: Tracer):
+    """
+    Displays where the session's time (and tokens) went.
+    """
+
+    summary = tracer.summary()
+    if not summary:
+        return
+
+    trace_table = Table(
+        show_header=True,
+        header_style="bold magenta",
+        title=f"Session trace {tracer.session_id}",
+    )
+    trace_table.add_column("Span")
+    trace_table.add_column("Count", justify="right")
+    trace_table.add_column("Total (s)", justify="right")
+    trace_table.add_column("Mean (s)", justify="right")
+    trace_table.add_column("Max (s)", justify="right")
+    trace_table.add_column("Errors", justify="right")
+    trace_table.add_column("Prompt tokens", justify="right")
+    trace_table.add_column("Cached tokens", justify="right")
+    trace_table.add_column("Completion tokens", justify="right")
+
+    for entry in summary:
+        trace_table.add_row(
+            entry["name"],
+            str(entry["count"]),
+            f"{entry['total_seconds']:.2f}",
+            f"{entry['mean_seconds']:.2f}",
+            f"{entry['max_seconds']:.2f}",
+            str(entry["errors"]),
+            *(str(entry[attribute] or "") for attribute in TOKEN_ATTRIBUTES),
+        )
+
+    console.print(trace_table)
+
+    if tracer.trace_path and tracer.trace_path.exists():
+        console.print(f"[dim]Trace written to {tracer.trace_path}[/dim]")
@@ -0,0 +1,186 @@
+import hashlib
+import json
+import os
+import shlex
+from pathlib import Path
+
+from e2b_code_interpreter import Sandbox
+
+from sandbox_upload import UPLOAD_STAGING_DIR, sandbox_absolute_path
+
+# Records which content (sha256) every uploaded file name holds inside the sandbox.
+SANDBOX_UPLOAD_MANIFEST_PATH = f"{UPLOAD_STAGING_DIR}/manifest.json"
+
+
+def sha256_of_file(file_path: str, block_size: int = 8 * 1024 * 1024) -> str:
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        while block := file.read(block_size):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+class FingerprintIndex:
+    """
+    Local JSON index of content hashes, so a file is only re-hashed when its size or modification time changes.
+    """
+
+    def __init__(self, index_path: str = "./.eda_cache/fingerprints.json"):
+        self.index_path = Path(index_path)
+
+        try:
+            self.entries: dict[str, dict] = json.loads(self.index_path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.entries = {}
+
+    def sha256(self, file_path: str) -> str:
+        """
+        Returns the sha256 of the file's content, from the index if the file hasn't changed since it was hashed.
+        """
+
+        key = str(Path(file_path).resolve())
+        stat = os.stat(file_path)
+
+        entry = self.entries.get(key)
+        if (
+            entry
+            and entry["size"] == stat.st_size
+            and entry["mtime_ns"] == stat.st_mtime_ns
+        ):
+            return entry["sha256"]
+
+        digest = sha256_of_file(file_path)
+        self.entries[key] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": digest,
+        }
+        return digest
+
+    def save(self):
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Write then rename so an interrupted save never leaves a truncated index behind.
+        temp_path = self.index_path.with_suffix(".tmp")
+        temp_path.write_text(json.dumps(self.entries, indent=2))
+        temp_path.replace(self.index_path)
+
+
+def sandbox_file_stats(
+    sandbox: Sandbox, file_names_in_sandbox: list[str]
+) -> dict[str, dict]:
+    """
+    The current size and modification time of files in the sandbox, in a single round trip.
+
+    Returns:
+        dict[str, dict]: {file_name_in_sandbox: {"size": int, "mtime": str}} for the files that exist, the mtime
+        kept as stat prints it (nanoseconds) so it compares exactly.
+    """
+
+    if not file_names_in_sandbox:
+        return {}
+
+    quoted_paths = " ".join(
+        shlex.quote(sandbox_absolute_path(name)) for name in file_names_in_sandbox
+    )
+    result = sandbox.commands.run(
+        f"for f in {quoted_paths}; do stat -c '%s %.9Y' -- \"$f\" 2>/dev/null || echo -1; done"
+    )
+
+    stats = {}
+    for name, line in zip(file_names_in_sandbox, result.stdout.splitlines()):
+        fields = line.split()
+        if len(fields) == 2:
+            stats[name] = {"size": int(fields[0]), "mtime": fields[1]}
+    return stats
+
+
+def read_sandbox_manifest(sandbox: Sandbox) -> dict[str, dict]:
+    """
+    Reads the upload manifest from the sandbox and drops the entries whose file has since been deleted or
+    changed (e.g. the agent overwrote a dataset, even with one of the same size): its size or modification time
+    differs from when it was uploaded.
+
+    Returns:
+        dict[str, dict]: {file_name_in_sandbox: {"sha256": str, "size": int, "mtime": str}}
+    """
+
+    try:
+        manifest = json.loads(sandbox.files.read(SANDBOX_UPLOAD_MANIFEST_PATH))
+    except Exception:  # No manifest yet (fresh sandbox) or an unreadable one.
+        return {}
+
+    if not manifest:
+        return {}
+
+    current_stats = sandbox_file_stats(sandbox, list(manifest))
+
+    return {
+        name: entry
+        for name, entry in manifest.items()
+        if name in current_stats
+        and entry["size"] == current_stats[name]["size"]
+        and entry.get("mtime") == current_stats[name]["mtime"]
+    }
+
+
+def write_sandbox_manifest(sandbox: Sandbox, manifest: dict[str, dict]):
+    sandbox.files.write(SANDBOX_UPLOAD_MANIFEST_PATH, json.dumps(manifest))
+
+
+def plan_uploads(
+    file_paths: list[str],
+    file_names_in_sandbox: list[str],
+    file_hashes: list[str],
+    sandbox_manifest: dict[str, dict],
+) -> tuple[list[tuple[str, str]], list[tuple[str, str]], list[str]]:
+    """
+    Decides which files actually need to go over the wire.
+
+    Returns:
+        Tuple of (
+            uploads: [(file_path, file_name_in_sandbox)] one per content not already in the sandbox,
+            copies: [(source_name_in_sandbox, file_name_in_sandbox)] names whose content is already in the sandbox,
+            cached: [file_name_in_sandbox] names that already hold the right content,
+        )
+    """
+
+    names_by_hash = {entry["sha256"]: name for name, entry in sandbox_manifest.items()}
+
+    uploads, copies, cached = [], [], []
+    for file_path, file_name_in_sandbox, file_hash in zip(
+        file_paths, file_names_in_sandbox, file_hashes
+    ):
+        manifest_entry = sandbox_manifest.get(file_name_in_sandbox)
+
+        if manifest_entry and manifest_entry["sha256"] == file_hash:
+            cached.append(file_name_in_sandbox)
+
+        elif file_hash in names_by_hash:
+            copies.append((names_by_hash[file_hash], file_name_in_sandbox))
+
+        else:
+            uploads.append((file_path, file_name_in_sandbox))
+            # Later files with the same bytes get copied from this one once it's uploaded.
+            names_by_hash[file_hash] = file_name_in_sandbox
+
+    return uploads, copies, cached
+
+
+def copy_within_sandbox(sandbox: Sandbox, copies: list[tuple[str, str]]):
+    """
+    Copies files inside the sandbox, in a single round trip.
+    """
+
+    if not copies:
+        return
+
+    commands = []
+    for source, destination in copies:
+        source = shlex.quote(sandbox_absolute_path(source))
+        destination = shlex.quote(sandbox_absolute_path(destination))
+        commands.append(
+            f'mkdir -p "$(dirname {destination})" && cp {source} {destination}'
+        )
+
+    sandbox.commands.run(" && ".join(commands))